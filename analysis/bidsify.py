@@ -3,6 +3,8 @@ Restructure collected data into BIDS format.
 Looks for data in "sourcedata" folder
 """
 from __future__ import annotations
+from typing import Dict, List
+from argparse import Namespace
 from os.path import expanduser, join, isdir
 from os import makedirs
 from glob import glob
@@ -16,8 +18,10 @@ from event import event_dict, EventType
 from experiment.constants import Constants
 from experiment.timer import Timer
 from experiment.triggers import Triggers
+from experiment.codec import STATUS_MASK, decode
 from config import FRAME_RATE, DATA_DIR, DERIV_NAME
 from utils import print_info
+from runner import SubjectResult, parse_args, list_sources, run_subjects
 
 TASK_DESC = {
     'ab': 'Attentional Blink paradigm',
@@ -57,23 +61,19 @@ for filename in ('eeg.json', 'events.json'):
 
 data_dir = expanduser(DATA_DIR)
 
-## Copy dataset-level files
-for filename in ('dataset_description.json', 'README.md'):
-    src = join('analysis/templates', filename)
-    dst = join(data_dir, filename)
-    copyfile(src, dst)
 
+def bidsify_subject(sub: str, source_dirs: Dict[str, str]) -> int:
+    """Copy the recording of a subject, and write its channels, events and sidecar files
 
-deriv_dir = join(data_dir, 'derivatives', DERIV_NAME)
-if not isdir(deriv_dir):
-    makedirs(deriv_dir)
+    Args:
+        sub (str): subject ID, e.g. sub-01
+        source_dirs (dict): source data directory of each subject
 
-source_dirs = sorted(glob(join(data_dir, 'sourcedata', 'sub-UOLM*')))
-s = 0
-for source_dir in source_dirs:
-
-    s += 1
-    sub = f'sub-{s:02}'
+    Returns:
+        int: number of events
+    """
+    source_dir = source_dirs[sub]
+    s = int(sub[len('sub-'):])
     sub_dir = join(data_dir, sub)
     eeg_dir = join(sub_dir, 'eeg')
     makedirs(eeg_dir, exist_ok=True)
@@ -124,8 +124,8 @@ for source_dir in source_dirs:
     assert len(csv_files) == 1
     trials_df = read_csv(csv_files[0])
 
-    mask = sum([2**i for i in (8,9,10,11,12,13,14,15,16)])
-    evt = find_events(raw, mask=mask, mask_type='not_and')
+    evt = find_events(raw, mask=STATUS_MASK, mask_type='not_and')
+    prompts = decode(evt)['prompt']
 
 
     """
@@ -154,7 +154,7 @@ for source_dir in source_dirs:
         te += 1
         for _ in range(2):
             if e+te < evt.shape[0]:
-                if evt[e+te, 2] in (1, 2, 11, 12):
+                if prompts[e+te]:
                     events.append(event_dict(EventType.TASK, trial, tuple(evt[e+te, :]), sfreq, None))
                     te += 1
         """
@@ -193,3 +193,24 @@ for source_dir in source_dirs:
                 )
             )
         )
+    return len(df_events)
+
+
+def main(args: Namespace) -> List[SubjectResult]:
+    ## Copy dataset-level files
+    for filename in ('dataset_description.json', 'README.md'):
+        src = join('analysis/templates', filename)
+        dst = join(data_dir, filename)
+        copyfile(src, dst)
+
+    deriv_dir = join(data_dir, 'derivatives', DERIV_NAME)
+    if not isdir(deriv_dir):
+        makedirs(deriv_dir)
+
+    source_dirs = list_sources(data_dir)
+    subjects = [sub for sub in source_dirs if (not args.subjects) or (sub in args.subjects)]
+    return run_subjects('bidsify', bidsify_subject, subjects, args.jobs, source_dirs=source_dirs)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__))
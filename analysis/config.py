@@ -10,6 +10,8 @@ DERIV_NAME = 'stage1'
 BASELINE = 0.250 ## duration of baseline
 TMAX = 0.715
 LATENCY = 0.016 ## based on latrec recording
+FILTER_BAND = (0.5, 20) ## band-pass filter for the preprocessing (prepared.py)
+MEMMAP = True ## memory-map the prepared raw data to the temporary directory, rather than load it (prepared.py)
 
 SELECTED_EVENTS = [
     ('dual/short/present', dict(training=False, forT2=True, dualTask=True,  longSOA=False, t2Present=True)),
@@ -61,6 +63,7 @@ TIME_WINDOWS = dict(
 )
 
 N_JOBS = 6
+MODES = ('original', 'auto') ## preprocessing variants (preproc_original.py, preproc_auto.py)
 N_INTERPOLATE = [1, 2, 3, 4, 5, 6]
 KEEP_IC_LABELS = ('brain')
 TOPO_TIMES = [t/20 for t in list(range(12))] # 0 - 0.55
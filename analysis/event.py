@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Tuple, Any, Dict
 from enum import Enum
 from pandas import Series
+from experiment.codec import DECODE, PROMPT_IDENTITY
 
 class EventType(Enum):
      TASK = 0
@@ -19,7 +20,7 @@ def event_dict(kind: EventType, trial: Series, evt: Tuple[int, int, int], sfreq:
             duration = dur_s,
             sample = evt[0],
             value = evt[2],
-            trial_type='prompt_t1' if evt[2] in (1, 11) else 'prompt_t2',
+            trial_type='prompt_t1' if DECODE['prompt'][evt[2]] == PROMPT_IDENTITY else 'prompt_t2',
             trial_index=trial['Unnamed: 0'],
             phase=trial.phase,
             dual_task=trial.task=='dual',
@@ -1,10 +1,258 @@
-"""Run all analysis steps
+"""Run the analysis steps that are out of date
+
+Each step declares the files it reads and writes for a subject:
+source data -> BDF, channels and events (bidsify) -> annotations (annotate)
+-> epochs (preproc_original, preproc_auto) -> ERPs and figures (erps).
+A step runs for a subject when one of its outputs is missing or older than
+one of its inputs (which include the script of the step and config.py),
+or when an earlier step rebuilds one of its inputs in this run. Steps that
+combine subjects (timing, montage, behaviour, erps) run for all subjects
+when any of them is out of date. If a subject fails, the steps that need
+its outputs are skipped for that subject.
+
+    python analysis/pipeline.py --dry-run
+    python analysis/pipeline.py --steps annotate preproc_original --subjects sub-01 --jobs 4
 """
-import bidsify
-import timing
-import montage
-import behaviour
-import annotate
-import preproc_original
-import preproc_auto
-import erps
\ No newline at end of file
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Sequence, Set
+from dataclasses import dataclass, field
+from argparse import Namespace
+from importlib import import_module
+from os.path import join, expanduser, isfile, getmtime, dirname, abspath, basename
+from glob import glob
+import traceback
+from runner import make_parser, list_sources
+from utils import print_info, print_warn
+from config import DATA_DIR, DERIV_NAME, SELECTED_EVENTS, ROIS, MODES
+
+data_dir = expanduser(DATA_DIR)
+deriv_dir_root = join(data_dir, 'derivatives', DERIV_NAME)
+analysis_dir = dirname(abspath(__file__))
+n_conds = len(SELECTED_EVENTS)
+
+
+def eeg_file(sub: str, suffix: str) -> str:
+    return join(data_dir, sub, 'eeg', f'{sub}_task-ab_{suffix}')
+
+
+def deriv_file(sub: str, suffix: str) -> str:
+    return join(deriv_dir_root, sub, f'{sub}_{suffix}')
+
+
+def epochs_files(sub: str, mode: str) -> List[str]:
+    return [deriv_file(sub, f'mode-{mode}_conds-{n_conds}_epo.fif'),
+            deriv_file(sub, f'mode-{mode}_conds-{n_conds}_events.tsv')]
+
+
+def source_files(sub: str) -> List[str]:
+    source_dir = list_sources(data_dir).get(sub)
+    if source_dir is None:
+        return [join(data_dir, 'sourcedata', f'{sub} (no source data)')]
+    return sorted(glob(join(source_dir, '*.bdf')) + glob(join(source_dir, '*_trials.csv'))) + [
+        join(source_dir, 'bads.txt')]
+
+
+@dataclass
+class Step:
+    """An analysis script, with the files it reads and writes per subject
+    """
+    name: str # module of the script, which has a main(args)
+    inputs: Callable[[str], List[str]]
+    outputs: Callable[[str], List[str]]
+    group: bool = False # combines subjects, so runs for all of them
+    group_outputs: List[str] = field(default_factory=list) # files that do not belong to one subject
+    modules: List[str] = field(default_factory=list) # other modules whose changes affect the outputs
+
+    def code(self) -> List[str]:
+        return [join(analysis_dir, f'{m}.py') for m in [self.name, 'config'] + self.modules]
+
+
+STEPS = [
+    Step('bidsify',
+        inputs=source_files,
+        outputs=lambda sub: [eeg_file(sub, s) for s in
+                             ('eeg.bdf', 'channels.tsv', 'events.tsv', 'events.json', 'eeg.json')]),
+    Step('timing',
+        inputs=lambda sub: [eeg_file(sub, 'events.tsv')],
+        outputs=lambda sub: [],
+        group=True,
+        group_outputs=[join(deriv_dir_root, 'timing_soa.png')]),
+    Step('montage',
+        inputs=lambda sub: [],
+        outputs=lambda sub: [],
+        group=True,
+        group_outputs=[join(deriv_dir_root, f'montage_roi-{roi}.png') for roi in ROIS]),
+    Step('behaviour',
+        inputs=lambda sub: [eeg_file(sub, 'events.tsv')],
+        outputs=lambda sub: [],
+        group=True,
+        group_outputs=[join(deriv_dir_root, f'fig_1b_{v}.png') for v in ('plain', 'stacked')]),
+    Step('annotate',
+        inputs=lambda sub: [eeg_file(sub, 'eeg.bdf'), eeg_file(sub, 'channels.tsv')],
+        outputs=lambda sub: [deriv_file(sub, 'annotations.txt')],
+        modules=['prepared', 'rejection']),
+    Step('preproc_original',
+        inputs=lambda sub: [eeg_file(sub, 'eeg.bdf'), eeg_file(sub, 'channels.tsv'),
+                            eeg_file(sub, 'events.tsv'), deriv_file(sub, 'annotations.txt')],
+        outputs=lambda sub: epochs_files(sub, 'original'),
+        modules=['prepared']),
+    Step('preproc_auto',
+        inputs=lambda sub: [eeg_file(sub, 'eeg.bdf'), eeg_file(sub, 'channels.tsv'),
+                            eeg_file(sub, 'events.tsv')],
+        outputs=lambda sub: epochs_files(sub, 'auto') + [
+            deriv_file(sub, f'mode-auto_conds-{n_conds}_epo.pdf')],
+        modules=['prepared']),
+    Step('erps',
+        inputs=lambda sub: [eeg_file(sub, 'eeg.bdf')] + [f for m in MODES for f in epochs_files(sub, m)],
+        outputs=lambda sub: [deriv_file(sub, f'mode-{m}_{roi}.png') for m in MODES for roi in ROIS],
+        group=True,
+        group_outputs=[join(deriv_dir_root, f'grandavg_mode-{m}_{roi}.png') for m in MODES for roi in ROIS]),
+]
+
+
+def out_of_date(inputs: Sequence[str], outputs: Sequence[str], rebuilt: Set[str]) -> Optional[str]:
+    """Why the outputs have to be made, or None if they are up to date
+
+    Inputs that do not exist, and are not rebuilt, are ignored.
+    """
+    if not outputs:
+        return None
+    missing = [f for f in outputs if not isfile(f)]
+    if missing:
+        return f'{basename(missing[0])} missing'
+    changed = [f for f in inputs if f in rebuilt]
+    if changed:
+        return f'{basename(changed[0])} is rebuilt'
+    oldest = min(getmtime(f) for f in outputs)
+    newer = [f for f in inputs if isfile(f) and getmtime(f) > oldest]
+    if newer:
+        return f'{basename(newer[0])} changed'
+    return None
+
+
+def missing_input(inputs: Sequence[str], rebuilt: Set[str]) -> Optional[str]:
+    for fpath in inputs:
+        if (not isfile(fpath)) and (fpath not in rebuilt):
+            return basename(fpath)
+    return None
+
+
+@dataclass
+class Task:
+    """A step to run, with the subjects to run it for and why
+    """
+    step: Step
+    subjects: List[str]
+    reasons: Dict[str, str] # per subject, or '*' for group outputs
+    blocked: Dict[str, str] # subjects that can not run, and why
+
+
+def plan(steps: Sequence[Step], subjects: Sequence[str], force: bool=False) -> List[Task]:
+    """Which steps have to run for which subjects, in the order of `steps`
+    """
+    rebuilt: Set[str] = set()
+    tasks = []
+    for step in steps:
+        reasons, blocked = dict(), dict()
+        for sub in subjects:
+            inputs, outputs = step.inputs(sub), step.outputs(sub)
+            reason = out_of_date(inputs + step.code(), outputs, rebuilt)
+            missing = missing_input(inputs, rebuilt)
+            if missing and (step.group or reason):
+                ## a group step needs the inputs of every subject it includes
+                blocked[sub] = f'{missing} missing'
+            elif force or reason:
+                reasons[sub] = reason or 'forced'
+        if step.group:
+            included = [sub for sub in subjects if sub not in blocked]
+            group_inputs = [f for sub in included for f in step.inputs(sub)] + step.code()
+            reason = out_of_date(group_inputs, step.group_outputs, rebuilt)
+            if force or reason:
+                reasons['*'] = reason or 'forced'
+            elif reasons:
+                reasons['*'] = 'a subject is out of date'
+            task_subjects = included
+        else:
+            task_subjects = [sub for sub in subjects if sub in reasons]
+        if not reasons:
+            continue
+        for sub in task_subjects:
+            rebuilt.update(step.outputs(sub))
+        rebuilt.update(step.group_outputs)
+        tasks.append(Task(step, task_subjects, reasons, blocked))
+    return tasks
+
+
+def describe(tasks: Sequence[Task]) -> None:
+    """Print what the tasks will do, and why
+    """
+    if not tasks:
+        print_info('Everything is up to date')
+    for task in tasks:
+        print_info(f'{task.step.name}: {", ".join(task.subjects) or "(no subjects)"}')
+        for sub, reason in task.reasons.items():
+            print(f'  {"all" if sub == "*" else sub}: {reason}')
+        for sub, reason in task.blocked.items():
+            print_warn(f'  {sub} skipped: {reason}')
+
+
+def run(tasks: Sequence[Task], jobs: int) -> List[str]:
+    """Run the tasks, skipping subjects that need the outputs of a failed subject
+
+    Returns:
+        list: the failed steps, as step/subject
+    """
+    unavailable: Set[str] = set()
+    failures = []
+    for task in tasks:
+        step = task.step
+        subjects = [sub for sub in task.subjects if not unavailable.intersection(step.inputs(sub))]
+        for sub in set(task.subjects) - set(subjects):
+            print_warn(f'[{step.name}] skipping {sub}, an earlier step failed for it')
+            unavailable.update(step.outputs(sub))
+        if not subjects:
+            continue
+        try:
+            module = import_module(step.name)
+            results = module.main(Namespace(jobs=jobs, subjects=subjects)) or []
+            failed = sorted(set(r.sub for r in results if not r.ok))
+        except Exception:
+            print_warn(f'[{step.name}] failed:\n{traceback.format_exc()}')
+            failed = subjects
+        for sub in failed:
+            unavailable.update(step.outputs(sub))
+            failures.append(f'{step.name}/{sub}')
+    return failures
+
+
+def main(argv: Optional[Sequence[str]]=None) -> int:
+    parser = make_parser(__doc__)
+    parser.add_argument('--steps', nargs='+', choices=[s.name for s in STEPS],
+                        help='only consider these steps (default: all)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='list what would run, and why, without running it')
+    parser.add_argument('--force', action='store_true',
+                        help='run the steps even if they are up to date')
+    args = parser.parse_args(argv)
+
+    subjects = sorted(set(list_sources(data_dir)) | set(
+        basename(d) for d in glob(join(data_dir, 'sub-*'))))
+    if args.subjects:
+        unknown = set(args.subjects) - set(subjects)
+        if unknown:
+            parser.error(f'Unknown subjects: {sorted(unknown)}')
+        subjects = [sub for sub in subjects if sub in args.subjects]
+    steps = [s for s in STEPS if (not args.steps) or (s.name in args.steps)]
+
+    tasks = plan(steps, subjects, args.force)
+    describe(tasks)
+    if args.dry_run:
+        return 0
+    failures = run(tasks, args.jobs)
+    if failures:
+        print_warn(f'Failed: {", ".join(failures)}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
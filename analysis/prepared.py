@@ -0,0 +1,167 @@
+"""Prepared raw data, shared by annotate.py, preproc_original.py and preproc_auto.py
+
+The recording of a subject is read, its channels are set up from the
+channels file (MISC and REF channels dropped, EOG types and bad channels
+marked) and, for the preprocessing, it is filtered. The result is stored
+as a FIF file in the derivatives folder, in single precision (rounding
+errors are far below the resolution of the 24 bit BDF data), with a
+json sidecar holding the hash of the inputs: the BDF file, the channels
+file and the parameters below. The next script (or run) loads that file,
+unless one of the inputs has changed. Freshly prepared data is also read
+back from that file, so that the first run uses the same data as later runs.
+
+Only the channels that are kept are read from the BDF file. With MEMMAP
+in config.py the data is memory-mapped to a file in the temporary
+directory (TMPDIR) instead of held in memory, so that several subjects
+can be processed at once; the file is removed with the Raw object.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Dict, Any, Union
+from os.path import join, isfile
+from hashlib import sha1
+from tempfile import mkstemp
+import json, os, weakref
+from mne.io import read_raw_bdf, read_raw_fif
+import mne
+from utils import read_channels, print_info
+from config import FILTER_BAND, MEMMAP
+if TYPE_CHECKING:
+    from mne.io import BaseRaw
+
+## change this when the preparation below changes, so cached files are made again
+STAGE_VERSION = 2
+
+
+def file_hash(fpath: str, chunk_size: int = 2**20) -> str:
+    digest = sha1()
+    with open(fpath, 'rb') as fhandle:
+        for chunk in iter(lambda: fhandle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_params(filtered: bool) -> Dict[str, Any]:
+    params: Dict[str, Any] = dict(version=STAGE_VERSION, filtered=filtered)
+    if filtered:
+        params['l_freq'], params['h_freq'] = FILTER_BAND
+    return params
+
+
+def cache_key(raw_fpath: str, chans_fpath: str, params: Dict[str, Any]) -> str:
+    """Hash of the source recording, the channels file and the parameters
+    """
+    inputs = dict(bdf=file_hash(raw_fpath), channels=file_hash(chans_fpath), params=params)
+    return sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def memmap_file(prefix: str) -> str:
+    """New file in the temporary directory for memory-mapped data
+    """
+    fd, fpath = mkstemp(prefix=prefix, suffix='.dat')
+    os.close(fd)
+    return fpath
+
+
+def remove_file(fpath: str) -> None:
+    try:
+        os.remove(fpath)
+    except OSError:
+        pass ## still mapped (Windows), or already removed
+
+
+def preload_target(raw_prefix: str) -> Union[bool, str]:
+    """Value for the preload argument of the MNE readers: True, or a file to memory-map
+    """
+    return memmap_file(raw_prefix) if MEMMAP else True
+
+
+def release_with(raw: BaseRaw, preload: Union[bool, str]) -> BaseRaw:
+    """Remove the memory-mapped file, if any, when raw is no longer used
+    """
+    if isinstance(preload, str):
+        weakref.finalize(raw, remove_file, preload)
+    return raw
+
+
+def read_raw(read: Callable[[Union[bool, str]], BaseRaw], raw_prefix: str) -> BaseRaw:
+    """Call read(preload), removing the memory-mapped file if it fails or when raw is no longer used
+    """
+    preload = preload_target(raw_prefix)
+    try:
+        raw = read(preload)
+    except BaseException:
+        if isinstance(preload, str):
+            remove_file(preload)
+        raise
+    return release_with(raw, preload)
+
+
+def prepare_raw(data_dir: str, sub: str, filtered: bool, preload: Union[bool, str]=True) -> BaseRaw:
+    """Read the recording and set up its channels, optionally filter it
+
+    Args:
+        data_dir (str): BIDS data directory
+        sub (str): subject ID, e.g. sub-01
+        filtered (bool): apply FILTER_BAND
+        preload (bool or str): True, or a file to memory-map the data to
+    """
+    raw_fpath = join(data_dir, sub, 'eeg', f'{sub}_task-ab_eeg.bdf')
+    chans_df = read_channels(data_dir, sub)
+
+    ## unused channels and the mastoids are not read
+    unused_chans = chans_df[chans_df.type.isin(['MISC', 'REF'])]['name'].to_list()
+    raw = read_raw_bdf(raw_fpath, exclude=unused_chans, preload=preload)
+
+    ## mark channel type for EOG
+    eog_channels = chans_df[chans_df.description.str.contains('EOG')]['name'].to_list()
+    raw.set_channel_types(mapping=dict([(c, 'eog') for c in eog_channels]))
+
+    ## mark bad channels
+    bad_chans = chans_df[chans_df.status == 'bad']['name'].to_list()
+    raw.info['bads'].extend([c for c in bad_chans if c not in unused_chans])
+
+    if filtered:
+        ## pick channels to be filtered
+        filter_picks = mne.pick_types(raw.info, eeg=True, eog=True, stim=False)
+        print_info('Filtering..')
+        l_freq, h_freq = FILTER_BAND
+        ## one job filters the channels in place; more jobs collect a filtered copy of all channels
+        raw.filter(l_freq=l_freq, h_freq=h_freq, picks=filter_picks, n_jobs=1)
+    return raw
+
+
+def load_prepared_raw(data_dir: str, deriv_dir: str, sub: str, filtered: bool = True) -> BaseRaw:
+    """The prepared raw data of a subject, from the cache if it is up to date
+
+    Args:
+        data_dir (str): BIDS data directory
+        deriv_dir (str): derivatives directory of this subject
+        sub (str): subject ID, e.g. sub-01
+        filtered (bool): filtered for the preprocessing, or unfiltered (annotate.py)
+
+    Returns:
+        Raw: loaded into memory, or memory-mapped (MEMMAP)
+    """
+    eeg_dir = join(data_dir, sub, 'eeg')
+    params = stage_params(filtered)
+    key = cache_key(
+        join(eeg_dir, f'{sub}_task-ab_eeg.bdf'),
+        join(eeg_dir, f'{sub}_task-ab_channels.tsv'),
+        params
+    )
+    desc = 'filtered' if filtered else 'prepared'
+    fif_fpath = join(deriv_dir, f'{sub}_desc-{desc}_raw.fif')
+    json_fpath = join(deriv_dir, f'{sub}_desc-{desc}_raw.json')
+    prefix = f'{sub}_desc-{desc}_'
+    if isfile(fif_fpath) and isfile(json_fpath):
+        with open(json_fpath) as fhandle:
+            if json.load(fhandle).get('key') == key:
+                print_info(f'Loading prepared raw data ({desc})..')
+                return read_raw(lambda preload: read_raw_fif(fif_fpath, preload=preload, verbose=False), prefix)
+    print_info(f'Preparing raw data ({desc})..')
+    raw = read_raw(lambda preload: prepare_raw(data_dir, sub, filtered, preload), prefix)
+    raw.save(fif_fpath, overwrite=True, verbose=False)
+    del raw ## also removes its memory-mapped file
+    with open(json_fpath, 'w') as fhandle:
+        json.dump(dict(key=key, params=params), fhandle, indent=2)
+    return read_raw(lambda preload: read_raw_fif(fif_fpath, preload=preload, verbose=False), prefix)
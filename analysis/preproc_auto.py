@@ -2,21 +2,23 @@
 
 """
 from __future__ import annotations
-from os.path import join, expanduser, basename
+from typing import List
+from argparse import Namespace
+from os.path import join, expanduser
 import os
-from glob import glob
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
-from mne.io import read_raw_bdf
 from mne.channels import make_standard_montage
 import mne
 from mne.preprocessing import ICA
 from autoreject import AutoReject
 from mne_icalabel import label_components
-from experiment.triggers import Triggers
+from experiment.codec import STATUS_MASK, encode
 from experiment.timer import Timer
 from experiment.constants import Constants
-from utils import read_events, read_channels, print_info, log_to
+from utils import read_events, print_info, log_to
+from prepared import load_prepared_raw
+from runner import SubjectResult, parse_args, list_subjects, run_subjects
 from config import (DATA_DIR, DERIV_NAME, FRAME_RATE,
                     BASELINE, TMAX, LATENCY, N_JOBS, N_INTERPOLATE,
                     KEEP_IC_LABELS, SELECTED_EVENTS)
@@ -32,14 +34,20 @@ const = Constants()
 timer = Timer()
 timer.optimizeFlips(FRAME_RATE, const)
 
-sub_dirs = sorted(glob(join(data_dir, 'sub-*')))
-for sub_dir in sub_dirs:
-    sub = basename(sub_dir)
+
+def preprocess_subject(sub: str, n_jobs: int=N_JOBS) -> dict:
+    """Epoch the T2 events of a subject, cleaned with AutoReject and ICA
+
+    Args:
+        sub (str): subject ID, e.g. sub-01
+        n_jobs (int): number of processes for AutoReject
+
+    Returns:
+        dict: number of artifact components, rejected and interpolated epochs
+    """
     print_info(f'Reading EEG data for {sub}..')
 
-    eeg_dir = join(data_dir, sub, 'eeg')
     deriv_dir = join(deriv_dir_root, sub)
-    raw_fpath = join(eeg_dir, f'{sub}_task-ab_eeg.bdf')
     os.makedirs(deriv_dir, exist_ok=True)
 
 
@@ -48,32 +56,8 @@ for sub_dir in sub_dirs:
 
     meta = dict()
 
-    ## load raw data 
-    raw = read_raw_bdf(raw_fpath)
-
-    chans_df = read_channels(data_dir, sub)
-
-    ## remove unused channels
-    misc_chans = chans_df[chans_df.type == 'MISC']['name'].to_list()
-    raw.drop_channels(misc_chans)
-
-    ## mark channel type for EOG
-    eog_channels = chans_df[chans_df.description.str.contains('EOG')]['name'].to_list()
-    raw.set_channel_types(mapping=dict([(c, 'eog') for c in eog_channels]))
-
-    ## mark bad channels
-    bad_chans = chans_df[chans_df.status == 'bad']['name'].to_list()
-    raw.info['bads'].extend(bad_chans)
-
-    ## remove the mastoids
-    refs_chans = chans_df[chans_df.type == 'REF']['name'].to_list()
-    raw.drop_channels(refs_chans)
-
-    ## pick channels to be filtered
-    filter_picks = mne.pick_types(raw.info, eeg=True, eog=True, stim=False)
-    print_info('Loading data and filtering..')
-    raw.load_data()
-    raw.filter(l_freq=0.5, h_freq=20, picks=filter_picks)
+    ## channels set up and filtered, cached in the derivatives folder
+    raw = load_prepared_raw(data_dir, deriv_dir, sub, filtered=True)
 
     ## apply average reference
     raw = raw.set_eeg_reference(ref_channels='average')
@@ -83,11 +67,10 @@ for sub_dir in sub_dirs:
     raw.set_montage(montage, on_missing='warn')
 
     ## find triggers
-    mask = sum([2**i for i in (8,9,10,11,12,13,14,15,16)])
     events = mne.find_events(
         raw,
         verbose=False,
-        mask=mask,
+        mask=STATUS_MASK,
         mask_type='not_and'
     )
 
@@ -98,7 +81,7 @@ for sub_dir in sub_dirs:
 
     event_ids = dict()
     for name, cond_dict in SELECTED_EVENTS:
-        event_ids[name] = Triggers().get_number(**cond_dict)
+        event_ids[name] = encode(**cond_dict)
 
     epochs = mne.Epochs(
         raw,
@@ -117,7 +100,7 @@ for sub_dir in sub_dirs:
         n_ics = n_channels - 1
 
         ## Pre-ICA AutoReject
-        ar = AutoReject(n_jobs=N_JOBS, n_interpolate=N_INTERPOLATE, verbose=False)
+        ar = AutoReject(n_jobs=n_jobs, n_interpolate=N_INTERPOLATE, verbose=False)
         ar.fit(epochs)
         _, reject_log = ar.transform(epochs.copy(), return_log=True)
         ica_epoch_selection = ~reject_log.bad_epochs
@@ -153,7 +136,7 @@ for sub_dir in sub_dirs:
         ica.apply(epochs, exclude=ica.exclude)
 
         ## step 3 apply autoreject
-        ar = AutoReject(n_jobs=N_JOBS, n_interpolate=N_INTERPOLATE, verbose=False)
+        ar = AutoReject(n_jobs=n_jobs, n_interpolate=N_INTERPOLATE, verbose=False)
         ar.fit(epochs)
         epochs, reject_log = ar.transform(epochs, return_log=True)
 
@@ -161,7 +144,7 @@ for sub_dir in sub_dirs:
         log_to(report, f"n_bad_epochs: {meta['n_bad_epochs']}")
         meta['n_interp_epochs'] = (reject_log.labels == 2).sum().item()
         log_to(report, f"n_interp_epochs: {meta['n_interp_epochs']}")
-        
+
         ## Display overview of rejected and/or interpolated channels/segments
         fig = reject_log.plot('horizontal', show=False)
         fig.suptitle(f'Reject log after ICA')
@@ -188,3 +171,16 @@ for sub_dir in sub_dirs:
 
         print_info(f'Epoched {len(epochs)} trials')
         epochs.save(epo_fpath, overwrite=True)
+    return meta
+
+
+def main(args: Namespace) -> List[SubjectResult]:
+    print_info(f'## Preprocessing: automated')
+    subjects = list_subjects(data_dir, args.subjects)
+    ## share the N_JOBS processes for AutoReject between the subjects that run in parallel
+    n_jobs = max(1, N_JOBS // args.jobs)
+    return run_subjects('preproc_auto', preprocess_subject, subjects, args.jobs, n_jobs=n_jobs)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__))
@@ -18,16 +18,18 @@ trial numbers spreadsheet: https://docs.google.com/spreadsheets/d/14jrOEcPnLSVjf
 
 """
 from __future__ import annotations
-from os.path import join, expanduser, isfile, basename
+from typing import List
+from argparse import Namespace
+from os.path import join, expanduser, isfile
 import os
-from glob import glob
-from mne.io import read_raw_bdf
 from mne.channels import make_standard_montage
 import mne
-from experiment.triggers import Triggers
+from experiment.codec import STATUS_MASK, encode
 from experiment.timer import Timer
 from experiment.constants import Constants
-from utils import read_events, read_channels, print_info
+from utils import read_events, print_info
+from prepared import load_prepared_raw
+from runner import SubjectResult, parse_args, list_subjects, run_subjects
 from config import (DATA_DIR, DERIV_NAME, FRAME_RATE,
                     BASELINE, TMAX, LATENCY, SELECTED_EVENTS)
 
@@ -42,42 +44,20 @@ const = Constants()
 timer = Timer()
 timer.optimizeFlips(FRAME_RATE, const)
 
-sub_dirs = sorted(glob(join(data_dir, 'sub-*')))
-for sub_dir in sub_dirs:
-    sub = basename(sub_dir)
+
+def preprocess_subject(sub: str) -> int:
+    """Epoch the T2 events of a subject, without the annotated trials
+
+    Returns:
+        int: number of epochs stored
+    """
     print_info(f'Reading EEG data for {sub}..')
 
-    eeg_dir = join(data_dir, sub, 'eeg')
     deriv_dir = join(deriv_dir_root, sub)
-    raw_fpath = join(eeg_dir, f'{sub}_task-ab_eeg.bdf')
     os.makedirs(deriv_dir, exist_ok=True)
 
-    ## load raw data 
-    raw = read_raw_bdf(raw_fpath)
-
-    chans_df = read_channels(data_dir, sub)
-
-    ## remove unused channels
-    misc_chans = chans_df[chans_df.type == 'MISC']['name'].to_list()
-    raw.drop_channels(misc_chans)
-
-    ## mark channel type for EOG
-    eog_channels = chans_df[chans_df.description.str.contains('EOG')]['name'].to_list()
-    raw.set_channel_types(mapping=dict([(c, 'eog') for c in eog_channels]))
-
-    ## mark bad channels
-    bad_chans = chans_df[chans_df.status == 'bad']['name'].to_list()
-    raw.info['bads'].extend(bad_chans)
-
-    ## remove the mastoids
-    refs_chans = chans_df[chans_df.type == 'REF']['name'].to_list()
-    raw.drop_channels(refs_chans)
-
-    ## pick channels to be filtered
-    filter_picks = mne.pick_types(raw.info, eeg=True, eog=True, stim=False)
-    print_info('Loading data and filtering..')
-    raw.load_data()
-    raw.filter(l_freq=0.5, h_freq=20, picks=filter_picks)
+    ## channels set up and filtered, cached in the derivatives folder
+    raw = load_prepared_raw(data_dir, deriv_dir, sub, filtered=True)
 
     ## read the artifact annotations
     annots_fpath = join(deriv_dir, f'{sub}_annotations.txt')
@@ -93,11 +73,10 @@ for sub_dir in sub_dirs:
     raw.set_montage(montage, on_missing='warn')
 
     ## find triggers
-    mask = sum([2**i for i in (8,9,10,11,12,13,14,15,16)])
     events = mne.find_events(
         raw,
         verbose=False,
-        mask=mask,
+        mask=STATUS_MASK,
         mask_type='not_and'
     )
 
@@ -108,7 +87,7 @@ for sub_dir in sub_dirs:
 
     event_ids = dict()
     for name, cond_dict in SELECTED_EVENTS:
-        event_ids[name] = Triggers().get_number(**cond_dict)
+        event_ids[name] = encode(**cond_dict)
 
     epochs = mne.Epochs(
         raw,
@@ -138,3 +117,14 @@ for sub_dir in sub_dirs:
 
     print_info(f'Epoched {len(epochs)} trials')
     epochs.save(join(deriv_dir, f'{sub}_mode-{MODE_NAME}_conds-{n_conds}_epo.fif'), overwrite=True)
+    return len(epochs)
+
+
+def main(args: Namespace) -> List[SubjectResult]:
+    print_info(f'## Preprocessing: original')
+    subjects = list_subjects(data_dir, args.subjects)
+    return run_subjects('preproc_original', preprocess_subject, subjects, args.jobs)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__))
@@ -0,0 +1,106 @@
+"""Threshold based rejection of epochs (annotate.py)
+
+We rejected voltage exceeding ±200 uV,
+transients exceeding ±100 uV,
+or electrooculogram activity exceeding ±70 mV.
+
+The checks are done on chunks of epochs at once, with per channel
+reductions instead of arrays the size of the data:
+- |x - mean| > T holds for some sample if max - mean > T or mean - min > T.
+- A transient (a step between two samples) larger than T is only possible
+  on a channel whose range (max - min) is larger than T, so the differences
+  are only computed for those channels.
+Both give exactly the result of comparing every sample. Chunks are kept
+below CHUNK_BYTES, so memory does not grow with the length of the recording.
+"""
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import numpy
+
+THRESH_TRANS = 100
+THRESH_PEAK = 200
+THRESH_EOG = 70
+
+## reasons in the order they are checked; an epoch gets the first that applies.
+## code (index + 1), name for the counts, description for the annotation
+REASONS: List[Tuple[str, str]] = [
+    ('trans', 'bad transient'),
+    ('peak', 'bad peak'),
+    ('eog', 'bad blink'),
+]
+NOT_REJECTED = 0
+
+CHUNK_BYTES = 2**22 # 4 MB of data per chunk
+
+
+def chunk_epochs(shape: Tuple[int, ...], itemsize: int=8, max_bytes: int=CHUNK_BYTES) -> int:
+    """Number of epochs per chunk, for data of the given shape (epochs x channels x time)
+    """
+    epoch_bytes = itemsize * int(numpy.prod(shape[1:]))
+    return max(1, max_bytes // max(1, epoch_bytes))
+
+
+def extremes(data: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Maximum and minimum over time, epochs x channels
+    """
+    return data.max(axis=2), data.min(axis=2)
+
+
+def exceeds_deviation(data: numpy.ndarray, threshold: float,
+                      maximum: numpy.ndarray, minimum: numpy.ndarray) -> numpy.ndarray:
+    """Per epoch, whether any channel deviates more than threshold from its mean over time
+    """
+    mean = data.mean(axis=2)
+    return ((maximum - mean > threshold) | (mean - minimum > threshold)).any(axis=1)
+
+
+def exceeds_transient(data: numpy.ndarray, threshold: float,
+                      maximum: numpy.ndarray, minimum: numpy.ndarray) -> numpy.ndarray:
+    """Per epoch, whether any channel changes more than threshold from one sample to the next
+    """
+    candidates = (maximum - minimum) > threshold # epochs x channels
+    exceeds = numpy.zeros(data.shape[0], dtype=bool)
+    if candidates.any():
+        steps = numpy.diff(data[candidates], axis=1) # candidate channels x time
+        hits = (steps.max(axis=1) > threshold) | (steps.min(axis=1) < -threshold)
+        exceeds[numpy.nonzero(candidates)[0][hits]] = True
+    return exceeds
+
+
+def rejection_codes(eeg: numpy.ndarray, eog: numpy.ndarray, max_bytes: int=CHUNK_BYTES) -> numpy.ndarray:
+    """Reason each epoch is rejected
+
+    Args:
+        eeg (ndarray): epochs x channels x time, in uV
+        eog (ndarray): epochs x EOG derivations x time, in uV
+        max_bytes (int): size of the chunks of EEG data
+
+    Returns:
+        ndarray: per epoch NOT_REJECTED, or the index in REASONS plus one
+    """
+    n_epochs = eeg.shape[0]
+    codes = numpy.full(n_epochs, NOT_REJECTED, dtype=numpy.uint8)
+    step = chunk_epochs(eeg.shape, eeg.itemsize, max_bytes)
+    for start in range(0, n_epochs, step):
+        chunk = slice(start, start + step)
+        eeg_chunk, eog_chunk = eeg[chunk], eog[chunk]
+        eeg_extremes = extremes(eeg_chunk)
+        checks = (
+            exceeds_transient(eeg_chunk, THRESH_TRANS, *eeg_extremes),
+            exceeds_deviation(eeg_chunk, THRESH_PEAK, *eeg_extremes),
+            exceeds_deviation(eog_chunk, THRESH_EOG, *extremes(eog_chunk)),
+        )
+        ## the first reason that applies, checked in reverse so that it is written last
+        chunk_codes = codes[chunk]
+        for code in range(len(checks), 0, -1):
+            chunk_codes[checks[code - 1]] = code
+    return codes
+
+
+def summarize(codes: numpy.ndarray) -> Tuple[numpy.ndarray, List[str], Dict[str, int]]:
+    """Rejected epochs, their annotation descriptions, and the count for each reason
+    """
+    bad_epochs = numpy.flatnonzero(codes != NOT_REJECTED)
+    descriptions = [REASONS[c - 1][1] for c in codes[bad_epochs]]
+    counts = dict([(name, int((codes == r + 1).sum())) for r, (name, _) in enumerate(REASONS)])
+    return bad_epochs, descriptions, counts
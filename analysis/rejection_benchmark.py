@@ -0,0 +1,110 @@
+"""Benchmark the threshold rejection of annotate.py against the loop it replaced
+
+Simulates epochs of noise with transients, drifts and blinks added to
+some of them, checks that rejection.rejection_codes gives the same
+reasons as the per-epoch loop, and reports the duration and the peak
+memory of the intermediate arrays of both.
+
+    python analysis/rejection_benchmark.py --epochs 1000
+"""
+from __future__ import annotations
+from typing import Callable, List, Tuple
+from argparse import ArgumentParser
+from time import perf_counter
+import tracemalloc
+import numpy
+from rejection import (THRESH_TRANS, THRESH_PEAK, THRESH_EOG, REASONS,
+                       rejection_codes, summarize)
+
+
+def reference_loop(eeg: numpy.ndarray, eog: numpy.ndarray) -> Tuple[List[int], List[str]]:
+    """The per-epoch loop annotate.py used before
+    """
+    bad_epochs = []
+    descriptions = []
+    for e in range(eeg.shape[0]):
+        transients = numpy.abs(numpy.diff(eeg[e, :, :]))
+        if numpy.any(transients > THRESH_TRANS):
+            bad_epochs.append(e)
+            descriptions.append('bad transient')
+            continue
+
+        eeg_epoch = eeg[e, :, :].T
+        eeg_peaks = eeg_epoch - eeg_epoch.mean(axis=0)
+        if numpy.any(numpy.abs(eeg_peaks) > THRESH_PEAK):
+            bad_epochs.append(e)
+            descriptions.append('bad peak')
+            continue
+
+        eog_epoch = eog[e, :, :].T
+        eog_peaks = eog_epoch - eog_epoch.mean(axis=0)
+        if numpy.any(numpy.abs(eog_peaks) > THRESH_EOG):
+            bad_epochs.append(e)
+            descriptions.append('bad blink')
+            continue
+    return bad_epochs, descriptions
+
+
+def simulate(n_epochs: int, n_channels: int, n_times: int, seed: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Noise in uV, with artifacts of each kind (some near the threshold) in about 30% of epochs
+    """
+    rng = numpy.random.default_rng(seed)
+    eeg = rng.normal(0, 10, size=(n_epochs, n_channels, n_times))
+    eog = rng.normal(0, 8, size=(n_epochs, 2, n_times))
+    times = numpy.arange(n_times)
+    for e in rng.choice(n_epochs, n_epochs // 10, replace=False):
+        ## a jump on one channel
+        eeg[e, rng.integers(n_channels), rng.integers(n_times // 2):] += rng.uniform(60, 160)
+    for e in rng.choice(n_epochs, n_epochs // 10, replace=False):
+        ## a slow drift on one channel
+        eeg[e, rng.integers(n_channels)] += numpy.linspace(0, rng.uniform(200, 500), n_times)
+    for e in rng.choice(n_epochs, n_epochs // 10, replace=False):
+        ## a blink on the EOG
+        center, width = rng.integers(n_times), rng.uniform(10, 40)
+        eog[e, rng.integers(2)] += rng.uniform(60, 200) * numpy.exp(-((times - center) / width)**2)
+    return eeg, eog
+
+
+def measure(func: Callable[[], object], repeats: int) -> Tuple[float, float, object]:
+    """Best duration in seconds, peak memory in MB and the result of func
+    """
+    durations = []
+    for _ in range(repeats):
+        start = perf_counter()
+        result = func()
+        durations.append(perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(durations), peak / 2**20, result
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--epochs', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=64)
+    parser.add_argument('--times', type=int, default=768, help='samples per epoch')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=2005)
+    args = parser.parse_args()
+
+    eeg, eog = simulate(args.epochs, args.channels, args.times, args.seed)
+    print(f'{args.epochs} epochs x {args.channels} channels x {args.times} samples '
+          f'({eeg.nbytes / 2**20:.0f} MB)')
+
+    loop_secs, loop_mb, (loop_bad, loop_desc) = measure(lambda: reference_loop(eeg, eog), args.repeats)
+    vec_secs, vec_mb, codes = measure(lambda: rejection_codes(eeg, eog), args.repeats)
+    bad_epochs, descriptions, counts = summarize(codes)
+
+    assert bad_epochs.tolist() == loop_bad, 'different epochs rejected'
+    assert descriptions == loop_desc, 'different rejection reasons'
+    for max_bytes in (1, 2**20):
+        assert numpy.array_equal(rejection_codes(eeg, eog, max_bytes), codes), 'chunks change the result'
+    print('Same rejections as the loop: ' + ', '.join(f'{n} {name}' for name, n in counts.items()) +
+          f' of {args.epochs} ({len(REASONS)} reasons)')
+
+    print(f'{"":>12} {"seconds":>10} {"peak MB":>10}')
+    print(f'{"loop":>12} {loop_secs:>10.3f} {loop_mb:>10.1f}')
+    print(f'{"vectorized":>12} {vec_secs:>10.3f} {vec_mb:>10.1f}')
+    print(f'Speedup: {loop_secs / vec_secs:.1f}x')
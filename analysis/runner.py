@@ -0,0 +1,166 @@
+"""Per-subject execution of the analysis scripts
+
+Each script has a function that processes one subject and passes it to
+run_subjects(). With --jobs above 1 the subjects are spread over a pool
+of processes. Everything a subject prints (including MNE messages and
+warnings) is also written to its own log file, in the `logs` folder of
+the derivatives, and a subject that raises an exception is reported at
+the end without stopping the others:
+
+    python analysis/annotate.py --jobs 4 --subjects sub-01 sub-02
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO
+from dataclasses import dataclass
+from argparse import ArgumentParser, Namespace, RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from os.path import join, expanduser, basename
+from glob import glob
+from time import perf_counter
+import os, sys, traceback
+from utils import print_info, print_warn
+from config import DATA_DIR, DERIV_NAME
+
+
+@dataclass
+class SubjectResult:
+    """Outcome of processing one subject
+    """
+    sub: str
+    log_fpath: str
+    duration: float # seconds
+    value: Any = None # what the function returned
+    error: Optional[str] = None # traceback, if it raised an exception
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Tee:
+    """Writes to a log file, and optionally to the console
+    """
+
+    def __init__(self, fhandle: TextIO, echo: Optional[TextIO]) -> None:
+        self.fhandle = fhandle
+        self.echo = echo
+
+    def write(self, text: str) -> int:
+        if self.echo is not None:
+            self.echo.write(text)
+        return self.fhandle.write(text)
+
+    def flush(self) -> None:
+        if self.echo is not None:
+            self.echo.flush()
+        self.fhandle.flush()
+
+
+def make_parser(description: Optional[str]=None) -> ArgumentParser:
+    """Command line options shared by the analysis scripts
+    """
+    parser = ArgumentParser(description=description, formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of subjects processed in parallel')
+    parser.add_argument('--subjects', nargs='+', metavar='SUB',
+                        help='only process these subjects, e.g. sub-01 sub-02')
+    return parser
+
+
+def parse_args(description: Optional[str]=None, argv: Optional[Sequence[str]]=None) -> Namespace:
+    return make_parser(description).parse_args(argv)
+
+
+def list_subjects(data_dir: str, only: Optional[Sequence[str]]=None) -> List[str]:
+    """Subjects in the BIDS data directory, optionally limited to `only`
+    """
+    subs = [basename(d) for d in sorted(glob(join(data_dir, 'sub-*')))]
+    if only:
+        missing = set(only) - set(subs)
+        if missing:
+            raise ValueError(f'Unknown subjects: {sorted(missing)}')
+        subs = [sub for sub in subs if sub in only]
+    return subs
+
+
+def list_sources(data_dir: str) -> Dict[str, str]:
+    """Source data directory of each subject, numbered in the order of the source data
+    """
+    source_dirs = sorted(glob(join(data_dir, 'sourcedata', 'sub-UOLM*')))
+    return dict([(f'sub-{s:02}', source_dir) for s, source_dir in enumerate(source_dirs, start=1)])
+
+
+def log_dir() -> str:
+    return join(expanduser(DATA_DIR), 'derivatives', DERIV_NAME, 'logs')
+
+
+def run_subject(name: str, func: Callable[..., Any], sub: str, echo: bool, kwargs: dict) -> SubjectResult:
+    """Call func(sub, **kwargs) with its output written to the log file of the subject
+    """
+    log_fpath = join(log_dir(), f'{name}_{sub}.log')
+    os.makedirs(log_dir(), exist_ok=True)
+    start = perf_counter()
+    value, error = None, None
+    with open(log_fpath, 'w') as fhandle:
+        out = Tee(fhandle, sys.stdout if echo else None)
+        err = Tee(fhandle, sys.stderr if echo else None)
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                value = func(sub, **kwargs)
+            except Exception:
+                error = traceback.format_exc()
+                err.write(error)
+    return SubjectResult(sub, log_fpath, perf_counter() - start, value, error)
+
+
+def run_subjects(name: str, func: Callable[..., Any], subjects: Sequence[str],
+                 jobs: int=1, **kwargs) -> List[SubjectResult]:
+    """Process each subject, in parallel if jobs > 1
+
+    Args:
+        name (str): name of the script, used for the log files
+        func (Callable): processes one subject: func(sub, **kwargs). Must be
+            a module level function, and its arguments and return value
+            must be picklable if jobs > 1.
+        subjects (list): subject IDs, e.g. sub-01
+        jobs (int): number of processes. With 1 the subjects are processed
+            one after the other in this process, and their output is
+            also shown.
+
+    Returns:
+        list: a SubjectResult per subject, in the order of `subjects`
+    """
+    results = dict()
+    if jobs <= 1 or len(subjects) <= 1:
+        for sub in subjects:
+            print_info(f'[{name}] {sub}..')
+            results[sub] = run_subject(name, func, sub, True, kwargs)
+    else:
+        print_info(f'[{name}] Processing {len(subjects)} subjects in {jobs} processes..')
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(run_subject, name, func, sub, False, kwargs) for sub in subjects]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result.sub] = result
+                if result.ok:
+                    print_info(f'[{name}] {result.sub} done in {result.duration:.1f} s')
+                else:
+                    print_warn(f'[{name}] {result.sub} failed, see {result.log_fpath}')
+    ordered = [results[sub] for sub in subjects]
+    report(name, ordered)
+    return ordered
+
+
+def report(name: str, results: Sequence[SubjectResult]) -> None:
+    """Summary of a run, with the last line of the traceback of each failed subject
+    """
+    failed = [r for r in results if not r.ok]
+    print_info(f'[{name}] {len(results) - len(failed)}/{len(results)} subjects processed')
+    for result in failed:
+        assert result.error is not None
+        print_warn(f'  {result.sub}: {result.error.strip().splitlines()[-1]} (log: {result.log_fpath})')
+
+
+def successful(results: Sequence[SubjectResult]) -> List[SubjectResult]:
+    return [r for r in results if r.ok]
@@ -0,0 +1,311 @@
+"""Generate synthetic source data to exercise the analysis pipeline
+
+For each subject a session is simulated (experiment.simulation), and the
+recording is synthesized from its triggers: a Biosemi-style BDF file with
+64 scalp channels, mastoids, EOG and a Status channel carrying the trigger
+codes, next to the trials file and bads.txt, in the layout bidsify.py
+expects (sourcedata/sub-UOLM*).
+
+The signal is background noise (white noise, alpha rhythm, line noise and
+drift), blinks on the VEOG and frontal channels, an N1 to both targets and
+a P3b to T2 scaled by the visibility rating, starting LATENCY after the
+trigger. Glitches are added as voltage jumps, as spikes on the Status
+channel above the trigger bits, and as noisy channels listed in bads.txt.
+
+The file is written one data record (second) at a time, so memory use does
+not depend on the length of the session.
+
+    python analysis/synthetic.py --subjects 24 --sfreq 512
+"""
+from __future__ import annotations
+from typing import Dict, List, Tuple, BinaryIO
+from dataclasses import dataclass
+from argparse import ArgumentParser
+from datetime import datetime
+from os.path import expanduser, join
+import os
+import numpy
+from mne.channels import make_standard_montage
+from experiment.simulation import SimulationEngine, BlinkModel, simulateSession
+from experiment.codec import decode
+from config import DATA_DIR, FRAME_RATE, LATENCY, ROIS
+from utils import print_info
+
+SITE = 'UOLM'
+EXG_CHANNELS = ['EXG1', 'EXG2', 'EXG3', 'EXG4', 'EXG5', 'EXG6', 'EXG7', 'EXG8']
+MISC_CHANNELS = ['GSR1', 'GSR2', 'Erg1', 'Erg2', 'Resp', 'Plet', 'Temp']
+## Biosemi 24 bit range, 1/32 uV per bit
+DIGITAL_RANGE = (-8388608, 8388607)
+PHYSICAL_RANGE_UV = (-262144, 262143)
+## bidsify.py and annotate.py skip these bits of the Status channel
+STATUS_NOISE_BITS = (8, 9, 10, 11, 12, 13, 14, 15)
+## subject position (in sorted order) and number of trials recorded before
+## the EEG was started, matching the recordings handled in bidsify.py
+LATE_STARTS = {3: 8, 5: 16}
+FRONTAL = ['Fp1', 'Fpz', 'Fp2', 'AF7', 'AF3', 'AFz', 'AF4', 'AF8']
+
+
+@dataclass
+class SignalSettings:
+    sfreq: int = 512
+    noise_uv: float = 8.0 # white noise per channel
+    alpha_uv: float = 6.0 # 10Hz rhythm, strongest at the back of the head
+    line_uv: float = 2.0 # 50Hz
+    drift_uv: float = 20.0 # slow drift
+    blink_rate: float = 0.2 # per second
+    blink_uv: float = 150.0
+    n1_uv: float = 4.0
+    p3b_uv: float = 8.0
+    glitch_rate: float = 0.01 # voltage jumps per second
+    glitch_uv: float = 400.0
+    status_glitch_rate: float = 0.05 # spikes on the Status channel per second
+    n_bads: int = 2 # noisy channels, listed in bads.txt
+    pulse_ms: float = 5.0 # trigger pulse width
+
+
+def channel_names() -> List[str]:
+    return make_standard_montage('biosemi64').ch_names + EXG_CHANNELS + MISC_CHANNELS + ['Status']
+
+
+def scalp_weights(focus: List[str], width: float=0.04) -> numpy.ndarray:
+    """Topography of a component: gaussian over distance to its focus channels
+    """
+    montage = make_standard_montage('biosemi64')
+    pos = montage.get_positions()['ch_pos']
+    names = montage.ch_names
+    xyz = numpy.array([pos[n] for n in names])
+    center = numpy.array([pos[n] for n in focus]).mean(axis=0)
+    dist = numpy.linalg.norm(xyz - center, axis=1)
+    return numpy.exp(-(dist / width)**2 / 2)
+
+
+def component(sfreq: int, latency: float, width: float, length: float) -> numpy.ndarray:
+    """Gaussian waveform peaking at latency (seconds)
+    """
+    t = numpy.arange(round(length * sfreq)) / sfreq
+    return numpy.exp(-((t - latency) / width)**2 / 2)
+
+
+def write_bdf_header(fhandle: BinaryIO, names: List[str], sfreq: int, n_records: int,
+                     start: datetime, subject: str) -> None:
+    """BDF header with one-second data records
+    """
+    n = len(names)
+
+    def field(val, width: int) -> bytes:
+        return str(val).ljust(width)[:width].encode('ascii')
+
+    def per_channel(vals: List, width: int) -> bytes:
+        return b''.join(field(v, width) for v in vals)
+
+    status = [name == 'Status' for name in names]
+    header = b''.join([
+        b'\xffBIOSEMI',
+        field(subject, 80),
+        field('synthetic recording', 80),
+        field(start.strftime('%d.%m.%y'), 8),
+        field(start.strftime('%H.%M.%S'), 8),
+        field(256 * (n + 1), 8),
+        field('24BIT', 44),
+        field(n_records, 8),
+        field(1, 8),
+        field(n, 4),
+        per_channel(names, 16),
+        per_channel(['Triggers and Status' if s else 'Active Electrode' for s in status], 80),
+        per_channel(['Boolean' if s else 'uV' for s in status], 8),
+        per_channel([DIGITAL_RANGE[0] if s else PHYSICAL_RANGE_UV[0] for s in status], 8),
+        per_channel([DIGITAL_RANGE[1] if s else PHYSICAL_RANGE_UV[1] for s in status], 8),
+        per_channel([DIGITAL_RANGE[0]] * n, 8),
+        per_channel([DIGITAL_RANGE[1]] * n, 8),
+        per_channel(['No filtering' if s else 'HP:DC; LP:104 Hz' for s in status], 80),
+        per_channel([sfreq] * n, 8),
+        per_channel([''] * n, 32),
+    ])
+    assert len(header) == 256 * (n + 1)
+    fhandle.write(header)
+
+
+def encode_record(record: numpy.ndarray) -> bytes:
+    """Channels x samples of digital values as 24 bit little-endian integers
+    """
+    ints = numpy.clip(record, *DIGITAL_RANGE).astype('<i4')
+    return ints.view(numpy.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+def session_events(engine: SimulationEngine, trials_fpath: str, skip_trials: int
+                   ) -> Tuple[numpy.ndarray, numpy.ndarray, Dict[int, float]]:
+    """Trigger times and values of the simulated session, and the
+    visibility (0-1) of each T2 trigger by its index, from the trials file
+    """
+    from pandas import read_csv
+    times, values = engine.triggers()
+    trials = read_csv(trials_fpath, index_col=0)
+    decoded = decode(values)
+    t2_indices = numpy.flatnonzero(decoded['target'] & decoded['forT2'])
+    scale = trials.vis_rating.max() or 1
+    visibility = {int(i): float(r) / scale for i, r in zip(t2_indices, trials.vis_rating)}
+    ## each trial starts with the T1 trigger, the recording starts before trial skip_trials
+    t1_indices = numpy.flatnonzero(decoded['target'] & ~decoded['forT2'])
+    first = t1_indices[skip_trials] if skip_trials else 0
+    visibility = {i - first: v for i, v in visibility.items() if i >= first}
+    return times[first:], values[first:], visibility
+
+
+def synthesize_recording(fpath: str, times: numpy.ndarray, values: numpy.ndarray,
+                         visibility: Dict[int, float], bads: List[str],
+                         settings: SignalSettings, rng: numpy.random.Generator, subject: str) -> None:
+    """Write the BDF file for a session with the given triggers
+
+    Args:
+        fpath (str): path of the .bdf file
+        times (ndarray): trigger times in seconds
+        values (ndarray): trigger codes
+        visibility (dict): for the index of each T2 trigger, visibility from 0 to 1
+        bads (list): channels to make noisy
+        settings (SignalSettings): signal and artifact parameters
+        rng (Generator): random generator
+        subject (str): subject ID for the header
+    """
+    sfreq = settings.sfreq
+    names = channel_names()
+    n_chans = len(names)
+    scalp = make_standard_montage('biosemi64').ch_names
+    n_scalp = len(scalp)
+    idx = {name: c for c, name in enumerate(names)}
+    status = idx['Status']
+    uv_to_digital = (DIGITAL_RANGE[1] - DIGITAL_RANGE[0]) / (PHYSICAL_RANGE_UV[1] - PHYSICAL_RANGE_UV[0])
+
+    ## recording starts a few seconds before the first trigger
+    offset = times[0] - 5.0
+    onsets = numpy.round((times - offset) * sfreq).astype(int)
+    n_records = int(numpy.ceil((times[-1] - offset + 5.0)))
+    n_samples = n_records * sfreq
+
+    ## status channel: trigger pulses, plus spikes in bits the analysis masks out
+    status_data = numpy.zeros(n_samples, dtype=numpy.int32)
+    pulse = max(1, round(settings.pulse_ms / 1000 * sfreq))
+    for onset, value in zip(onsets, values):
+        status_data[onset:onset+pulse] = value
+    n_spikes = rng.poisson(settings.status_glitch_rate * n_records)
+    spikes = rng.integers(0, n_samples, n_spikes)
+    bits = rng.choice(STATUS_NOISE_BITS, n_spikes)
+    status_data[spikes] |= (1 << bits).astype(numpy.int32)
+
+    ## evoked responses: N1 to both targets, P3b to T2 by visibility
+    latency = round(LATENCY * sfreq)
+    n1_map = scalp_weights(ROIS['N1']) * -settings.n1_uv
+    p3b_map = scalp_weights(ROIS['P3b']) * settings.p3b_uv
+    n1_wave = component(sfreq, 0.18, 0.03, 0.8)
+    p3b_wave = component(sfreq, 0.45, 0.08, 0.8)
+    n1_erp = numpy.outer(n1_map, n1_wave)
+    p3b_erp = numpy.outer(p3b_map, p3b_wave)
+    targets = decode(values)['target']
+    erps: List[Tuple[int, numpy.ndarray]] = []
+    for e, (onset, value) in enumerate(zip(onsets, values)):
+        if not targets[e]:
+            continue
+        erp = n1_erp
+        if e in visibility:
+            erp = n1_erp + visibility[e] * p3b_erp
+        erps.append((onset + latency, erp))
+    erp_onsets = numpy.array([o for o, _ in erps])
+    erp_len = n1_wave.size
+
+    ## blinks on the VEOG (opposite polarity above and below the eye) and frontal channels
+    blink_wave = component(sfreq, 0.15, 0.05, 0.4) * settings.blink_uv
+    n_blinks = rng.poisson(settings.blink_rate * n_records)
+    blink_onsets = numpy.sort(rng.integers(0, n_samples - blink_wave.size, n_blinks))
+    blink_map = numpy.zeros(n_chans)
+    blink_map[idx['EXG6']] = 1.0
+    blink_map[idx['EXG5']] = -0.3
+    for name in FRONTAL:
+        blink_map[idx[name]] = 0.5
+
+    ## glitches: a short voltage jump on a random scalp channel
+    n_glitches = rng.poisson(settings.glitch_rate * n_records)
+    glitch_onsets = numpy.sort(rng.integers(0, n_samples - sfreq, n_glitches))
+    glitch_chans = rng.integers(0, n_scalp, n_glitches)
+    glitch_len = max(1, round(0.02 * sfreq))
+
+    ## fixed per-channel parameters of the background
+    alpha = numpy.zeros(n_chans)
+    alpha[:n_scalp] = settings.alpha_uv * (0.3 + scalp_weights(['Oz', 'POz'], 0.08))
+    alpha_phase = rng.uniform(0, 2*numpy.pi, n_chans)
+    noise = numpy.full(n_chans, settings.noise_uv)
+    noise[[idx[b] for b in bads]] *= 10
+    noise[[idx[m] for m in MISC_CHANNELS]] = 0.5
+    drift_phase = rng.uniform(0, 2*numpy.pi, n_chans)
+    t_rec = numpy.arange(sfreq) / sfreq
+
+    with open(fpath, 'wb') as fhandle:
+        write_bdf_header(fhandle, names, sfreq, n_records, datetime.now(), subject)
+        for r in range(n_records):
+            start, stop = r * sfreq, (r+1) * sfreq
+            t = r + t_rec
+            data = rng.standard_normal((n_chans, sfreq)) * noise[:, None]
+            data += alpha[:, None] * numpy.sin(2*numpy.pi*10*t[None, :] + alpha_phase[:, None])
+            data += settings.line_uv * numpy.sin(2*numpy.pi*50*t)[None, :]
+            data += settings.drift_uv * numpy.sin(2*numpy.pi*0.05*t[None, :] + drift_phase[:, None])
+            ## add the evoked responses, blinks and glitches that overlap with this record
+            for o in range(numpy.searchsorted(erp_onsets, start - erp_len), numpy.searchsorted(erp_onsets, stop)):
+                onset, erp = erps[o]
+                a, b = max(start, onset), min(stop, onset + erp_len)
+                data[:n_scalp, a-start:b-start] += erp[:, a-onset:b-onset]
+            for onset in blink_onsets[numpy.searchsorted(blink_onsets, start - blink_wave.size):
+                                      numpy.searchsorted(blink_onsets, stop)]:
+                a, b = max(start, onset), min(stop, onset + blink_wave.size)
+                data[:, a-start:b-start] += blink_map[:, None] * blink_wave[None, a-onset:b-onset]
+            for g in range(numpy.searchsorted(glitch_onsets, start - glitch_len), numpy.searchsorted(glitch_onsets, stop)):
+                onset = glitch_onsets[g]
+                a, b = max(start, onset), min(stop, onset + glitch_len)
+                data[glitch_chans[g], a-start:b-start] += settings.glitch_uv
+            digital = numpy.round(data * uv_to_digital)
+            digital[status] = status_data[start:stop]
+            fhandle.write(encode_record(digital))
+
+
+def generate_subject(pid: int, position: int, source_root: str, settings: SignalSettings, seed: int) -> str:
+    """Simulate a session and write its source data directory
+
+    Returns:
+        str: the source data directory of the subject
+    """
+    sub = f'{SITE}{pid}'
+    source_dir = join(source_root, f'sub-{sub}')
+    os.makedirs(source_dir, exist_ok=True)
+    rng = numpy.random.default_rng(seed)
+
+    engine = SimulationEngine(BlinkModel(seed), flipRate=FRAME_RATE, seed=seed)
+    trials_fpath = simulateSession(pid, source_dir, engine, site=SITE, seed=seed)
+
+    bads = list(rng.choice(make_standard_montage('biosemi64').ch_names, settings.n_bads, replace=False))
+    with open(join(source_dir, 'bads.txt'), 'w') as fhandle:
+        fhandle.write(','.join(bads))
+
+    times, values, visibility = session_events(engine, trials_fpath, LATE_STARTS.get(position, 0))
+    bdf_fpath = join(source_dir, f'sub-{sub}.bdf')
+    synthesize_recording(bdf_fpath, times, values, visibility, bads, settings, rng, sub)
+    return source_dir
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Write synthetic sourcedata for the analysis pipeline')
+    parser.add_argument('--subjects', type=int, default=6, help='number of subjects')
+    parser.add_argument('--sfreq', type=int, default=512, help='sampling rate')
+    parser.add_argument('--noise', type=float, default=8.0, help='white noise (uV)')
+    parser.add_argument('--blink-rate', type=float, default=0.2, help='blinks per second')
+    parser.add_argument('--glitch-rate', type=float, default=0.01, help='voltage jumps per second')
+    parser.add_argument('--bads', type=int, default=2, help='number of noisy channels per subject')
+    parser.add_argument('--seed', type=int, default=0, help='added to the participant index to seed each subject')
+    parser.add_argument('-o', '--output', default=DATA_DIR, help='BIDS data directory')
+    args = parser.parse_args()
+
+    settings = SignalSettings(sfreq=args.sfreq, noise_uv=args.noise, blink_rate=args.blink_rate,
+                              glitch_rate=args.glitch_rate, n_bads=args.bads)
+    source_root = join(expanduser(args.output), 'sourcedata')
+    pids = list(range(1, args.subjects+1))
+    ## bidsify.py numbers subjects in sorted order of the directory names
+    ordered = sorted(pids, key=lambda pid: f'sub-{SITE}{pid}')
+    for position, pid in enumerate(ordered, start=1):
+        print_info(f'Generating sub-{SITE}{pid}..')
+        generate_subject(pid, position, source_root, settings, args.seed + pid)
@@ -1,6 +1,10 @@
-from os.path import join, expanduser, basename
-from glob import glob
+"""Evaluate timing: SOA between the T1 and T2 triggers, per subject
+"""
+from typing import Dict, List
+from argparse import Namespace
+from os.path import join, expanduser
 from utils import read_events, print_warn, print_info
+from runner import SubjectResult, parse_args, list_subjects, run_subjects, successful
 from pandas import DataFrame
 from experiment.timer import Timer
 from experiment.constants import Constants
@@ -9,8 +13,6 @@ import matplotlib.pyplot as plt
 import seaborn
 
 
-print_info(f'## Evaluate timing')
-
 timer = Timer()
 const = Constants()
 timer.optimizeFlips(FRAME_RATE, const)
@@ -21,14 +23,15 @@ short_target = timer.flipsToSecs(const.short_SOA)*1000
 long_target = timer.flipsToSecs(const.long_SOA)*1000
 
 data_dir = expanduser(DATA_DIR)
-sub_dirs = sorted(glob(join(data_dir, 'sub-*')))
 
-trials = []
-for sub_dir in sub_dirs:
-    sub = basename(sub_dir)
+
+def subject_soas(sub: str) -> List[Dict]:
+    """Measured SOA of each trial of a subject
+    """
     print_info(f'Reading events for {sub}..')
 
     df = read_events(data_dir, sub)
+    trials = []
     for t in df.trial_index.unique():
         trial_events = df[df.trial_index == t]
         t1_event = trial_events[trial_events.trial_type == 't1'].iloc[0]
@@ -42,33 +45,45 @@ for sub_dir in sub_dirs:
                 ms=(t2_onset-t1_onset)*1000
             )
         )
+    return trials
+
+
+def plot_soas(trials_df: DataFrame) -> None:
+    ## Seaborn box plot with entry per subject
+    plt.figure()
+    ax = seaborn.boxplot(data=trials_df, y='sub', x='ms', hue='soa')
+    ax.set(
+        title='Timing: SOA (ms) per subject',
+        ylabel='Subject',
+        xlabel='SOA (ms)'
+    )
 
+    # Add vertical reference lines at target values
+    ax.axvline(x=SHORT_ORIG, color='blue', linestyle='--', linewidth=1, alpha=0.7)
+    ax.text(SHORT_ORIG, ax.get_ylim()[1], 'short_orig', va='bottom', ha='center', fontsize=9, color='blue', rotation=90)
 
-trials_df = DataFrame(trials)
+    ax.axvline(x=LONG_ORIG, color='red', linestyle='--', linewidth=1, alpha=0.7)
+    ax.text(LONG_ORIG, ax.get_ylim()[1], 'long_orig', va='bottom', ha='center', fontsize=9, color='red', rotation=90)
 
+    ax.axvline(x=short_target, color='cyan', linestyle=':', linewidth=1, alpha=0.7)
+    ax.text(short_target, ax.get_ylim()[1], 'short_target', va='bottom', ha='center', fontsize=9, color='cyan', rotation=90)
 
-## Seaborn box plot with entry per subject
-plt.figure()
-ax = seaborn.boxplot(data=trials_df, y='sub', x='ms', hue='soa')
-ax.set(
-    title='Timing: SOA (ms) per subject',
-    ylabel='Subject',
-    xlabel='SOA (ms)'
-)
+    ax.axvline(x=long_target, color='orange', linestyle=':', linewidth=1, alpha=0.7)
+    ax.text(long_target, ax.get_ylim()[1], 'long_target', va='bottom', ha='center', fontsize=9, color='orange', rotation=90)
 
-# Add vertical reference lines at target values
-ax.axvline(x=SHORT_ORIG, color='blue', linestyle='--', linewidth=1, alpha=0.7)
-ax.text(SHORT_ORIG, ax.get_ylim()[1], 'short_orig', va='bottom', ha='center', fontsize=9, color='blue', rotation=90)
+    plt.tight_layout()
+    plt.savefig(join(data_dir, 'derivatives', DERIV_NAME, 'timing_soa.png'))
+    plt.close()
 
-ax.axvline(x=LONG_ORIG, color='red', linestyle='--', linewidth=1, alpha=0.7)
-ax.text(LONG_ORIG, ax.get_ylim()[1], 'long_orig', va='bottom', ha='center', fontsize=9, color='red', rotation=90)
 
-ax.axvline(x=short_target, color='cyan', linestyle=':', linewidth=1, alpha=0.7)
-ax.text(short_target, ax.get_ylim()[1], 'short_target', va='bottom', ha='center', fontsize=9, color='cyan', rotation=90)
+def main(args: Namespace) -> List[SubjectResult]:
+    print_info(f'## Evaluate timing')
+    subjects = list_subjects(data_dir, args.subjects)
+    results = run_subjects('timing', subject_soas, subjects, args.jobs)
+    trials = [trial for result in successful(results) for trial in result.value]
+    plot_soas(DataFrame(trials))
+    return results
 
-ax.axvline(x=long_target, color='orange', linestyle=':', linewidth=1, alpha=0.7)
-ax.text(long_target, ax.get_ylim()[1], 'long_target', va='bottom', ha='center', fontsize=9, color='orange', rotation=90)
 
-plt.tight_layout()
-plt.savefig(join(data_dir, 'derivatives', DERIV_NAME, 'timing_soa.png'))
-plt.close()
+if __name__ == '__main__':
+    main(parse_args(__doc__))
@@ -0,0 +1,68 @@
+"""Bounded cache of pre-rendered text stimuli
+
+Changing the text of a psychopy TextStim means laying out the glyphs
+and uploading a new texture. The cache keeps one stimulus per string,
+so that this work happens before the rapid presentation sequence
+instead of on the frame where the string appears.
+"""
+from __future__ import annotations
+from typing import Callable, Dict, Generic, Iterable, TypeVar
+from collections import OrderedDict
+T = TypeVar('T')
+
+
+class StimulusCache(Generic[T]):
+
+    capacity: int
+    evictions: int
+
+    def __init__(self, factory: Callable[[str], T], capacity: int) -> None:
+        """
+        Args:
+            factory (Callable[[str], T]): creates (and renders) the stimulus for a string
+            capacity (int): maximum number of unpinned stimuli kept
+        """
+        self.factory = factory
+        self.capacity = capacity
+        self.evictions = 0
+        self._items: OrderedDict[str, T] = OrderedDict()
+        self._pinned: Dict[str, T] = dict()
+
+    def get(self, text: str) -> T:
+        """Stimulus for this string, rendering it now if it is not cached
+        """
+        if text in self._pinned:
+            return self._pinned[text]
+        if text in self._items:
+            self._items.move_to_end(text)
+            return self._items[text]
+        stim = self.factory(text)
+        self._items[text] = stim
+        self._evict()
+        return stim
+
+    def preload(self, texts: Iterable[str], pin: bool = False) -> None:
+        """Render these strings ahead of time
+
+        Args:
+            texts (Iterable[str]): strings to render
+            pin (bool): pinned stimuli are never evicted (e.g. the targets)
+        """
+        for text in texts:
+            if pin:
+                if text not in self._pinned:
+                    stim = self._items.pop(text, None)
+                    self._pinned[text] = stim if stim is not None else self.factory(text)
+            else:
+                self.get(text)
+
+    def _evict(self) -> None:
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, text: str) -> bool:
+        return (text in self._pinned) or (text in self._items)
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._items)
@@ -0,0 +1,108 @@
+"""Encoding of trial conditions in trigger codes, and decoding of recorded codes
+
+Target codes (T1 and T2 onset) have six bits, from most to least significant:
+training, test (not training), forT2, t2Present, dualTask, longSOA.
+The prompts have their own codes: 1 for the T1 identity question and
+2 for the T2 visibility rating, plus 10 in training.
+See experiment.triggers.Triggers for the name of every code.
+
+Both directions are lookup tables, so an array of codes, such as the last
+column of an MNE events array, is decoded in one step:
+
+    events = mne.find_events(raw, mask=STATUS_MASK, mask_type='not_and')
+    decoded = decode(events)
+    t2_events = events[decoded['target'] & decoded['forT2']]
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+import itertools
+import numpy
+
+FLAGS = ('training', 'forT2', 't2Present', 'dualTask', 'longSOA')
+
+## values of the prompt column
+NO_PROMPT = 0
+PROMPT_IDENTITY = 1 # T1 identity question
+PROMPT_VISIBILITY = 2 # T2 visibility rating
+PROMPT_CODES: Dict[int, tuple] = { # code: (training, prompt)
+    1: (False, PROMPT_IDENTITY),
+    2: (False, PROMPT_VISIBILITY),
+    11: (True, PROMPT_IDENTITY),
+    12: (True, PROMPT_VISIBILITY),
+}
+
+## bits of the Biosemi Status channel that do not carry the trigger code
+STATUS_MASK = sum([2**i for i in (8, 9, 10, 11, 12, 13, 14, 15, 16)])
+
+## code for each combination of FLAGS, indexed as ENCODE[training, forT2, t2Present, dualTask, longSOA]
+ENCODE = numpy.zeros((2,) * len(FLAGS), dtype=numpy.uint8)
+for _bools in itertools.product((0, 1), repeat=len(FLAGS)):
+    _training, *_rest = _bools
+    _bits = [_training, 1 - _training] + _rest
+    ENCODE[_bools] = sum(b << (len(_bits) - 1 - i) for i, b in enumerate(_bits))
+
+DECODE_DTYPE = numpy.dtype([('known', '?'), ('target', '?')] +
+                           [(flag, '?') for flag in FLAGS] + [('prompt', 'u1')])
+
+## conditions of each code from 0 to 255; dualTask and forT2 are not known for a prompt
+DECODE = numpy.zeros(256, dtype=DECODE_DTYPE)
+for _bools in itertools.product((False, True), repeat=len(FLAGS)):
+    _code = ENCODE[tuple(int(b) for b in _bools)]
+    DECODE['known'][_code] = True
+    DECODE['target'][_code] = True
+    for _flag, _val in zip(FLAGS, _bools):
+        DECODE[_flag][_code] = _val
+for _code, (_training, _prompt) in PROMPT_CODES.items():
+    DECODE['known'][_code] = True
+    DECODE['training'][_code] = _training
+    DECODE['prompt'][_code] = _prompt
+
+EVENT_DTYPE = numpy.dtype([('sample', 'i8'), ('value', 'i8')] + DECODE_DTYPE.descr)
+
+
+def encode(training=False, forT2=False, t2Present=False, dualTask=False, longSOA=False):
+    """Trigger code of a target, for single conditions or numpy arrays of them
+    """
+    code = ENCODE[numpy.asarray(training, dtype=int), numpy.asarray(forT2, dtype=int),
+                  numpy.asarray(t2Present, dtype=int), numpy.asarray(dualTask, dtype=int),
+                  numpy.asarray(longSOA, dtype=int)]
+    return int(code) if numpy.ndim(code) == 0 else code
+
+
+def decode(events: numpy.ndarray) -> numpy.ndarray:
+    """Conditions of recorded trigger codes
+
+    Args:
+        events (ndarray): MNE events array (samples x 3), or a 1D array of codes
+
+    Returns:
+        ndarray: one row per event, of dtype EVENT_DTYPE. Codes that are
+            not used by the experiment have `known` False.
+    """
+    events = numpy.asarray(events)
+    decoded = numpy.zeros(events.shape[0], dtype=EVENT_DTYPE)
+    if events.ndim == 2:
+        decoded['sample'] = events[:, 0]
+        codes = events[:, 2]
+    else:
+        codes = events
+    decoded['value'] = codes
+    ## codes out of range look up 0, which is not used
+    in_range = (codes >= 0) & (codes < DECODE.size)
+    table = DECODE[numpy.where(in_range, codes, 0)]
+    for name in DECODE_DTYPE.names:
+        decoded[name] = table[name]
+    return decoded
+
+
+def targetCodes(**flags: Optional[bool]) -> List[int]:
+    """Codes of the targets with the given conditions, e.g. targetCodes(forT2=True)
+    """
+    unknown = set(flags) - set(FLAGS)
+    if unknown:
+        raise ValueError(f'Unknown conditions: {unknown}')
+    targets = DECODE['target'].copy()
+    for flag, val in flags.items():
+        if val is not None:
+            targets &= DECODE[flag] == val
+    return numpy.flatnonzero(targets).tolist()
@@ -24,6 +24,10 @@ class Constants(object):
     n_trials_dual_critical = 96  # attentional blink condition!
     n_trials_dual_easy = 48 # no intentional blink
     n_training_trial_divisor = 8
+    ## trials invalidated by a dropped frame between T1 and T2 are repeated
+    ## at the end of the block, up to this many per block (0: off, labs opt in
+    ## with [session] max_requeued_per_block, as it makes blocks longer)
+    max_requeued_per_block = 0
 
     # number of options for visibility rating
     vis_scale_length = 21
@@ -53,6 +57,9 @@ class Constants(object):
     # the mask is set of 4 capital letters (randomly generated in function file)
     possible_consonants = ['W', 'R', 'Z', 'P', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'C', 'B', 'Y', 'N', 'M']
 
+    # number of pre-rendered mask strings kept in memory (a dual task block has 720)
+    text_cache_size = 1024
+
 
     ################################################
     #               Instructions/Text              #
@@ -7,53 +7,74 @@ https://psychopy.org/coder/codeStimuli.html
 https://psychopy.org/general/timing/detectingFrameDrops.html#warn-me-if-i-drop-a-frame
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Tuple, Dict, List, Union, Any
-import json
-from psychopy.monitors import Monitor
-from psychopy.event import waitKeys, getKeys
-from psychopy.hardware.keyboard import Keyboard
-from psychopy.core import wait
+from typing import TYPE_CHECKING, Tuple, Dict, List, Union, Any, Iterable, Callable, Optional
+## psychopy.visual, monitors and info take seconds to import (scipy, pandas, matplotlib),
+## they are imported where they are first needed, after the participant dialog
 from psychopy import logging
-from psychopy.visual import Window, TextStim
-from psychopy.visual.slider import Slider
-from psychopy.visual.line import Line
-from psychopy.visual.rect import Rect
-from psychopy.visual.shape import ShapeStim
-from psychopy.info import RunTimeInfo
-#from psychopy.gui import Dlg
 from random import choice
+from time import sleep
 from string import ascii_uppercase, digits
 import numpy
 from experiment.dummy import DummyStim
-from experiment.ports import TriggerInterface, FakeTriggerPort, createTriggerPort
+from experiment.cache import StimulusCache
+from experiment.schedule import Schedule, StimulusSet
+from experiment.idle import IdleScheduler
+from experiment.eventlog import EventLog
+from experiment.hardware import HardwareProfiles, profileKey
+from experiment.realtime import RealtimeMode, GcMonitor
+from experiment.ports import (TriggerInterface, FakeTriggerPort, createTriggerPort,
+                              ThreadedSerialTriggerPort)
 if TYPE_CHECKING:
+    from psychopy.visual import Window, TextStim
+    from psychopy.visual.slider import Slider
+    from psychopy.visual.rect import Rect
+    from psychopy.visual.shape import ShapeStim
+    from psychopy.hardware.keyboard import Keyboard
     Stimulus = Union[TextStim, DummyStim, ShapeStim, Rect]
 
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, numpy.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
-
-
 class PsychopyEngine(object):
 
+    ## a frame interval longer than this many frame periods counts as dropped
+    DROP_THRESHOLD = 1.5
+
     win: Window
     port: TriggerInterface
     _exitNow: bool
+    flipTimes: numpy.ndarray # flip times of the last schedule played
+    framePeriod: float
+    idleJobs: IdleScheduler
+    events: Optional[EventLog] # structured log of flips, triggers, prompts and session info
+    realtime: RealtimeMode # no garbage collection and raised priority during the rapid sequence
+    gcMonitor: GcMonitor
+    gcSinceTrial: float # GcMonitor total at the end of the last trial (last gcStats call)
+    gcSinceFixation: float # GcMonitor total at the fixation onset of the last schedule
 
     ## stimuli
-    target1: TextStim
-    target2: TextStim
+    texts: StimulusCache[TextStim] # targets and masks, one stimulus per string
     squares: List[Rect]
     target2_dummy: DummyStim
-    mask: TextStim
     fixCross: ShapeStim
 
+    ## prompt widgets, reused across trials
+    message: TextStim
+    keyboard: Keyboard
+    promptMode: str # 'change' to redraw prompts when the rating changes, or 'frame' for every frame
+    prompts: Dict[Tuple[str, str], Tuple[TextStim, Slider]]
+
     def __init__(self) -> None:
-        self.port = FakeTriggerPort()
+        self.port = TriggerInterface(FakeTriggerPort())
         self._exitNow = False
+        self.prompts = dict()
+        self.flipTimes = numpy.zeros(1024)
+        self.framePeriod = 0.0
+        self.idleJobs = IdleScheduler(clock=logging.defaultClock.getTime)
+        self.events = None
+        self.promptMode = 'change'
+        self.realtime = RealtimeMode(False)
+        self.gcMonitor = GcMonitor()
+        self.gcMonitor.install()
+        self.gcSinceTrial = self.gcSinceFixation = self.gcMonitor.total
 
     def askForParticipantString(self) -> str:
         DEFAULT = '9999'
@@ -73,26 +94,51 @@ class PsychopyEngine(object):
                 raise ValueError('No participant ID given')
         return string_id
 
-    def configureLog(self, fpath: str):
+    def configureLog(self, fpath: str, eventsFpath: Optional[str]=None):
+        """Set up the text log (psychopy messages and warnings),
+        and optionally the structured event log (see experiment.eventlog)
+        """
         logging.console.setLevel(logging.WARN)
         logging.LogFile(fpath, level=logging.INFO, filemode='w')
+        if eventsFpath:
+            self.events = EventLog(eventsFpath, clock=logging.defaultClock.getTime)
 
     def logDictionary(self, label: str, content: Dict[str, Any]) -> None:
-        logging.info(
-            json.dumps({label: content}, sort_keys=True, indent=4, cls=NumpyEncoder)
-        )
+        if self.events is not None:
+            self.events.session(label, content)
+        else:
+            logging.info(f'{label}: {content}')
 
     def flush(self) -> None:
         logging.flush()
 
+    def defer(self, job: Callable[[], object], name: str) -> None:
+        """Run this job later, in an inter-trial interval frame with time to spare
+
+        Args:
+            job (Callable): function without arguments
+            name (str): kind of job, used to learn how long it takes
+        """
+        self.idleJobs.defer(job, name)
+
+    def runDeferred(self) -> None:
+        """Run all deferred jobs now (e.g. at the end of a block)
+        """
+        self.idleJobs.runAll()
+
     def configureWindow(self, settings: Dict) -> None:
+        from psychopy.monitors import Monitor
+        from psychopy.visual import Window, TextStim
+        from psychopy.hardware.keyboard import Keyboard
         mon_settings = settings['monitor']
-        my_monitor = Monitor(
-            name='EMLSergent2005',
-            distance=mon_settings['distance'])
-        my_monitor.setSizePix(mon_settings['resolution'])
-        my_monitor.setWidth(mon_settings['width'])
-        my_monitor.saveMon()
+        my_monitor = Monitor(name='EMLSergent2005')
+        ## writing the calibration file is slow, only do so when the settings changed
+        saved = (my_monitor.getDistance(), my_monitor.getWidth(), list(my_monitor.getSizePix() or []))
+        if saved != (mon_settings['distance'], mon_settings['width'], list(mon_settings['resolution'])):
+            my_monitor.setDistance(mon_settings['distance'])
+            my_monitor.setSizePix(mon_settings['resolution'])
+            my_monitor.setWidth(mon_settings['width'])
+            my_monitor.saveMon()
         self.win = Window(
             size=mon_settings['resolution'],
             monitor=my_monitor,
@@ -101,23 +147,41 @@ class PsychopyEngine(object):
             units='deg'
         )
         self.win.mouseVisible = False 
+        self.message = TextStim(self.win, height=0.6, units='deg', name='message')
+        self.message.autoLog = True
+        self.keyboard = Keyboard()
+        self.promptMode = settings.get('engine', dict()).get('prompt_mode', 'change')
+        if settings.get('engine', dict()).get('realtime', False):
+            from psychopy.core import rush
+            self.realtime = RealtimeMode(True, rush)
         scaling = mon_settings['resolution'][0] / self.win.size[0]
         if scaling == 0.5: 
             print('Looks like a retina display')
         if scaling != 1.0:
             print('Weird scaling. Is your configured monitor resolution correct?')
 
-    def measureHardwarePerformance(self) -> Dict[str, Any]:
-        return RunTimeInfo(win=self.win)
+    def measureHardwarePerformance(self, settings: Dict) -> Dict[str, Any]:
+        """RunTimeInfo of the window, or the stored profile of this machine and monitor
+        if it has not expired and the refresh rate still matches (see experiment.hardware)
+        """
+        profiles = HardwareProfiles.fromSettings(settings)
+        key = profileKey(settings['monitor'])
+        return profiles.performance(key, self.measureRefreshRate, self.runTimeInfo)
+
+    def measureRefreshRate(self) -> Optional[float]:
+        """Quick refresh rate measurement in Hz, None if the frame intervals are not stable
+        """
+        return self.win.getActualFrameRate(nIdentical=10, nMaxFrames=120, nWarmUpFrames=10)
+
+    def runTimeInfo(self) -> Dict[str, Any]:
+        from psychopy.info import RunTimeInfo
+        return dict(RunTimeInfo(win=self.win))
 
-    def loadStimuli(self, squareSize: float, squareOffset: int, fixSize: float):
-        self.target1 = TextStim(self.win, height=1, units='deg', name='target1')
-        self.target1.autoLog = True
-        self.target2 = TextStim(self.win, height=1, units='deg', name='target2')
-        self.target2.autoLog = True
+    def loadStimuli(self, squareSize: float, squareOffset: int, fixSize: float, textCacheSize: int=1024):
+        from psychopy.visual.rect import Rect
+        from psychopy.visual.shape import ShapeStim
+        self.texts = StimulusCache(self.renderText, textCacheSize)
         self.target2_dummy = DummyStim()
-        self.mask = TextStim(self.win, height=1, units='deg', name='mask')
-        self.mask.autoLog = True
         o = squareOffset
         positions = [(-o, -o), (o, -o), (-o, o), (o, o)]
         self.squares = []
@@ -149,19 +213,51 @@ class PsychopyEngine(object):
         )
         self.fixCross.autoLog = True
 
+    def renderText(self, text: str) -> TextStim:
+        """Create a text stimulus and draw it once to the back buffer,
+        so that its texture is ready when it is presented.
+        """
+        from psychopy.visual import TextStim
+        stim = TextStim(self.win, text=text, height=1, units='deg', name=f'text {text}')
+        stim.autoLog = True
+        stim.draw()
+        self.win.clearBuffer()
+        return stim
+
+    def preloadText(self, texts: Iterable[str], pin: bool=False) -> None:
+        """Render target or mask strings ahead of their presentation
+
+        Args:
+            texts (Iterable[str]): strings to render
+            pin (bool): keep these for the whole session (targets)
+        """
+        self.texts.preload(texts, pin=pin)
+
     def createLine(self, **kwargs):
         """Paint a line of pixels
 
         Used by viewpixx triggers
         """
+        from psychopy.visual.line import Line
         return Line(**kwargs)
 
-    def showMessage(self, message: str, height=0.6, confirm=True):
-        msg = TextStim(self.win, text=message, height=height, units='deg',
-                            name='message')
-        msg.autoLog = True
-        msg.draw()
+    def showMessage(self, message: str, height=0.6, confirm=True, preload: Iterable[str]=()):
+        """Display a text message
+
+        Args:
+            message (str): text to display
+            height (float): letter height in degrees
+            confirm (bool): wait for the participant to press space
+            preload (Iterable[str]): strings to render while the message is shown
+        """
+        from psychopy.event import waitKeys
+        from psychopy.core import wait
+        self.message.text = message
+        self.message.height = height
+        self.message.draw()
         self.win.flip()
+        if preload:
+            self.preloadText(preload)
         if confirm:
             waitKeys(keyList='space')
         else:
@@ -174,7 +270,10 @@ class PsychopyEngine(object):
             scale=1.0,
             address=settings.get('address', ''),
             rate=settings.get('baudrate', 0),
-            viewPixBulbSize=7.0
+            viewPixBulbSize=7.0,
+            threaded=settings.get('threaded', False),
+            writeTimeout=settings.get('write_timeout', None),
+            pulseWidth=settings.get('pulse_width', 5.0),
         )
 
     def drawFlipAndTrigger(self, stims: List[Stimulus], duration: int, triggerNr: int) -> float:
@@ -189,9 +288,114 @@ class PsychopyEngine(object):
             for stim in stims:
                 stim.draw()
             self.win.flip()
-            self.port.reset()
+            self.port.update()
         return record.get('flipTime', -99.99)
 
+    def resolveStimuli(self, stimuli: StimulusSet) -> List[Stimulus]:
+        """Look up the stimulus objects for a stimulus set of a Schedule
+        """
+        resolved = []
+        for kind, name in stimuli:
+            if kind == 'text':
+                resolved.append(self.texts.get(name))
+            elif name == 'squares':
+                resolved += self.squares
+            else:
+                resolved.append(getattr(self, name))
+        return resolved
+
+    def playSchedule(self, schedule: Schedule) -> Dict[str, float]:
+        """Present a precompiled trial, one flip per entry in the schedule
+
+        All stimuli are looked up before the first frame, so that the loop
+        only draws, flips and handles triggers. Deferred jobs that have not
+        run before, or that take longer than a frame, are also run then;
+        the others run in idle frames with time to spare. In real-time mode,
+        the priority is raised from the fixation onset to the end of the
+        schedule, and garbage collection is suspended from the fixation
+        onset until before the first frame of the next schedule.
+
+        Args:
+            schedule (Schedule): frame table, see experiment.schedule
+
+        Returns:
+            Dict[str, float]: flip times for the slots in the schedule
+        """
+        sets = [self.resolveStimuli(stimuli) for stimuli in schedule.sets]
+        ## garbage of the previous trial is collected before the first frame, if suspended
+        self.realtime.resume()
+        self.idleJobs.runBeforeFrames(schedule.framePeriod)
+        frames = [sets[s] for s in schedule.frames]
+        triggers = schedule.triggers
+        slots = schedule.slots
+        idle = schedule.idle
+        idleJobs = self.idleJobs
+        framePeriod = schedule.framePeriod
+        win = self.win
+        port = self.port
+        events = self.events
+        record = dict()
+        if self.flipTimes.size < len(frames):
+            self.flipTimes = numpy.zeros(len(frames))
+        flipTimes = self.flipTimes
+        flipTimes[:] = numpy.nan
+        self.framePeriod = schedule.framePeriod
+        realtime = self.realtime
+        realtimeStart = schedule.frameOf('fixation_onset')
+        try:
+            for f in range(len(frames)):
+                if f == realtimeStart:
+                    self.gcSinceFixation = self.gcMonitor.total
+                    realtime.enter()
+                for stim in frames[f]:
+                    stim.draw()
+                if triggers[f]:
+                    win.callOnFlip(port.trigger, triggers[f])
+                flipTimes[f] = win.flip()
+                port.update()
+                if slots[f] is not None:
+                    record[slots[f]] = flipTimes[f]
+                    if events is not None:
+                        events.flip(flipTimes[f], f, slots[f])
+                if triggers[f] and (events is not None):
+                    events.trigger(flipTimes[f], triggers[f])
+                if idle[f] and len(idleJobs):
+                    idleJobs.runUntil(flipTimes[f] + framePeriod)
+        finally:
+            realtime.exit()
+        return {s: float(record.get(s, -99.99)) for s in slots if s is not None}
+
+    def frameStats(self, start: int, stop: int) -> Tuple[int, float]:
+        """Dropped frames and longest frame interval in the last schedule played
+
+        Only intervals between flips within the range are counted.
+
+        Args:
+            start (int): index of the first frame
+            stop (int): index after the last frame
+
+        Returns:
+            Tuple[int, float]: number of dropped frames, maximum interval (in milliseconds)
+        """
+        intervals = numpy.diff(self.flipTimes[start:stop])
+        if intervals.size == 0:
+            return 0, -99.99
+        dropped = int(numpy.sum(intervals > self.framePeriod * self.DROP_THRESHOLD))
+        return dropped, float(numpy.max(intervals)) * 1000
+
+    def gcStats(self) -> Tuple[float, float]:
+        """Garbage collection during the trial that just ended, called once at its end
+
+        Returns:
+            Tuple[float, float]: milliseconds spent in garbage collection from the end
+                of the previous trial to the fixation onset (including the inter-trial
+                interval), and from the fixation onset to now (including the prompts)
+        """
+        total = self.gcMonitor.total
+        stats = ((self.gcSinceFixation - self.gcSinceTrial) * 1000, (total - self.gcSinceFixation) * 1000)
+        self.gcSinceTrial = total
+        return stats
+
     def displayEmptyScreen(self, duration: int) -> float:
         record = dict()
         self.win.logOnFlip(level=logging.DATA, msg=f'flip blank')
@@ -204,8 +408,7 @@ class PsychopyEngine(object):
         '''
         Displays the first target (T1) consisting of either the string 'OXXO' or 'XOOX'
         '''
-        self.target1.text = val
-        return self.drawFlipAndTrigger([self.target1], duration, triggerNr)
+        return self.drawFlipAndTrigger([self.texts.get(val)], duration, triggerNr)
 
     def displayT2(self, val: str, triggerNr: int, duration: int) -> float:
         '''
@@ -215,10 +418,9 @@ class PsychopyEngine(object):
             T2_present bool: True for present or False for absent
         '''
         if len(val):
-            target2 = self.target2
+            target2 = self.texts.get(val)
         else:
             target2 = self.target2_dummy
-        target2.text = val
         return self.drawFlipAndTrigger([target2]+self.squares, duration, triggerNr)
 
     def displayMask(self, val: str, duration: int) -> None:
@@ -226,9 +428,9 @@ class PsychopyEngine(object):
         Displays a mask consisting of 4 consonants. The mask appears after the targets.
         The selection and order of consonants is ramdomly chosen at every execution.
         '''
-        self.mask.text = val
+        mask = self.texts.get(val)
         for _ in range(duration):
-            self.mask.draw()
+            mask.draw()
             self.win.flip()
 
     def displayFixCross(self, duration: int):
@@ -236,6 +438,53 @@ class PsychopyEngine(object):
             self.fixCross.draw()
             self.win.flip()
 
+    def preparePrompt(self, name: str, prompt: str, **sliderKwargs) -> Tuple[TextStim, Slider]:
+        """Get the instruction and slider for a prompt, ready for a new trial
+
+        The widgets are created on first use and cached by their configuration,
+        so that later trials only have to reset them instead of building
+        (and laying out) new ones between the masks and the prompt.
+
+        Args:
+            name (str): name of the slider
+            prompt (str): instruction
+            **sliderKwargs: slider arguments specific to this prompt
+
+        Returns:
+            Tuple[TextStim, Slider]: instruction, slider
+        """
+        key = (name, repr(sorted(sliderKwargs.items())))
+        if key not in self.prompts:
+            from psychopy.visual import TextStim
+            from psychopy.visual.slider import Slider
+            instruction = TextStim(
+                self.win,
+                text=prompt,
+                height=0.8,
+                pos=(0.0, 5.0),
+                units='deg',
+                name=f'{name} instruction'
+            )
+            slider = Slider(
+                win=self.win,
+                name=name,
+                units='deg',
+                pos=(0.0, -2.0),
+                granularity=1,
+                style=['rating'], # ['slider', 'rating', 'radio', 'scrollbar', 'choice']¶
+                lineColor='DarkGrey',
+                markerColor='DarkGrey',
+                font='Arial',
+                **sliderKwargs
+            )
+            self.prompts[key] = (instruction, slider)
+        instruction, slider = self.prompts[key]
+        if instruction.text != prompt:
+            instruction.text = prompt
+        slider.reset()
+        self.keyboard.clearEvents()
+        return instruction, slider
+
     def promptIdentity(self, prompt: str, options: Tuple[str, str], triggerNr: int) -> Tuple[int, float, int]:
         """Display a slider for the participant to identify the stimulus
 
@@ -247,58 +496,24 @@ class PsychopyEngine(object):
         Returns:
             Tuple[int, float, int]: rating, onset, rt (in milliseconds)
         """
-        instruction = TextStim(
-            self.win,
-            text=prompt,
-            height=0.8,
-            pos=(0.0, 5.0),
-            units='deg',
-            name='promptIdentity instruction'
-        )
         choices = [options[0], '', options[1]]
-        record = dict()
-        self.win.timeOnFlip(record, 'flipTime')
-        self.win.callOnFlip(self.port.trigger, triggerNr)
-        slider = Slider(
-            win=self.win,
-            name='promptId',
+        instruction, slider = self.preparePrompt(
+            'promptId',
+            prompt,
             size=(16.0, 2.0),
-            units='deg',
-            pos=(0.0, -2.0),
             labels=choices,
-            granularity=1,
             ticks=[0, 1, 2],
-            style=['rating'], # ['slider', 'rating', 'radio', 'scrollbar', 'choice']¶
-            lineColor='DarkGrey',
-            markerColor='DarkGrey',
-            font='Arial',
         )
-        slider.setRating(1)
-        keyboard = Keyboard()
-        n_moves = 0
-        while True:
-            slider.draw()
-            instruction.draw()
-            self.win.flip()
-
-            keys = keyboard.getKeys()
-            if len(keys):
-                if 'left' in keys:
-                    n_moves += 1
-                    slider.setRating(0)
-                elif 'right' in keys:
-                    n_moves += 1
-                    slider.setRating(2)
-                elif ('space' in keys) and (n_moves > 0):
-                    break
-                elif 'escape' in keys:
-                    self._exitNow = True
-                    break
-            self.port.reset()
-
-        choice = int(slider.getRating()/2)
-        onset = record.get('flipTime', -99.99)
-        rt = round((slider.getRT() or 9999)*1000)
+        rating, onset, rt = self.awaitRating(
+            instruction,
+            slider,
+            init=1,
+            move=lambda rating, key: 0 if key == 'left' else 2,
+            triggerNr=triggerNr
+        )
+        choice = int(rating/2)
+        if self.events is not None:
+            self.events.prompt('identity', onset, choice, rt, triggerNr)
         return choice, onset, rt
     
     def promptVisibility(self, prompt: str, labels: Tuple[str, str], scale_length: int, init: int, triggerNr: int) -> Tuple[int, float, int]:
@@ -312,65 +527,110 @@ class PsychopyEngine(object):
         Returns:
             Tuple[int, float, int]: rating, onset, rt (in milliseconds)
         """
-        instruction = TextStim(
-            self.win,
-            text=prompt,
-            pos=(0.0, 5.0),
-            height=0.8,
-            units='deg',
-            name='promptVisibility instruction'
-        )
-        record = dict()
-        self.win.timeOnFlip(record, 'flipTime')
-        self.win.callOnFlip(self.port.trigger, triggerNr)
         values = list(range(scale_length))
-        slider = Slider(
-            win=self.win,
-            name='promptVis',
+        instruction, slider = self.preparePrompt(
+            'promptVis',
+            prompt,
             size=(28.0, 0.6),
-            units='deg',
-            startValue=init,
-            pos=(0.0, -2.0),
             labels=labels,
-            granularity=1,
             ticks=values,
-            style=['rating'], # ['slider', 'rating', 'radio', 'scrollbar', 'choice']¶
-            lineColor='DarkGrey',
-            markerColor='DarkGrey',
             labelWrapWidth=None,
-            font='Arial',
         )
+        rating, onset, rt = self.awaitRating(
+            instruction,
+            slider,
+            init=init,
+            move=lambda rating, key: max(0, rating-1) if key == 'left' else min(max(values), rating+1),
+            triggerNr=triggerNr
+        )
+        if self.events is not None:
+            self.events.prompt('visibility', onset, rating, rt, triggerNr)
+        return rating, onset, rt
+
+    def awaitRating(self, instruction: TextStim, slider: Slider, init: int,
+                    move: Callable[[int, str], int], triggerNr: int) -> Tuple[int, float, int]:
+        """Show the prompt until the participant confirms a rating with space
+
+        The left and right keys change the rating with `move`. Confirming
+        requires at least one move; escape ends the prompt and the session.
+        The reaction time is that of the last move.
+
+        In 'change' mode (default) the screen is only redrawn when the rating
+        changes, and reaction times are taken from the keyboard event
+        timestamps, relative to the onset flip. In 'frame' mode (set
+        prompt_mode in the [engine] section of lab.toml) the prompt is
+        redrawn on every frame and reaction times come from the slider.
+
+        Returns:
+            Tuple[int, float, int]: rating, onset, rt (in milliseconds)
+        """
+        record = dict()
+        keyboard = self.keyboard
+        win = self.win
+        port = self.port
+        self.win.timeOnFlip(record, 'flipTime')
+        self.win.callOnFlip(self.port.trigger, triggerNr)
         slider.setRating(init)
-        keyboard = Keyboard()
         n_moves = 0
-        while True:
-            slider.draw()
-            instruction.draw()
-            self.win.flip()
-
-            keys = keyboard.getKeys()
-            if len(keys):
-                if 'left' in keys:
-                    n_moves += 1
-                    slider.setRating(max(0, slider.getRating()-1)) ## todo
-                elif 'right' in keys:
+        if self.promptMode == 'frame':
+            while True:
+                slider.draw()
+                instruction.draw()
+                win.flip()
+
+                keys = keyboard.getKeys()
+                if len(keys):
+                    if ('left' in keys) or ('right' in keys):
+                        n_moves += 1
+                        slider.setRating(move(slider.getRating(), 'left' if 'left' in keys else 'right'))
+                    elif ('space' in keys) and (n_moves > 0):
+                        break
+                    elif 'escape' in keys:
+                        self._exitNow = True
+                        break
+                port.update()
+            rt = round((slider.getRT() or 9999)*1000)
+            return slider.getRating(), record.get('flipTime', -99.99), rt
+
+        ## key times are relative to the prompt onset
+        win.callOnFlip(keyboard.clock.reset)
+        rating = init
+        rt_secs = None
+        ## draw once more after the onset, so that a trigger drawn on screen is cleared
+        redraws = 2
+        done = False
+        while not done:
+            if redraws:
+                slider.draw()
+                instruction.draw()
+                win.flip()
+                redraws -= 1
+            for key in keyboard.getKeys(keyList=['left', 'right', 'space', 'escape'], waitRelease=False):
+                if key.name in ('left', 'right'):
                     n_moves += 1
-                    slider.setRating(min(max(values), slider.getRating()+1))
-                elif ('space' in keys) and (n_moves > 0):
+                    rt_secs = key.rt
+                    new_rating = move(rating, key.name)
+                    if new_rating != rating:
+                        rating = new_rating
+                        slider.setRating(rating)
+                        redraws = max(redraws, 1)
+                elif (key.name == 'space') and (n_moves > 0):
+                    done = True
                     break
-                elif 'escape' in keys:
+                elif key.name == 'escape':
                     self._exitNow = True
+                    done = True
                     break
-            self.port.reset()
-
-        choice = slider.getRating()
-        onset = record.get('flipTime', -99.99)
-        rt = round((slider.getRT() or 9999)*1000)
-        return choice, onset, rt
+            port.update()
+            if not redraws:
+                sleep(0.001) ## nothing to draw, leave the CPU to the keyboard and trigger threads
+        rt = round((rt_secs if rt_secs is not None else 9.999)*1000)
+        return rating, record.get('flipTime', -99.99), rt
     
     def exitRequested(self) -> bool:
         if self._exitNow:
             return True
+        from psychopy.event import getKeys
         if getKeys(keyList=['escape']):
             self._exitNow = True
             logging.warn('EXIT REQUESTED (ESC pressed)')
@@ -378,6 +638,21 @@ class PsychopyEngine(object):
         return False
     
     def stop(self) -> None:
+        self.port.clear()
+        self.realtime.resume()
+        if isinstance(self.port.port, ThreadedSerialTriggerPort):
+            self.port.port.close()
+            self.logDictionary('TRIGGER_LATENCY', self.port.port.latencyHistogram())
+            self.flush()
+        self.logDictionary('REALTIME', dict(
+            enabled=self.realtime.enabled,
+            rushed=self.realtime.rushed,
+            gc_collections=self.gcMonitor.collections,
+            gc_total_ms=self.gcMonitor.total * 1000,
+        ))
+        self.gcMonitor.remove()
+        if self.events is not None:
+            self.events.close()
         self.win.close()
 
 
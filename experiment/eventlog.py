@@ -0,0 +1,103 @@
+"""Structured session log, as JSON Lines written by a background thread
+
+Each line is one record with a `type` (session, flip, trigger, prompt),
+the time `t` and fields specific to the type. The experiment only puts
+records on a queue; encoding and writing happens on a separate thread,
+away from the frame loop.
+
+    from experiment.eventlog import readEventLog
+    df = readEventLog('sub-XXXX1_run-20240101120000_log.jsonl')
+    df[df.type == 'trigger']
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+from threading import Thread
+from queue import SimpleQueue
+from time import perf_counter
+import json
+if TYPE_CHECKING:
+    from pandas import DataFrame
+Record = Tuple[str, float, Dict[str, Any]]
+
+
+def encodeDefault(obj: Any) -> Any:
+    """Encode numpy arrays and scalars, and anything else as its string
+    """
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+class EventLog:
+
+    fpath: str
+
+    def __init__(self, fpath: str, clock: Callable[[], float]=perf_counter) -> None:
+        """
+        Args:
+            fpath (str): path of the log file (.jsonl)
+            clock (Callable[[], float]): time function used for records without a time
+        """
+        self.fpath = fpath
+        self.clock = clock
+        self.queue: SimpleQueue[Optional[Record]] = SimpleQueue()
+        self.fhandle = open(fpath, 'w')
+        self.writer = Thread(target=self.write, name='event-log-writer', daemon=True)
+        self.writer.start()
+
+    def record(self, kind: str, t: Optional[float]=None, **fields: Any) -> None:
+        """Queue a record of any type
+
+        Args:
+            kind (str): type of record
+            t (float): time of the event, defaults to now
+        """
+        self.queue.put((kind, self.clock() if t is None else t, fields))
+
+    def session(self, label: str, content: Dict[str, Any]) -> None:
+        """Session metadata, such as platform or site configuration
+        """
+        self.record('session', label=label, content=content)
+
+    def flip(self, t: float, frame: int, slot: str) -> None:
+        """A flip that marks a named moment in the trial (e.g. t1_onset)
+        """
+        self.record('flip', t, frame=frame, slot=slot)
+
+    def trigger(self, t: float, value: int) -> None:
+        self.record('trigger', t, value=value)
+
+    def prompt(self, name: str, onset: float, rating: Any, rt: int, trigger: int) -> None:
+        self.record('prompt', onset, name=name, rating=rating, rt=rt, trigger=trigger)
+
+    def write(self) -> None:
+        """Writer thread: encode and write records until close() is called
+        """
+        dumps = json.JSONEncoder(separators=(',', ':'), default=encodeDefault).encode
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            kind, t, fields = item
+            self.fhandle.write(dumps(dict(type=kind, t=t, **fields)) + '\n')
+            if self.queue.empty():
+                self.fhandle.flush()
+        self.fhandle.flush()
+
+    def close(self) -> None:
+        """Write all queued records and close the file
+        """
+        self.queue.put(None)
+        self.writer.join()
+        self.fhandle.close()
+
+
+def readEventLog(fpath: str) -> DataFrame:
+    """Load an event log into a table with one row per record
+
+    Fields that a record type does not have are left empty.
+    """
+    from pandas import DataFrame
+    with open(fpath) as fhandle:
+        records = [json.loads(line) for line in fhandle if line.strip()]
+    return DataFrame.from_records(records)
@@ -2,13 +2,17 @@
 when psychopy is not available
 """
 from __future__ import annotations
-from typing import Tuple, Dict, Any
+from typing import TYPE_CHECKING, Tuple, Dict, Any, Iterable, Callable, List, Optional
 import json
 import random
+if TYPE_CHECKING:
+    from experiment.schedule import Schedule
 
 
 class FakeTriggerPort:
 
+    PULSED = False
+
     def trigger(self, val: int) -> None:
         print(f'[TRIGGER] {val}')
 
@@ -24,12 +28,13 @@ class FakeEngine(object):
 
     def __init__(self) -> None:
         self.port = FakeTriggerPort()
+        self.deferred: List[Callable[[], object]] = []
 
     def askForString(self, question: str) -> str:
         print(f'[ENGINE] askForString: {question}')
         return '999'
 
-    def configureLog(self, fpath: str):
+    def configureLog(self, fpath: str, eventsFpath: Optional[str]=None):
         pass
 
     def logDictionary(self, label: str, content: Dict[str, Any]) -> None:
@@ -42,12 +47,15 @@ class FakeEngine(object):
     def configureWindow(self, settings: Dict):
         print('[ENGINE] configureWindow()')
 
-    def measureHardwarePerformance(self) -> Dict[str, Any]:
+    def measureHardwarePerformance(self, settings: Dict) -> Dict[str, Any]:
         return dict()
     
-    def loadStimuli(self, squareSize: float, squareOffset: int, fixSize: float):
+    def loadStimuli(self, squareSize: float, squareOffset: int, fixSize: float, textCacheSize: int=1024):
         print('[ENGINE] loadStimuli()')
 
+    def preloadText(self, texts: Iterable[str], pin: bool=False) -> None:
+        pass
+
     def createLine(self, **kwargs):
         """Paint a line of pixels
 
@@ -55,10 +63,29 @@ class FakeEngine(object):
         """
         print('[ENGINE] createLine()')
 
-    def showMessage(self, message: str, height=0.6, confirm=True):
+    def showMessage(self, message: str, height=0.6, confirm=True, preload: Iterable[str]=()):
         print(f'[ENGINE] Message: {"WAIT" if confirm else ""} {message}')
         self.secs += 20
 
+    def playSchedule(self, schedule: Schedule) -> Dict[str, float]:
+        print(f'[ENGINE] Schedule ({len(schedule)} x flip)')
+        self.runDeferred()
+        start = self.flips
+        times = dict()
+        for f in range(len(schedule)):
+            if schedule.triggers[f]:
+                self.port.trigger(schedule.triggers[f])
+            if schedule.slots[f] is not None:
+                times[schedule.slots[f]] = (start + f) * self.flip_dur
+        self.flips += len(schedule)
+        return times
+
+    def frameStats(self, start: int, stop: int) -> Tuple[int, float]:
+        return 0, self.flip_dur * 1000
+
+    def gcStats(self) -> Tuple[float, float]:
+        return 0.0, 0.0
+
     def displayEmptyScreen(self, duration: int) -> float:
         print(f'[ENGINE] EmptyScreen ({duration} x flip)')
         self.flips += duration
@@ -98,6 +125,9 @@ class FakeEngine(object):
         onset = self.flips * self.flip_dur
         return (random.randint(0, scale_length-1), onset, random.randint(800, 1200))
     
+    def exitRequested(self) -> bool:
+        return False
+
     def estimateDuration(self) -> int:
         """Simulated duration in seconds
         """
@@ -105,6 +135,13 @@ class FakeEngine(object):
     
     def flush(self) -> None:
         print(f'[ENGINE] Flushing')
+
+    def defer(self, job: Callable[[], object], name: str) -> None:
+        self.deferred.append(job)
+
+    def runDeferred(self) -> None:
+        while self.deferred:
+            self.deferred.pop(0)()
     
     def stop(self) -> None:
         print(f'[ENGINE] Stopping')
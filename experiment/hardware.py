@@ -0,0 +1,103 @@
+"""Cache of the hardware measurements done at the start of a session
+
+psychopy's RunTimeInfo collects system information and measures the
+refresh rate of the window, which takes several seconds. The results are
+kept in a json file, per machine and monitor configuration, and reused
+until they expire or a quick measurement of the refresh rate disagrees
+with them. The location and expiry can be set in lab.toml:
+
+    [profile]
+    path = '~/.sergent2005/hardware.json'
+    max_age_days = 7
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, Optional
+from os.path import expanduser, dirname
+from hashlib import sha1
+import json, os, platform, time
+
+PROFILE_FPATH = '~/.sergent2005/hardware.json'
+MAX_AGE_DAYS = 7.0
+RATE_TOLERANCE = 1.0 # Hz, difference between the quick and cached refresh rate that triggers a re-measure
+
+
+def profileKey(monitor: Dict[str, Any]) -> str:
+    """Identifies the machine and the monitor settings of lab.toml
+    """
+    identity = dict(machine=platform.uname()._asdict(), python=platform.python_version(), monitor=monitor)
+    return sha1(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def jsonable(content: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy with values that json can not store converted to strings
+    """
+    return json.loads(json.dumps(dict(content), default=str))
+
+
+class HardwareProfiles:
+    """Hardware measurements stored by profileKey()
+    """
+
+    fpath: str
+    maxAge: float # seconds
+
+    def __init__(self, fpath: str=PROFILE_FPATH, maxAgeDays: float=MAX_AGE_DAYS,
+                 clock: Callable[[], float]=time.time) -> None:
+        self.fpath = expanduser(fpath)
+        self.maxAge = maxAgeDays * 24 * 3600
+        self.clock = clock
+
+    @classmethod
+    def fromSettings(cls, settings: Dict[str, Any]) -> HardwareProfiles:
+        """Profiles as configured in the [profile] section of lab.toml, if any
+        """
+        profile = settings.get('profile', dict())
+        return cls(profile.get('path', PROFILE_FPATH), profile.get('max_age_days', MAX_AGE_DAYS))
+
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.fpath) as fhandle:
+                return json.load(fhandle)
+        except (OSError, ValueError):
+            return dict() ## no profiles yet, or a damaged file that will be replaced
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored profile, if it has not expired
+        """
+        entry = self.read().get(key)
+        if entry is None or (self.clock() - entry['measured']) > self.maxAge:
+            return None
+        return entry
+
+    def store(self, key: str, performance: Dict[str, Any]) -> None:
+        profiles = self.read()
+        profiles[key] = dict(measured=self.clock(), performance=performance)
+        os.makedirs(dirname(self.fpath), exist_ok=True)
+        tmp_fpath = self.fpath + '.tmp'
+        with open(tmp_fpath, 'w') as fhandle:
+            json.dump(profiles, fhandle, indent=2)
+        os.replace(tmp_fpath, self.fpath)
+
+    def performance(self, key: str, quickRate: Callable[[], Optional[float]],
+                    measure: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Stored measurements if they are still valid, otherwise measure and store them
+
+        Args:
+            key (str): profileKey() of this machine and monitor
+            quickRate (Callable): measures the refresh rate in Hz, or None if unstable
+            measure (Callable): full measurement, e.g. RunTimeInfo; must
+                contain windowRefreshTimeAvg_ms
+
+        Returns:
+            dict: the measurements, with `profile` set to 'cached' or 'measured'
+        """
+        entry = self.lookup(key)
+        if entry is not None:
+            rate = quickRate()
+            cachedRate = 1000 / entry['performance']['windowRefreshTimeAvg_ms']
+            if (rate is not None) and abs(rate - cachedRate) <= RATE_TOLERANCE:
+                return dict(entry['performance'], profile='cached', profile_measured=entry['measured'],
+                            quick_refresh_rate=rate)
+        performance = jsonable(measure())
+        self.store(key, performance)
+        return dict(performance, profile='measured')
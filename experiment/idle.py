@@ -0,0 +1,125 @@
+"""Run deferred background work in frames that have time to spare
+
+Work such as flushing the log or saving the last trial is queued as jobs,
+and the engine runs them during the inter-trial interval, after a flip,
+only if the job is expected to finish well before the next flip.
+How long a job takes is learned from previous runs of the same kind of job:
+the longest of its last `window` runs, so a job whose cost varies (e.g. one
+that is sometimes much slower) is planned for its slowest recent run, and a
+single outlier is forgotten after a while. A job that does not fit in the
+time left is skipped, and later jobs of other kinds can still run; jobs of
+the same kind always run in the order they were deferred (e.g. the rows of
+the trials file). Jobs that can not fit in a frame at all, or that have not
+run before, are run by runBeforeFrames() before the frames start instead.
+Jobs can not be interrupted, so this relies on each job being short.
+"""
+from __future__ import annotations
+from typing import Callable, Deque, Dict, Set, Tuple
+from collections import deque
+from time import perf_counter
+
+
+class IdleScheduler:
+
+    margin: float # seconds kept free before the deadline
+    window: int # number of recent runs the estimate is based on
+    estimates: Dict[str, float] # longest recent duration, per job name
+    overruns: int # jobs that finished after their deadline
+
+    def __init__(self, clock: Callable[[], float]=perf_counter, margin: float=0.002,
+                 window: int=20) -> None:
+        """
+        Args:
+            clock (Callable[[], float]): time function, same time base as the deadlines
+            margin (float): seconds to keep free before a deadline
+            window (int): number of recent runs of a kind of job its estimate is based on
+        """
+        self.clock = clock
+        self.margin = margin
+        self.window = window
+        self.estimates = dict()
+        self.durations: Dict[str, Deque[float]] = dict()
+        self.overruns = 0
+        self.jobs: Deque[Tuple[str, Callable[[], object]]] = deque()
+
+    def defer(self, job: Callable[[], object], name: str) -> None:
+        """Queue a job to run when there is time
+
+        Args:
+            job (Callable): function without arguments
+            name (str): kind of job, used to learn how long it takes
+        """
+        self.jobs.append((name, job))
+
+    def runUntil(self, deadline: float) -> int:
+        """Run queued jobs that are expected to finish in time, in order
+
+        A job that does not fit is skipped, along with the later jobs of the
+        same kind; kinds of job that have not run before are skipped too.
+
+        Args:
+            deadline (float): time (by the scheduler clock) by which jobs must be done
+
+        Returns:
+            int: number of jobs run
+        """
+        n = 0
+        skipped: Set[str] = set()
+        waiting: Deque[Tuple[str, Callable[[], object]]] = deque()
+        while self.jobs:
+            name, job = self.jobs.popleft()
+            if (name in skipped) or (name not in self.estimates) or (
+                    self.clock() + self.estimates[name] + self.margin > deadline):
+                skipped.add(name)
+                waiting.append((name, job))
+                continue
+            self.runJob(name, job)
+            if self.clock() > deadline:
+                self.overruns += 1
+            n += 1
+        self.jobs = waiting
+        return n
+
+    def runBeforeFrames(self, framePeriod: float) -> int:
+        """Run the queued jobs that would never fit in a frame, or have not run before
+
+        Meant for a moment without timing constraints, such as before the
+        first frame of a trial. Jobs that have not run before are measured,
+        so that they can run in a frame next time.
+
+        Args:
+            framePeriod (float): duration of a frame, in seconds
+
+        Returns:
+            int: number of jobs run
+        """
+        n = 0
+        waiting: Deque[Tuple[str, Callable[[], object]]] = deque()
+        while self.jobs:
+            name, job = self.jobs.popleft()
+            if (name not in self.estimates) or (self.estimates[name] + self.margin >= framePeriod):
+                self.runJob(name, job)
+                n += 1
+            else:
+                waiting.append((name, job))
+        self.jobs = waiting
+        return n
+
+    def runAll(self) -> int:
+        """Run all queued jobs now, regardless of time
+        """
+        n = len(self.jobs)
+        while self.jobs:
+            self.runJob(*self.jobs.popleft())
+        return n
+
+    def runJob(self, name: str, job: Callable[[], object]) -> None:
+        start = self.clock()
+        job()
+        duration = self.clock() - start
+        recent = self.durations.setdefault(name, deque(maxlen=self.window))
+        recent.append(duration)
+        self.estimates[name] = max(recent)
+
+    def __len__(self) -> int:
+        return len(self.jobs)
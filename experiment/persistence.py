@@ -0,0 +1,154 @@
+"""Save trials to the trials csv file as soon as they are finished
+
+The file has the same layout as writing all trials at the end with
+pandas (`DataFrame([t.todict() for t in trials]).to_csv(float_format='%.4f')`),
+but rows are appended one trial at a time, so a crash only loses the
+trial that was running.
+
+To rebuild a well-formed file from one that was cut off mid-row:
+
+    python -m experiment.persistence partial_trials.csv
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Any, Optional, TextIO, Tuple
+from argparse import ArgumentParser
+from os.path import splitext
+from threading import Thread
+from queue import SimpleQueue
+import csv, os
+from dataclasses import fields
+if TYPE_CHECKING:
+    from experiment.trial import Trial
+
+## columns added to the dataclass fields by Trial.todict()
+DERIVED_COLUMNS = ['target1', 'target2']
+FLOAT_FORMAT = '%.4f'
+
+
+def columns() -> List[str]:
+    """Header of the trials file; the first column is the (unnamed) index
+    """
+    from experiment.trial import Trial
+    names = [f.name for f in fields(Trial)]
+    return [''] + names + [c for c in DERIVED_COLUMNS if c not in names]
+
+
+def formatValue(val: Any) -> str:
+    if val is None:
+        return ''
+    if isinstance(val, float):
+        return FLOAT_FORMAT % val
+    return str(val)
+
+
+class TrialWriter:
+    """Appends finished trials to the trials csv file
+
+    Each row is flushed to the operating system immediately, and the file
+    is synced to disk every `fsyncEvery` rows and when it is closed.
+    The periodic syncs are done by a background thread, because an fsync
+    can take longer than a frame and write() is called in the inter-trial
+    interval (as a deferred job).
+    With `fsyncEvery=0` the file is never synced explicitly (for simulations).
+    """
+
+    fpath: str
+    fsyncEvery: int
+    nWritten: int
+
+    def __init__(self, fpath: str, fsyncEvery: int=10) -> None:
+        self.fpath = fpath
+        self.fsyncEvery = fsyncEvery
+        self.nWritten = 0
+        self.header = columns()
+        exists = os.path.isfile(fpath) and os.path.getsize(fpath) > 0
+        self.fhandle: Optional[TextIO] = open(fpath, 'a', newline='')
+        self.csv = csv.writer(self.fhandle, lineterminator='\n')
+        if not exists:
+            self.csv.writerow(self.header)
+            self.sync()
+        self.syncRequests: SimpleQueue[Optional[int]] = SimpleQueue()
+        self.syncer: Optional[Thread] = None
+        if fsyncEvery:
+            self.syncer = Thread(target=self.syncFile, name='trials-file-sync', daemon=True)
+            self.syncer.start()
+
+    def write(self, trial: Trial, index: int) -> None:
+        """Append one trial
+
+        Args:
+            trial (Trial): finished trial
+            index (int): index of the trial in the session (first column)
+        """
+        assert self.fhandle is not None, 'writer is closed'
+        row = trial.todict()
+        self.csv.writerow([str(index)] + [formatValue(row[c]) for c in self.header[1:]])
+        self.fhandle.flush()
+        self.nWritten += 1
+        if self.fsyncEvery and (self.nWritten % self.fsyncEvery == 0):
+            self.syncRequests.put(self.fhandle.fileno())
+
+    def sync(self) -> None:
+        assert self.fhandle is not None, 'writer is closed'
+        self.fhandle.flush()
+        if self.fsyncEvery:
+            os.fsync(self.fhandle.fileno())
+
+    def syncFile(self) -> None:
+        """Sync thread: sync the file to disk when asked, until close() is called
+        """
+        while True:
+            fileno = self.syncRequests.get()
+            if fileno is None:
+                break
+            os.fsync(fileno)
+
+    def close(self) -> None:
+        if self.syncer is not None:
+            self.syncRequests.put(None)
+            self.syncer.join()
+            self.syncer = None
+        if self.fhandle is not None:
+            self.sync()
+            self.fhandle.close()
+            self.fhandle = None
+
+
+def readRows(fpath: str) -> Tuple[List[str], List[List[str]]]:
+    """Header and complete rows of a trials file, which may have been cut off
+
+    An incomplete last row (no line ending or missing columns) is dropped.
+    """
+    with open(fpath, newline='') as fhandle:
+        lines = fhandle.readlines()
+    if lines and not lines[-1].endswith('\n'):
+        lines = lines[:-1]
+    rows = list(csv.reader(lines))
+    header = rows[0] if rows else columns()
+    return header, [r for r in rows[1:] if len(r) == len(header)]
+
+
+def recover(fpath: str, out_fpath: str) -> int:
+    """Write a well-formed copy of a trials file that was cut off
+
+    Keeps the header and every complete row.
+
+    Returns:
+        int: number of trials recovered
+    """
+    header, complete = readRows(fpath)
+    with open(out_fpath, 'w', newline='') as fhandle:
+        writer = csv.writer(fhandle, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(complete)
+    return len(complete)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Rebuild a complete trials file from a partial one')
+    parser.add_argument('fpath', help='trials csv file of an interrupted session')
+    parser.add_argument('-o', '--output', help='path of the rebuilt file (default: *_recovered.csv)')
+    args = parser.parse_args()
+    out_fpath = args.output or f'{splitext(args.fpath)[0]}_recovered.csv'
+    n = recover(args.fpath, out_fpath)
+    print(f'Recovered {n} trials to {out_fpath}')
@@ -0,0 +1,162 @@
+"""Session plans: the complete trial order of participants, compiled beforehand
+
+A plan has one row per trial of the session (all blocks, in order),
+with the condition and sampled variables of the trial. Durations are kept
+in seconds or as indices, so a plan does not depend on the refresh rate.
+Plans for a range of participants are stored in a single .npy file,
+sorted by participant, which start.py memory-maps to read only the rows
+of its participant.
+
+    python -m experiment.plan compile --site UOLM --pids 1-60 -o plans.npy
+    python -m experiment.plan show plans.npy 7
+    python start.py --plan plans.npy
+
+If a session was interrupted, it can continue at the first planned trial
+without response data (replacement trials of that block are not repeated):
+
+    python start.py --plan plans.npy --resume sub-UOLM7_run-20240101120000_trials.csv
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, List, Tuple
+from argparse import ArgumentParser
+import itertools
+import numpy
+if TYPE_CHECKING:
+    from experiment.trials import TrialGenerator
+    from experiment.trial import Task
+    from experiment.constants import Constants
+
+PLAN_DTYPE = numpy.dtype([
+    ('pid', '<u4'),
+    ('block', 'u1'),
+    ('phase', 'S5'),
+    ('task', 'S6'),
+    ('t2presence', '?'),
+    ('soa_long', '?'),
+    ('delay_index', 'u1'),
+    ('iti_s', '<f8'),
+    ('t1_index', 'u1'),
+    ('t2_index', 'u1'),
+    ('vis_init', 'u1'),
+    ('masks', 'S4', (3,)),
+])
+
+
+def compilePlan(generator: TrialGenerator, pid: int, blocks: Tuple[Task, Task]) -> numpy.ndarray:
+    """Sample all blocks of a session
+
+    Args:
+        generator (TrialGenerator): seeded for this participant
+        pid (int): participant index
+        blocks (tuple): order of the task types
+    """
+    parts = []
+    for b, (phase, task) in enumerate(itertools.product(('train', 'test'), blocks)):
+        rows = generator.sampleBlock(phase, task)
+        rows['block'] = b
+        parts.append(rows)
+    plan = numpy.concatenate(parts)
+    plan['pid'] = pid
+    return plan
+
+
+def compilePlans(site: str, pids: Iterable[int], const: Constants) -> numpy.ndarray:
+    """Plans of several participants, sorted by participant
+    """
+    from experiment.trials import TrialGenerator, participantSeed
+    from experiment.session import counterbalanceBlocks
+    from experiment.timer import Timer
+    plans = []
+    for pid in sorted(pids):
+        generator = TrialGenerator(Timer(), const, participantSeed(site, pid))
+        plans.append(compilePlan(generator, pid, counterbalanceBlocks(pid)))
+    return numpy.concatenate(plans)
+
+
+def loadPlan(fpath: str, pid: int) -> numpy.ndarray:
+    """Memory-map the plans file and return the rows of one participant
+
+    Raises:
+        ValueError: if the file has no plan for this participant
+    """
+    plans = numpy.load(fpath, mmap_mode='r')
+    if plans.dtype != PLAN_DTYPE:
+        raise ValueError(f'{fpath} is not a plans file')
+    start, stop = numpy.searchsorted(plans['pid'], [pid, pid+1])
+    if start == stop:
+        raise ValueError(f'No plan for participant {pid} in {fpath}')
+    return plans[start:stop]
+
+
+def blockBounds(plan: numpy.ndarray) -> List[Tuple[int, int]]:
+    """Start and stop row of each block in a plan
+    """
+    changes = (numpy.flatnonzero(numpy.diff(plan['block'])) + 1).tolist()
+    return list(zip([0] + changes, changes + [plan.size]))
+
+
+def resumePosition(trials_fpath: str) -> Tuple[int, int]:
+    """Where to continue an interrupted session
+
+    Args:
+        trials_fpath (str): trials file of the interrupted session
+
+    Returns:
+        tuple: position in the plan of the first trial without response data,
+            and the index for the next trial (after the last complete row)
+    """
+    from experiment.persistence import readRows
+    header, rows = readRows(trials_fpath)
+    if 'plan_index' not in header:
+        raise ValueError(f'{trials_fpath} has no plan_index column')
+    p, v = header.index('plan_index'), header.index('vis_rating')
+    done = {int(row[p]) for row in rows if row[p] and row[v]}
+    position = 0
+    while position in done:
+        position += 1
+    next_index = int(rows[-1][0]) + 1 if rows else 0
+    return position, next_index
+
+
+def describe(plan: numpy.ndarray):
+    """The plan as a table, for review
+    """
+    from pandas import DataFrame
+    df = DataFrame({name: plan[name] for name in PLAN_DTYPE.names if name != 'masks'})
+    for name in ('phase', 'task'):
+        df[name] = df[name].str.decode('ascii')
+    df['masks'] = [' '.join(m.decode() for m in masks) for masks in plan['masks']]
+    return df
+
+
+def parsePids(spec: str) -> List[int]:
+    """Participant indices from e.g. '1-20,25'
+    """
+    pids = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        pids += list(range(int(first), int(last or first) + 1))
+    return pids
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compile or review session plans')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_cmd = commands.add_parser('compile', help='compile plans for a range of participants')
+    compile_cmd.add_argument('--site', required=True, help='site abbreviation, part of the seed')
+    compile_cmd.add_argument('--pids', required=True, help='participant indices, e.g. 1-60')
+    compile_cmd.add_argument('-o', '--output', required=True, help='plans file (.npy)')
+    show_cmd = commands.add_parser('show', help='print the plan of a participant')
+    show_cmd.add_argument('fpath', help='plans file')
+    show_cmd.add_argument('pid', type=int, help='participant index')
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        from experiment.constants import Constants
+        plans = compilePlans(args.site, parsePids(args.pids), Constants())
+        numpy.save(args.output, plans)
+        print(f'Saved {plans.size} trials for {numpy.unique(plans["pid"]).size} participants to {args.output}')
+    else:
+        import pandas
+        with pandas.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+            print(describe(loadPlan(args.fpath, args.pid)))
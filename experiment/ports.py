@@ -1,47 +1,140 @@
 """Abstracts access to the various ways to send triggers to the EEG
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Union
-from serial import Serial
+from typing import TYPE_CHECKING, Union, Optional, Dict, Any, List, Tuple
+from threading import Thread
+from queue import SimpleQueue
+from time import perf_counter
+from serial import Serial, SerialTimeoutException
 from experiment.fake_engine import FakeTriggerPort
-from psychopy.parallel import ParallelPort as PsychopyParallelPort
-from psychopy.core import wait
 if TYPE_CHECKING:
     from experiment.engine import PsychopyEngine
 
 
+## all trigger values encoded once, so sending one does not create a bytes object
+CODES = [bytes([v]) for v in range(256)]
+
+
 class SerialTriggerPort:
 
+    PULSED = False # the value is sent once, there is no line to reset
+
     def __init__(self, address: str, baud: int):
         self.sport = Serial(port=address, baudrate=baud)
 
     def trigger(self, val: int) -> None:
-        self.sport.write(bytes([val]))
+        self.sport.write(CODES[val])
+
+    def reset(self) -> None:
+        pass
+
+
+class ThreadedSerialTriggerPort:
+    """Serial port triggers written by a dedicated thread
+
+    trigger() only puts the encoded value on a queue, so that a slow
+    USB-serial adapter can not delay the flip it is called from.
+    The time from the trigger() call to the end of the write is
+    recorded for every trigger.
+    """
+
+    PULSED = False
+    latencies: List[float] # seconds
+    timeouts: int
+
+    def __init__(self, address: str, baud: int, writeTimeout: Optional[float]=0.01):
+        self.sport = Serial(port=address, baudrate=baud, write_timeout=writeTimeout)
+        self.latencies = []
+        self.timeouts = 0
+        self.queue: SimpleQueue[Optional[Tuple[bytes, float]]] = SimpleQueue()
+        self.writer = Thread(target=self.write, name='serial-trigger-writer', daemon=True)
+        self.writer.start()
+
+    def trigger(self, val: int) -> None:
+        self.queue.put((CODES[val], perf_counter()))
 
     def reset(self) -> None:
         pass
 
+    def write(self) -> None:
+        """Writer thread: send queued triggers until close() is called
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            code, called = item
+            try:
+                self.sport.write(code)
+            except SerialTimeoutException:
+                self.timeouts += 1
+                continue
+            self.latencies.append(perf_counter() - called)
+
+    def close(self) -> None:
+        """Wait for queued triggers to be written, then close the port
+        """
+        self.queue.put(None)
+        self.writer.join()
+        self.sport.close()
+
+    def latencyHistogram(self, binWidthMs: float=0.25, nBins: int=40) -> Dict[str, Any]:
+        """Summary of the write latencies so far
+
+        Latencies beyond the last bin are counted in the last bin.
+
+        Returns:
+            Dict[str, Any]: bin edges and counts (ms), and summary statistics
+        """
+        counts = [0] * nBins
+        for latency in self.latencies:
+            counts[min(int(latency * 1000 / binWidthMs), nBins-1)] += 1
+        ordered = sorted(self.latencies)
+        n = len(ordered)
+        return dict(
+            n=n,
+            timeouts=self.timeouts,
+            bin_edges_ms=[b * binWidthMs for b in range(nBins+1)],
+            counts=counts,
+            median_ms=ordered[n//2] * 1000 if n else None,
+            max_ms=ordered[-1] * 1000 if n else None,
+        )
+
 
 class ParallelPort:
 
-    def __init__(self, address: str):
-        self.pport = PsychopyParallelPort(address=address)
-        self.active = False
+    PULSED = True # the pins stay high until reset
+
+    def __init__(self, address: str, backend: Optional[Any]=None):
+        """
+        Args:
+            address (str): address of the parallel port
+            backend: object with a setData() method to use instead of the psychopy port
+        """
+        if backend is None:
+            from psychopy.parallel import ParallelPort as PsychopyParallelPort
+            backend = PsychopyParallelPort(address=address)
+        self.pport = backend
 
     def trigger(self, val: int) -> None:
         self.pport.setData(val)
-        self.active = True
 
     def reset(self) -> None:
-        if self.active:
-            self.pport.setData(0)
-            self.active = False
+        self.pport.setData(0)
 
 class LabJackPort:
 
-    def __init__(self):
-        from psychopy.hardware.labjacks import U3
-        self.inner = U3()
+    PULSED = True
+
+    def __init__(self, backend: Optional[Any]=None):
+        """
+        Args:
+            backend: object with a setData() method to use instead of a U3 device
+        """
+        if backend is None:
+            from psychopy.hardware.labjacks import U3
+            backend = U3()
+        self.inner = backend
 
     def trigger(self, val: int) -> None:
         self.inner.setData(val, address='FIO')
@@ -51,6 +144,8 @@ class LabJackPort:
 
 class ViewPixxTriggerPort:
 
+    PULSED = False # the pixel is only drawn on the trigger frame
+
     def __init__(self, win: PsychopyEngine, scale: float, viewPixBulbSize: float):
         #halfWidth, halfHeight = self.win.size[0]*scale/2, self.win.size[1]*scale/2
         halfWidth, halfHeight = 5, 5
@@ -73,19 +168,71 @@ class ViewPixxTriggerPort:
     def reset(self) -> None:
         pass
 
-TriggerInterface = Union[SerialTriggerPort, FakeTriggerPort,
-    ViewPixxTriggerPort, LabJackPort]
+TriggerPort = Union[SerialTriggerPort, ThreadedSerialTriggerPort,
+    FakeTriggerPort, ViewPixxTriggerPort, LabJackPort, ParallelPort]
 
-def createTriggerPort(typ: str, engine: PsychopyEngine, scale: float, address: str='', rate: int=0, viewPixBulbSize: float=7.0) -> TriggerInterface:
+
+class TriggerInterface:
+    """Sends triggers through a port and ends each pulse after a set width
+
+    The engine calls update() after every flip (or while polling for
+    responses). It only resets the port once the pulse width has passed,
+    and only for ports that hold their value (parallel, LabJack).
+    When no pulse is active update() is a single attribute check,
+    so an idle port costs nothing per frame.
+    """
+
+    port: TriggerPort
+    pulseWidth: float # seconds
+    pulseStart: Optional[float]
+
+    def __init__(self, port: TriggerPort, pulseWidth: float=5.0):
+        """
+        Args:
+            port (TriggerPort): low-level port
+            pulseWidth (float): minimum duration of a trigger pulse in milliseconds
+        """
+        self.port = port
+        self.pulseWidth = pulseWidth / 1000
+        self.pulseStart = None
+
+    def trigger(self, val: int) -> None:
+        if self.pulseStart is not None:
+            self.port.reset()
+        self.port.trigger(val)
+        if self.port.PULSED:
+            self.pulseStart = perf_counter()
+
+    def update(self) -> None:
+        """End the current pulse if it has lasted long enough
+        """
+        if self.pulseStart is None:
+            return
+        if perf_counter() - self.pulseStart >= self.pulseWidth:
+            self.clear()
+
+    def clear(self) -> None:
+        """End the current pulse now
+        """
+        if self.pulseStart is not None:
+            self.port.reset()
+            self.pulseStart = None
+
+
+def createTriggerPort(typ: str, engine: PsychopyEngine, scale: float, address: str='', rate: int=0, viewPixBulbSize: float=7.0, threaded: bool=False, writeTimeout: Optional[float]=None, pulseWidth: float=5.0) -> TriggerInterface:
+    port: TriggerPort
     if typ == 'dummy':
-        return FakeTriggerPort()
+        port = FakeTriggerPort()
+    elif typ == 'serial' and threaded:
+        port = ThreadedSerialTriggerPort(address, rate, writeTimeout)
     elif typ == 'serial':
-        return SerialTriggerPort(address, rate)
+        port = SerialTriggerPort(address, rate)
     elif typ == 'viewpixx':
-        return ViewPixxTriggerPort(engine, scale, viewPixBulbSize)
+        port = ViewPixxTriggerPort(engine, scale, viewPixBulbSize)
     elif typ == 'labjack':
-        return LabJackPort()
+        port = LabJackPort()
     elif typ == 'parallel':
-        return ParallelPort(address)
+        port = ParallelPort(address)
     else:
         raise ValueError('Unknown port type in lab settings.')
+    return TriggerInterface(port, pulseWidth)
@@ -0,0 +1,103 @@
+"""Real-time mode for the rapid presentation sequence
+
+From the fixation onset to the end of the last mask, a garbage collection
+or a lower scheduling priority can delay a flip and drop a frame.
+RealtimeMode disables the garbage collector and raises the process
+priority (psychopy.core.rush) for that part of the trial. The priority is
+restored at the end of the sequence, but the garbage collector stays
+disabled through the prompts: enabling it there would start a collection
+on the next allocation, as the allocations of the sequence have not been
+collected yet. resume() collects them and enables the collector again;
+the engine calls it before the first frame of the next trial.
+GcMonitor measures the time spent in garbage collection, so that the
+pauses can be compared with and without real-time mode.
+Enabled in lab.toml:
+
+    [engine]
+    realtime = true
+"""
+from __future__ import annotations
+from typing import Callable, Dict, Optional
+from time import perf_counter
+import gc
+
+
+class GcMonitor:
+    """Adds up the duration of garbage collections, via gc.callbacks
+    """
+
+    total: float # seconds spent in garbage collection since install()
+    collections: int
+
+    def __init__(self, clock: Callable[[], float]=perf_counter) -> None:
+        self.clock = clock
+        self.total = 0.0
+        self.collections = 0
+        self._start: Optional[float] = None
+
+    def __call__(self, phase: str, info: Dict) -> None:
+        if phase == 'start':
+            self._start = self.clock()
+        elif self._start is not None:
+            self.total += self.clock() - self._start
+            self.collections += 1
+            self._start = None
+
+    def install(self) -> None:
+        if self not in gc.callbacks:
+            gc.callbacks.append(self)
+
+    def remove(self) -> None:
+        if self in gc.callbacks:
+            gc.callbacks.remove(self)
+
+
+class RealtimeMode:
+    """Raises the priority between enter() and exit(),
+    and suspends garbage collection from enter() until resume()
+    """
+
+    enabled: bool
+    rushed: bool # priority was raised successfully, at the last enter()
+    suspended: bool # garbage collection disabled by enter(), until resume()
+
+    def __init__(self, enabled: bool, rush: Optional[Callable[[bool], bool]]=None) -> None:
+        """
+        Args:
+            enabled (bool): if False, enter() and exit() do nothing
+            rush (Callable): raises (True) or restores (False) the priority,
+                returns whether that succeeded, e.g. psychopy.core.rush
+        """
+        self.enabled = enabled
+        self.rush = rush
+        self.rushed = False
+        self.suspended = False
+        self._gcWasEnabled = False
+
+    def enter(self) -> None:
+        if not self.enabled:
+            return
+        if not self.suspended:
+            self._gcWasEnabled = gc.isenabled()
+            gc.disable()
+            self.suspended = True
+        if self.rush is not None:
+            self.rushed = bool(self.rush(True))
+
+    def exit(self) -> None:
+        """Restore the priority; garbage collection stays suspended until resume()
+        """
+        if not self.enabled:
+            return
+        if self.rushed and (self.rush is not None):
+            self.rush(False)
+
+    def resume(self) -> None:
+        """Collect what was allocated while suspended, then enable garbage collection again
+        """
+        if not self.suspended:
+            return
+        gc.collect(1)
+        if self._gcWasEnabled:
+            gc.enable()
+        self.suspended = False
@@ -0,0 +1,114 @@
+"""Compile a trial into a flat per-frame schedule
+
+Instead of calling one engine method per segment (fixation, target, mask..),
+the whole trial is laid out beforehand as a table with one entry per frame.
+The engine then plays the table back in a single loop.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Tuple, Dict
+if TYPE_CHECKING:
+    from experiment.trial import Trial
+    from experiment.timer import Timer
+Layer = Tuple[str, str] # kind of stimulus ('shape' or 'text') and its name or text
+StimulusSet = Tuple[Layer, ...]
+
+BLANK: StimulusSet = ()
+FIXATION: StimulusSet = (('shape', 'fixCross'),)
+SQUARES: StimulusSet = (('shape', 'squares'),)
+
+
+class Schedule:
+    """Frame table of a trial
+
+    Each frame refers to a stimulus set (by index into `sets`),
+    a trigger value (0 for no trigger) and optionally the name
+    of a slot in which to store the time of that flip.
+    Frames marked idle leave time for deferred background jobs.
+    """
+
+    sets: List[StimulusSet]
+    frames: List[int]
+    triggers: List[int]
+    slots: List[Optional[str]]
+    idle: List[bool]
+    framePeriod: float # nominal duration of a frame in seconds
+
+    def __init__(self, framePeriod: float=0.0) -> None:
+        self.framePeriod = framePeriod
+        self.sets = []
+        self.frames = []
+        self.triggers = []
+        self.slots = []
+        self.idle = []
+        self._setIndex: Dict[StimulusSet, int] = dict()
+
+    def add(self, stimuli: StimulusSet, duration: int, trigger: int=0, slot: Optional[str]=None, idle: bool=False) -> None:
+        """Append a segment of frames that all show the same stimuli
+
+        The trigger is sent and the time recorded on the first frame only.
+        """
+        if duration < 1:
+            return
+        if stimuli not in self._setIndex:
+            self._setIndex[stimuli] = len(self.sets)
+            self.sets.append(stimuli)
+        s = self._setIndex[stimuli]
+        self.frames += [s] * duration
+        self.triggers += [trigger] + [0] * (duration-1)
+        self.slots += [slot] + [None] * (duration-1)
+        self.idle += [idle] * duration
+
+    def frameOf(self, slot: str) -> int:
+        """Index of the frame on which the given slot is recorded
+        """
+        return self.slots.index(slot)
+
+    def stimuliAt(self, frame: int) -> StimulusSet:
+        return self.sets[self.frames[frame]]
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+
+def text(val: str) -> StimulusSet:
+    return (('text', val),) if len(val) else ()
+
+
+def compileTrial(trial: Trial, timer: Timer) -> Schedule:
+    """Lay out the frames of a trial, from the start of the
+    inter-trial interval up to the onset of the prompts.
+    """
+    dur = timer.target_dur
+    schedule = Schedule(timer.flipsToSecs(1))
+    # background jobs may run during the ITI, except after its last frame
+    schedule.add(BLANK, trial.iti - 1, idle=True)
+    schedule.add(BLANK, 1)
+
+    # it starts with the fixation cross
+    schedule.add(FIXATION, trial.delay, slot='fixation_onset')
+    schedule.add(BLANK, dur)
+    schedule.add(text(trial.target1), dur, trial.t1_trigger, 't1_onset')
+
+    # display black screen between stimuli and masks
+    schedule.add(BLANK, dur, slot='t1_offset')
+    schedule.add(text(trial.masks[0]), dur)
+    schedule.add(BLANK, dur)
+
+    # display the fixation cross either short_SOA - 129ms or long_SOA - 129ms,
+    # since the target, the mask and the black screen was displayed for 43ms each
+    fix_dur = trial.soa - dur*5 # ( one blank screen following )
+    schedule.add(FIXATION, fix_dur)
+    schedule.add(BLANK, dur)
+
+    # target 2 is the number word (if present) surrounded by four squares
+    schedule.add(text(trial.target2) + SQUARES, dur, trial.t2_trigger, 't2_onset')
+
+    # display black screen between stimuli and masks
+    schedule.add(BLANK, dur, slot='t2_offset')
+
+    # display two masks after another with black screen inbetween
+    schedule.add(text(trial.masks[1]), dur)
+    schedule.add(BLANK, dur)
+    schedule.add(text(trial.masks[2]), dur)
+    schedule.add(BLANK, timer.task_delay, slot='mask_offset')
+    return schedule
@@ -0,0 +1,81 @@
+"""The sequence of blocks and trials in a session
+
+This is the part of the experiment after the hardware has been set up,
+shared by start.py and the simulation (experiment.simulation).
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Tuple
+from functools import partial
+import gc
+import numpy
+from experiment.plan import blockBounds
+if TYPE_CHECKING:
+    from experiment.engine import PsychopyEngine
+    from experiment.constants import Constants
+    from experiment.trials import TrialGenerator
+    from experiment.persistence import TrialWriter
+    from experiment.trial import Task
+
+
+def counterbalanceBlocks(pid: int) -> Tuple[Task, Task]:
+    """Order of the task types, based on the participant index being odd or even
+    """
+    return ('dual', 'single') if (pid % 2) == 0 else ('single', 'dual')
+
+
+def runSession(engine: PsychopyEngine, trials: TrialGenerator, plan: numpy.ndarray,
+               writer: TrialWriter, const: Constants, start: int=0) -> None:
+    """Present the training and test blocks, saving trials as they finish
+
+    Args:
+        engine (PsychopyEngine): engine with window, stimuli and triggers set up
+        trials (TrialGenerator): creates the trials, and their replacements
+        plan (ndarray): session plan of the participant (experiment.plan)
+        writer (TrialWriter): trials file of the session (TableWriter in simulations)
+        const (Constants): design parameters
+        start (int): position in the plan to start at, when resuming a session
+    """
+
+    ## before experiment
+    if start == 0:
+        engine.showMessage(const.training_instructions)
+
+    for first, stop in blockBounds(plan):
+
+        if stop <= start:
+            continue ## block was completed before the session was resumed
+        first = max(first, start)
+        block_trials = trials.createTrials(plan[first:stop], planIndex=first)
+        phase, block = block_trials[0].phase, block_trials[0].task
+
+        engine.showMessage(
+            const.dual_block_start if block == 'dual' else const.single_block_start,
+            preload=[mask for trial in block_trials for mask in trial.masks]
+        )
+
+        n_requeued = 0
+        for trial in block_trials:
+            trial.run(engine, trials.timer)
+            ## a dropped frame changed the SOA, repeat the condition at the end of the block
+            if (not trial.valid) and (n_requeued < const.max_requeued_per_block):
+                block_trials.append(trials.requeue(trial))
+                n_requeued += 1
+            ## background work, done in the next inter-trial interval when there is time
+            engine.defer(partial(writer.write, trial, trials.indexOf(trial)), 'save trial')
+            engine.defer(partial(gc.collect, 1), 'gc')
+            if engine.exitRequested():
+                break ## exit trial loop
+
+        ## make sure all trials of the block are saved
+        engine.runDeferred()
+
+        if engine.exitRequested():
+            break ## exit phase/block loop
+
+        if phase == 'train':
+            engine.showMessage(const.finished_training)
+
+    writer.close()
+
+    if not engine.exitRequested():
+        engine.showMessage(const.thank_you, confirm=False)
@@ -0,0 +1,261 @@
+"""Columnar storage of trials
+
+A TrialTable keeps every field of Trial in a typed numpy array, one row
+per trial. TrialView is a Trial whose fields are read from and written to
+a row of the table, so the presentation code works on it unchanged.
+Tables export to a DataFrame or csv file column by column, and can be
+loaded from the trials files of many sessions at a fraction of the memory
+of Trial objects or a generic DataFrame.
+
+Optional integer fields use MISSING (-1) for None, optional floats NaN.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence
+from dataclasses import fields
+import numpy
+from experiment.trial import Trial, CONSTANTS
+from experiment.persistence import columns, FLOAT_FORMAT
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
+MISSING = -1
+
+## numpy type of each Trial field, and how its values convert (see TrialView)
+COLUMN_TYPES: Dict[str, tuple] = dict(
+    phase=('S5', 'str'),
+    task=('S6', 'str'),
+    t2presence=('?', 'bool'),
+    soa_long=('?', 'bool'),
+    soa=('i2', 'int'),
+    delay_index=('u1', 'int'),
+    delay=('i2', 'int'),
+    iti=('i2', 'int'),
+    t1_index=('u1', 'int'),
+    t2_index=('u1', 'int'),
+    vis_init=('u1', 'int'),
+    t1_trigger=('u1', 'int'),
+    t2_trigger=('u1', 'int'),
+    masks=(('S4', (3,)), 'masks'),
+    id_trigger=('u1', 'int'),
+    vis_trigger=('u1', 'int'),
+    id_choice=('i1', 'optint'),
+    id_onset=('f8', 'optfloat'),
+    id_rt=('i4', 'optint'),
+    vis_rating=('i1', 'optint'),
+    vis_onset=('f8', 'optfloat'),
+    vis_rt=('i4', 'optint'),
+    t1_onset=('f8', 'optfloat'),
+    t1_offset=('f8', 'optfloat'),
+    t2_onset=('f8', 'optfloat'),
+    t2_offset=('f8', 'optfloat'),
+    mask_offset=('f8', 'optfloat'),
+    dropped_frames=('i4', 'optint'),
+    max_frame_interval=('f8', 'optfloat'),
+    soa_ms=('f8', 'optfloat'),
+    critical_drops=('i4', 'optint'),
+    gc_iti_ms=('f8', 'optfloat'),
+    gc_critical_ms=('f8', 'optfloat'),
+    valid=('?', 'bool'),
+    replaces=('i4', 'optint'),
+    plan_index=('i4', 'optint'),
+)
+assert list(COLUMN_TYPES) == [f.name for f in fields(Trial)], 'COLUMN_TYPES must list the fields of Trial'
+
+TRIAL_DTYPE = numpy.dtype([(name, dtype) for name, (dtype, _) in COLUMN_TYPES.items()])
+
+
+def emptyValue(kind: str):
+    return dict(optint=MISSING, optfloat=numpy.nan).get(kind)
+
+
+class TrialTable:
+
+    rows: numpy.ndarray # structured array with spare capacity, use data() for the filled rows
+    size: int
+
+    def __init__(self, capacity: int=512) -> None:
+        self.rows = self.emptyRows(capacity)
+        self.size = 0
+
+    @staticmethod
+    def emptyRows(n: int) -> numpy.ndarray:
+        rows = numpy.zeros(n, dtype=TRIAL_DTYPE)
+        for name, (_, kind) in COLUMN_TYPES.items():
+            if emptyValue(kind) is not None:
+                rows[name] = emptyValue(kind)
+        rows['valid'] = True
+        return rows
+
+    def extend(self, n: int) -> int:
+        """Add n empty rows, and return the index of the first one
+        """
+        start = self.size
+        if start + n > self.rows.size:
+            capacity = max(start + n, 2 * self.rows.size)
+            self.rows = numpy.concatenate([self.rows[:start], self.emptyRows(capacity - start)])
+        self.size += n
+        return start
+
+    def append(self, trial: Trial) -> TrialView:
+        """Copy a Trial into a new row
+        """
+        view = self.view(self.extend(1))
+        for name in COLUMN_TYPES:
+            setattr(view, name, getattr(trial, name))
+        return view
+
+    def view(self, index: int) -> TrialView:
+        return TrialView(self, index)
+
+    def views(self) -> List[TrialView]:
+        return [TrialView(self, i) for i in range(self.size)]
+
+    def data(self) -> numpy.ndarray:
+        return self.rows[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def toDataFrame(self, select: Optional[numpy.ndarray]=None) -> DataFrame:
+        """Same columns as the trials file (Trial.todict() plus targets), without per-row objects
+
+        Optional integers become nullable pandas integers.
+
+        Args:
+            select (ndarray): rows to export, all by default
+        """
+        from pandas import DataFrame
+        from pandas.arrays import IntegerArray
+        data = self.data() if select is None else self.rows[select]
+        df = DataFrame(index=numpy.arange(data.size))
+        for name in columns()[1:]:
+            if name == 'target1':
+                df[name] = numpy.array(CONSTANTS.target1_strings, dtype=object)[data['t1_index']]
+                continue
+            if name == 'target2':
+                strings = numpy.array(CONSTANTS.target2_strings, dtype=object)[data['t2_index']]
+                df[name] = numpy.where(data['t2presence'], strings, '')
+                continue
+            kind = COLUMN_TYPES[name][1]
+            col = data[name]
+            if kind == 'str':
+                df[name] = col.astype(str)
+            elif kind == 'masks':
+                ## formatted like the tuple in the trials file
+                m = col.astype(str)
+                quoted = [numpy.char.add(numpy.char.add("'", m[:, i]), "'") for i in range(3)]
+                df[name] = numpy.char.add(numpy.char.add('(', numpy.char.add(numpy.char.add(
+                    numpy.char.add(quoted[0], ', '), numpy.char.add(quoted[1], ', ')), quoted[2])), ')')
+            elif kind == 'optint':
+                df[name] = IntegerArray(col.astype('i8'), col == MISSING)
+            else:
+                df[name] = col
+        return df
+
+    def toCsv(self, fpath: str, firstIndex: int=0) -> None:
+        """Write all rows to a trials file, as TrialWriter would
+        """
+        df = self.toDataFrame()
+        df.index = df.index + firstIndex
+        df.to_csv(fpath, float_format=FLOAT_FORMAT)
+
+    @classmethod
+    def fromDataFrame(cls, df: DataFrame) -> TrialTable:
+        """Table from a DataFrame with the columns of a trials file
+        """
+        from ast import literal_eval
+        table = cls(len(df))
+        table.extend(len(df))
+        rows = table.rows
+        for name, (_, kind) in COLUMN_TYPES.items():
+            if name not in df:
+                continue
+            col = df[name]
+            if kind == 'masks':
+                rows[name] = [literal_eval(m) for m in col]
+            elif kind in ('optint', 'optfloat'):
+                rows[name] = col.fillna(emptyValue(kind)).to_numpy()
+            else:
+                rows[name] = col.to_numpy()
+        return table
+
+    @classmethod
+    def readCsv(cls, fpath: str) -> TrialTable:
+        from pandas import read_csv
+        return cls.fromDataFrame(read_csv(fpath, index_col=0))
+
+    @classmethod
+    def concat(cls, tables: Sequence[TrialTable]) -> TrialTable:
+        table = cls(0)
+        table.rows = numpy.concatenate([t.data() for t in tables])
+        table.size = table.rows.size
+        return table
+
+
+class TableWriter:
+    """Writes the trials of a table to the trials file when it is closed
+
+    Has the interface of TrialWriter, for simulated sessions: the file is
+    the same, but is written in one go instead of row by row.
+    """
+
+    def __init__(self, table: TrialTable, fpath: str) -> None:
+        self.table = table
+        self.fpath = fpath
+        self.rows: List[int] = []
+        self.indices: List[int] = []
+
+    def write(self, trial: TrialView, index: int) -> None:
+        assert trial._table is self.table, 'trial is not stored in this table'
+        self.rows.append(trial._index)
+        self.indices.append(index)
+
+    def close(self) -> None:
+        df = self.table.toDataFrame(numpy.array(self.rows, dtype=int))
+        df.index = self.indices
+        df.to_csv(self.fpath, float_format=FLOAT_FORMAT)
+
+
+def readSessions(fpaths: Iterable[str]) -> TrialTable:
+    """Load the trials files of many sessions into one table
+    """
+    return TrialTable.concat([TrialTable.readCsv(fpath) for fpath in fpaths])
+
+
+class TrialView(Trial):
+    """A Trial stored in a row of a TrialTable
+
+    Use TrialTable.append() rather than dataclasses.replace() to copy it.
+    """
+
+    def __init__(self, table: TrialTable, index: int) -> None:
+        self._table = table
+        self._index = index
+
+
+def fieldProperty(name: str, kind: str) -> property:
+
+    def get(self: TrialView):
+        val = self._table.rows[name][self._index]
+        if kind == 'str':
+            return val.decode()
+        if kind == 'masks':
+            return tuple(m.decode() for m in val)
+        if kind == 'optint':
+            return None if val == MISSING else int(val)
+        if kind == 'optfloat':
+            return None if numpy.isnan(val) else float(val)
+        if kind == 'bool':
+            return bool(val)
+        return int(val)
+
+    def set(self: TrialView, val) -> None:
+        if val is None:
+            val = emptyValue(kind)
+        self._table.rows[name][self._index] = val
+
+    return property(get, set)
+
+
+for _name, (_, _kind) in COLUMN_TYPES.items():
+    setattr(TrialView, _name, fieldProperty(_name, _kind))
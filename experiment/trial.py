@@ -1,7 +1,8 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Union, Literal, Tuple, Optional, Dict, Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from experiment.constants import Constants
+from experiment.schedule import compileTrial
 if TYPE_CHECKING:
     from experiment.engine import PsychopyEngine
     from experiment.timer import Timer
@@ -40,6 +41,18 @@ class Trial(object):
     t1_offset: Optional[float] = None
     t2_onset: Optional[float] = None
     t2_offset: Optional[float] = None
+    mask_offset: Optional[float] = None # end of the last mask, to time the prompt onset
+
+    ## frame timing, from the fixation onset to the prompt
+    dropped_frames: Optional[int] = None
+    max_frame_interval: Optional[float] = None # milliseconds
+    soa_ms: Optional[float] = None # measured T1 to T2 onset
+    critical_drops: Optional[int] = None # dropped frames from T1 onset up to T2 onset
+    gc_iti_ms: Optional[float] = None # time spent in garbage collection since the previous trial, up to the fixation onset
+    gc_critical_ms: Optional[float] = None # same, from the fixation onset to the end of the prompts
+    valid: bool = True # False if the SOA was disrupted by a dropped frame
+    replaces: Optional[int] = None # index of the invalid trial that this trial replaces
+    plan_index: Optional[int] = None # position in the session plan (experiment.plan)
 
     @property 
     def target1(self):
@@ -57,7 +70,8 @@ class Trial(object):
         return CONSTANTS.task_identity_options[self.id_choice] == self.target1[1]
     
     def todict(self) -> Dict[str, Any]:
-        full_dict = asdict(self)
+        ## shallow copy of the fields; asdict() deep-copies every value, which is slow
+        full_dict = {name: getattr(self, name) for name in FIELD_NAMES}
         full_dict['delay'] = self.delay
         full_dict['soa'] = self.soa
         full_dict['target1'] = self.target1
@@ -70,42 +84,21 @@ class Trial(object):
         Args:
             engine (PsychopyEngine): This is a wrapper for the experiment software
         """
-        engine.displayEmptyScreen(self.iti)
-
-        # it starts with the fixation cross
-        engine.displayFixCross(self.delay)
-
-        engine.displayEmptyScreen(timer.target_dur)
-
-        self.t1_onset = engine.displayT1(self.target1, self.t1_trigger, timer.target_dur)
-
-        # display black screen between stimuli and masks
-        self.t1_offset = engine.displayEmptyScreen(timer.target_dur)
-
-        engine.displayMask(self.masks[0], timer.target_dur)
-
-        engine.displayEmptyScreen(timer.target_dur)
-
-        # display the fixation cross either short_SOA - 129ms or long_SOA - 129ms,
-        # since the target, the mask and the black screen was displayed for 43ms each
-        fix_dur = self.soa - timer.target_dur*5 # ( one blank screen following )
-        engine.displayFixCross(fix_dur)
-
-        engine.displayEmptyScreen(timer.target_dur)
-
-        self.t2_onset = engine.displayT2(self.target2, self.t2_trigger, timer.target_dur)
-
-        # display black screen between stimuli and masks
-        self.t2_offset = engine.displayEmptyScreen(timer.target_dur)
-
-        # display two masks after another with black screen inbetween
-        engine.displayMask(self.masks[1], timer.target_dur)
-
-        engine.displayEmptyScreen(timer.target_dur)
-
-        engine.displayMask(self.masks[2], timer.target_dur)
-
-        engine.displayEmptyScreen(timer.task_delay)
+        # everything up to the prompts is played back as one sequence of frames
+        schedule = compileTrial(self, timer)
+        times = engine.playSchedule(schedule)
+        self.t1_onset = times['t1_onset']
+        self.t1_offset = times['t1_offset']
+        self.t2_onset = times['t2_onset']
+        self.t2_offset = times['t2_offset']
+        self.mask_offset = times['mask_offset']
+        self.dropped_frames, self.max_frame_interval = engine.frameStats(self.iti, len(schedule))
+        self.soa_ms = (self.t2_onset - self.t1_onset) * 1000
+        self.critical_drops, _ = engine.frameStats(
+            schedule.frameOf('t1_onset'),
+            schedule.frameOf('t2_onset') + 1
+        )
+        self.valid = self.critical_drops == 0
 
         # start the visibility rating (happens in single AND dual task conditions)
         # ratingT2 is tuple of rating, RT
@@ -128,5 +121,10 @@ class Trial(object):
             if not self.identityCorrect():
                 engine.showMessage('FALSE', confirm=False)
 
-        engine.flush()
+        self.gc_iti_ms, self.gc_critical_ms = engine.gcStats()
+
+        # written to disk during the next inter-trial interval
+        engine.defer(engine.flush, 'flush log')
+
 
+FIELD_NAMES = [f.name for f in fields(Trial)]
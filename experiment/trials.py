@@ -1,13 +1,24 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Iterator, List
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple, Union
 from dataclasses import dataclass, asdict
+from zlib import crc32
 from experiment.trial import Trial, Phase, Task
-from random import sample, shuffle, random as rand
 from math import ceil
+import numpy
 from experiment.triggers import Triggers
+from experiment.codec import encode
+from experiment.plan import PLAN_DTYPE
+from experiment.table import TrialTable, TrialView
 if TYPE_CHECKING:
     from experiment.constants import Constants
     from experiment.timer import Timer
+Seed = Union[None, int, Sequence[int]]
+
+
+def participantSeed(site: str, pid: int) -> List[int]:
+    """Seed for the trials of a participant, unique per site and participant index
+    """
+    return [crc32(site.encode('utf-8')), pid]
 
 
 @dataclass
@@ -19,62 +30,153 @@ class TrialRecipe(object):
 
 
 class TrialGenerator:
+    """Creates the trials of each block
+
+    Random variables are drawn from a numpy Generator, in batches per
+    condition; with the same seed the same session is generated.
+    Trials are stored in `table` (experiment.table), one row each.
+    """
 
     const: Constants
     timer: Timer
-    all: List[Trial]
+    table: TrialTable
+    all: List[Trial] # views of the rows of table
+    firstIndex: int # index of the first trial, for a resumed session
+    rng: numpy.random.Generator
 
-    def __init__(self, timer: Timer, const: Constants):
+    def __init__(self, timer: Timer, const: Constants, seed: Seed=None):
+        """
+        Args:
+            timer (Timer): durations in frames
+            const (Constants): design parameters
+            seed (int or list of int): seed of the random generator, e.g. participantSeed()
+        """
         self.const = const
         self.timer = timer
+        self.table = TrialTable()
         self.all = []
+        self.firstIndex = 0
+        self.rng = numpy.random.default_rng(seed)
 
     def generate(self, phase: Phase, task: Task) -> List[Trial]:
         """Compile a list of Trial objects for a training or test phase,
         single or dual task.
         """
+        return self.createTrials(self.sampleBlock(phase, task))
+
+    def sampleBlock(self, phase: Phase, task: Task) -> numpy.ndarray:
+        """Sample the trials of a block, in the order they are presented
+
+        Returns:
+            ndarray: one row per trial, of dtype PLAN_DTYPE (pid and block are not set)
+        """
         div = self.const.n_training_trial_divisor if phase == 'train' else 1
-        trials = []
+        conditions = []
         for presence in (False, True):
             for soa in (False, True):
                 recipe = TrialRecipe(phase, task, presence, soa)
                 if task == 'single':
                     n = self.const.n_trials_single // div
-                    trials += self.trialsFor(recipe, n)
                 elif presence and (not soa):
                     n = self.const.n_trials_dual_critical // div
-                    trials += self.trialsFor(recipe, n)
                 else:
                     n = self.const.n_trials_dual_easy // div
-                    trials += self.trialsFor(recipe, n)
-        shuffle(trials)
+                conditions.append(self.sampleCondition(recipe, n))
+        rows = numpy.concatenate(conditions)
+        return rows[self.rng.permutation(rows.size)]
+
+    def createTrials(self, rows: numpy.ndarray, planIndex: Optional[int]=None) -> List[Trial]:
+        """Add sampled (or planned) rows to the table, and return them as Trial objects,
+        which are also added to `all`
+
+        Args:
+            rows (ndarray): trials of dtype PLAN_DTYPE
+            planIndex (int): position of the first row in the session plan, if any
+        """
+        n = rows.size
+        start = self.table.extend(n)
+        new = self.table.rows[start:start+n]
+        for name in ('phase', 'task', 't2presence', 'soa_long', 'delay_index',
+                     't1_index', 't2_index', 'vis_init', 'masks'):
+            new[name] = rows[name]
+        training = rows['phase'] == b'train'
+        new['delay'] = numpy.where(rows['delay_index'] == 1, self.timer.long_T1_delay, self.timer.short_T1_delay)
+        new['soa'] = numpy.where(rows['soa_long'], self.timer.long_SOA, self.timer.short_SOA)
+        new['iti'] = [self.timer.secsToFlips(iti_s) for iti_s in rows['iti_s'].tolist()]
+        for name, forT2 in (('t1_trigger', False), ('t2_trigger', True)):
+            new[name] = encode(training, forT2, rows['t2presence'], rows['task'] == b'dual', rows['soa_long'])
+        new['id_trigger'] = numpy.where(training, Triggers.taskT1variant_training, Triggers.taskT1variant)
+        new['vis_trigger'] = numpy.where(training, Triggers.taskT2visibility_training, Triggers.taskT2visibility)
+        if planIndex is not None:
+            new['plan_index'] = numpy.arange(planIndex, planIndex + n)
+        trials: List[Trial] = [TrialView(self.table, i) for i in range(start, start+n)]
         self.all += trials
         return trials
 
-    def trialsFor(self, recipe: TrialRecipe, n: int) -> Iterator[Trial]:
+    def requeue(self, trial: Trial) -> Trial:
+        """Create a replacement for a trial that was invalid
+
+        The replacement has the same condition (TrialRecipe) and balanced
+        variables, so the cell counts and balancing stay as generated.
+        Masks and ITI are sampled anew. It is added to the end of `all`.
+        """
+        recipe = TrialRecipe(trial.phase, trial.task, trial.t2presence, trial.soa_long)
+        iti_s = self.rng.uniform(self.const.iti_min_sec, self.const.iti_max_sec)
+        new_trial = self.createTrial(recipe, float(iti_s), trial.delay_index,
+                                     trial.t1_index, trial.t2_index, trial.vis_init)
+        new_trial.replaces = self.indexOf(trial)
+        new_trial = self.table.append(new_trial)
+        self.all.append(new_trial)
+        return new_trial
+
+    def indexOf(self, trial: Trial) -> int:
+        """Position of this trial object in the session
+
+        Counted from `firstIndex`, which is non-zero when resuming a session.
+        """
+        if isinstance(trial, TrialView) and trial._table is self.table:
+            return self.firstIndex + trial._index
+        return self.firstIndex + next(i for i, t in enumerate(self.all) if t is trial)
+
+    def sampleCondition(self, recipe: TrialRecipe, n: int) -> numpy.ndarray:
         """balances the remaining variables within the condition
         """
-        delays = self.shuffledRepeatedList([0, 1], n)
-        t1s = self.shuffledRepeatedList([0, 1], n)
-        t2s = self.shuffledRepeatedList([0, 1, 2, 3], n)
-        vis_inits = self.shuffledRepeatedList(list(range(21)), n)
-        iti_min = self.const.iti_min_sec
-        iti_var = self.const.iti_max_sec - iti_min
-        itis = [iti_min + rand()*iti_var for _ in range(n)]
-        for t in range(n):
-            yield self.createTrial(recipe, itis[t], delays[t], t1s[t], t2s[t], vis_inits[t])
+        rows = numpy.zeros(n, dtype=PLAN_DTYPE)
+        rows['phase'] = recipe.phase
+        rows['task'] = recipe.task
+        rows['t2presence'] = recipe.t2presence
+        rows['soa_long'] = recipe.soa_long
+        rows['delay_index'] = self.shuffledRepeatedList([0, 1], n)[:n]
+        rows['t1_index'] = self.shuffledRepeatedList([0, 1], n)[:n]
+        rows['t2_index'] = self.shuffledRepeatedList([0, 1, 2, 3], n)[:n]
+        rows['vis_init'] = self.shuffledRepeatedList(list(range(21)), n)[:n]
+        rows['iti_s'] = self.rng.uniform(self.const.iti_min_sec, self.const.iti_max_sec, n)
+        rows['masks'] = self.sampleMasks(n)
+        return rows
 
     def shuffledRepeatedList(self, vals: List[int], length: int) -> List[int]:
         """Repeat the provided list until it is at least the given length,
         then return a shuffled version.
         """
-        repeated_list = vals * ceil(length/len(vals))
-        return sample(repeated_list, len(repeated_list))
+        repeated = numpy.tile(vals, ceil(length/len(vals)))
+        return self.rng.permutation(repeated).tolist()
+
+    def sampleMasks(self, n: int) -> List[Tuple[str, str, str]]:
+        """Three masks for each of n trials, of four different consonants each
+        """
+        consonants = numpy.array(self.const.possible_consonants)
+        ## the first four of a random ordering of the consonants, for each mask
+        order = self.rng.random((n * 3, consonants.size)).argsort(axis=1)[:, :4]
+        strings = [''.join(letters) for letters in consonants[order].tolist()]
+        return [tuple(strings[t*3:(t+1)*3]) for t in range(n)] # type: ignore
 
-    def createTrial(self, recipe: TrialRecipe, iti_s: float, delay: int, t1: int, t2: int, vis: int) -> Trial:
-        """Create a single trial, initializing unbalanced random variables
+    def createTrial(self, recipe: TrialRecipe, iti_s: float, delay: int, t1: int, t2: int, vis: int,
+                    masks: Optional[Tuple[str, str, str]]=None) -> Trial:
+        """Create a single trial from its sampled variables,
+        masks are sampled here if not provided
         """
-        masks = [''.join(sample(self.const.possible_consonants, 4)) for _ in range(3)]
+        if masks is None:
+            masks = self.sampleMasks(1)[0]
         task_variant_trigger = Triggers.taskT1variant
         task_visibility_trigger = Triggers.taskT2visibility
         if recipe.phase=='train':
@@ -103,7 +205,7 @@ class TrialGenerator:
             ),
             id_trigger=task_variant_trigger,
             vis_trigger=task_visibility_trigger,
-            masks=tuple(masks),
+            masks=masks,
             vis_init=vis,
             **asdict(recipe)
         )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass, asdict
+from experiment.codec import encode
 OFFSET = True
 
 def trigger_logic():
@@ -59,8 +60,9 @@ class Triggers:
 
     @classmethod
     def get_number(cls, training=False, forT2=False, t2Present=False, dualTask=False, longSOA=False) -> int:
-        bools = [training, not training, forT2, t2Present, dualTask, longSOA]
-        return int(''.join([str(int(b)) for b in bools]), 2)
+        """Trigger code of a target, from the table in experiment.codec
+        """
+        return encode(training, forT2, t2Present, dualTask, longSOA)
 
     def asdict(self):
         return asdict(self)
@@ -1,18 +1,28 @@
 """This is the main script to run the experiment
+
+    python start.py [--plan plans.npy] [--resume interrupted_trials.csv]
 """
 from os.path import expanduser, join
+from argparse import ArgumentParser
 from datetime import datetime
 from os import makedirs
 from math import isclose
-import platform, itertools
-from pandas import DataFrame
+import platform
 from experiment.constants import Constants
 from experiment.timer import Timer
-from experiment.trials import TrialGenerator
+from experiment.trials import TrialGenerator, participantSeed
 from experiment.engine import PsychopyEngine
 from experiment.labs import getLabConfiguration
+from experiment.persistence import TrialWriter
+from experiment.session import runSession, counterbalanceBlocks
+from experiment.plan import loadPlan, compilePlan, resumePosition
 const = Constants()  # load fixed parameters wrt timing, sizing etc
 
+parser = ArgumentParser(description='Run the experiment')
+parser.add_argument('--plan', help='session plans file (python -m experiment.plan compile)')
+parser.add_argument('--resume', help='trials file of an interrupted session, to continue where it stopped')
+args = parser.parse_args()
+
 
 ## this object represents drawing and interactions via psychopy
 engine = PsychopyEngine()
@@ -20,8 +30,12 @@ engine = PsychopyEngine()
 ## user input
 config = getLabConfiguration()
 SITE = config['site']['abbreviation']
+const.max_requeued_per_block = config.get('session', dict()).get('max_requeued_per_block', 0)
 pid = int(engine.askForParticipantString())
 sub = f'{SITE}{pid}' # the subject ID is a combination of lab ID + subject index
+seed = participantSeed(SITE, pid) # the trials of a participant can be regenerated from this
+## the precompiled trial order of this participant, read from disk as needed
+plan = loadPlan(args.plan, pid) if args.plan else None
 
 ## data directory and file paths
 data_dir = expanduser(config['site']['directory'])
@@ -31,9 +45,10 @@ dt_str = datetime.now().strftime(f'%Y%m%d%H%M%S')
 # full file path to trials (structured) and log (unstructured) output 
 trials_fpath = join(data_dir, f'sub-{sub}_run-{dt_str}_trials.csv')
 log_fpath = join(data_dir, f'sub-{sub}_run-{dt_str}_log.txt')
+events_fpath = join(data_dir, f'sub-{sub}_run-{dt_str}_log.jsonl')
 
 ## set log levels and log file location
-engine.configureLog(log_fpath)
+engine.configureLog(log_fpath, events_fpath)
 
 ## setup psychopy monitor and window objects
 engine.configureWindow(config)
@@ -41,10 +56,11 @@ engine.configureWindow(config)
 ## record some basic info
 engine.logDictionary('SESSION', dict(
     participant_index=pid,
+    seed=seed,
     date_str=dt_str))
 engine.logDictionary('PLATFORM', platform.uname()._asdict())
 engine.logDictionary('SITE_CONFIG', config)
-performance = engine.measureHardwarePerformance()
+performance = engine.measureHardwarePerformance(config) # cached per machine and monitor
 engine.logDictionary('PERFORMANCE', performance)
 fr_conf = config['monitor']['refresh_rate']
 fr_meas = 1000/performance['windowRefreshTimeAvg_ms']
@@ -59,44 +75,27 @@ engine.loadStimuli(
     squareSize=const.square_size,
     squareOffset=const.target2_square_offset,
     fixSize=const.fix_cross_arm_len,
+    textCacheSize=const.text_cache_size,
 )
+engine.preloadText(const.target1_strings + const.target2_strings, pin=True)
 
 # Welcome the participant
 engine.showMessage(const.welcome_message, const.LARGE_FONT)
 
-## counterbalance task type based on the participant index being odd or even
-blocks = ('dual', 'single') if (pid % 2) == 0 else ('single', 'dual')
-
 timer = Timer()
 timer.optimizeFlips(fr_conf, const)
-trials = TrialGenerator(timer, const)
-
-## before experiment
-engine.showMessage(const.training_instructions)
-
-for phase, block in itertools.product(('train', 'test'), blocks):
-
-    block_trials = trials.generate(phase, block)
-
-    engine.showMessage(
-        const.dual_block_start if block == 'dual' else const.single_block_start
-    )
-
-    for trial in block_trials:
-        trial.run(engine, timer)
-        if engine.exitRequested():
-            break ## exit trial loop
-
-    if engine.exitRequested():
-        break ## exit phase/block loop
+trials = TrialGenerator(timer, const, seed)
+if plan is None:
+    plan = compilePlan(trials, pid, counterbalanceBlocks(pid))
 
-    if phase == 'train':
-        engine.showMessage(const.finished_training)
+## continue an interrupted session at the first trial without responses
+start = 0
+if args.resume:
+    start, trials.firstIndex = resumePosition(args.resume)
+    engine.logDictionary('RESUME', dict(trials_fpath=args.resume, plan_position=start))
 
-## Create table from trials and save to csv file
-df = DataFrame([t.todict() for t in trials.all])
-df.to_csv(trials_fpath, float_format='%.4f')
+## trials are saved as soon as they are finished
+writer = TrialWriter(trials_fpath)
 
-if not engine.exitRequested():
-    engine.showMessage(const.thank_you, confirm=False)
+runSession(engine, trials, plan, writer, const, start)
 engine.stop()
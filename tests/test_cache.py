@@ -0,0 +1,39 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+
+
+class StimulusCacheTests(TestCase):
+
+    def test_renders_once(self):
+        from experiment.cache import StimulusCache
+        factory = Mock(side_effect=lambda t: f'stim {t}')
+        cache = StimulusCache(factory, capacity=10)
+        cache.preload(['ABCD', 'EFGH'])
+        self.assertEqual(cache.get('ABCD'), 'stim ABCD')
+        self.assertEqual(cache.get('EFGH'), 'stim EFGH')
+        self.assertEqual(factory.call_count, 2)
+
+    def test_bounded_least_recently_used(self):
+        from experiment.cache import StimulusCache
+        cache = StimulusCache(lambda t: t.lower(), capacity=3)
+        cache.preload(['A', 'B', 'C'])
+        cache.get('A')
+        cache.preload(['D', 'E'])
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.evictions, 2)
+        self.assertIn('A', cache)
+        self.assertNotIn('B', cache)
+        self.assertNotIn('C', cache)
+
+    def test_pinned_never_evicted(self):
+        from experiment.cache import StimulusCache
+        factory = Mock(side_effect=lambda t: t.lower())
+        cache = StimulusCache(factory, capacity=2)
+        cache.get('XOOX')
+        cache.preload(['XOOX', 'OXXO'], pin=True)
+        self.assertEqual(factory.call_count, 2)
+        cache.preload(['A', 'B', 'C', 'D'])
+        self.assertIn('XOOX', cache)
+        self.assertIn('OXXO', cache)
+        self.assertEqual(len(cache), 4)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+from unittest import TestCase
+
+
+class CodecTests(TestCase):
+
+    def test_encode_matches_trigger_names(self):
+        from experiment.codec import encode
+        from experiment.triggers import Triggers
+        for name, code in Triggers().asdict().items():
+            if name.startswith('task'):
+                continue
+            stim, presence, task, soa = name.split('_')[:4]
+            conds = dict(
+                training=name.endswith('_training'),
+                forT2=stim == 't2',
+                t2Present=presence == 'present',
+                dualTask=task == 'dualTask',
+                longSOA=soa == 'longSOA'
+            )
+            self.assertEqual(encode(**conds), code, name)
+            self.assertEqual(Triggers.get_number(**conds), code, name)
+
+    def test_encode_arrays(self):
+        from experiment.codec import encode
+        import numpy
+        codes = encode(numpy.array([False, True]), True, numpy.array([True, False]), True, False)
+        self.assertEqual(codes.tolist(), [30, 42])
+
+    def test_decode_events(self):
+        from experiment.codec import decode, PROMPT_IDENTITY, PROMPT_VISIBILITY, NO_PROMPT
+        import numpy
+        events = numpy.array([
+            [100, 0, 22],
+            [130, 0, 30],
+            [200, 0, 2],
+            [300, 0, 1],
+            [400, 0, 45],
+            [450, 0, 12],
+            [500, 0, 99],
+            [600, 0, 65536 + 22],
+        ])
+        decoded = decode(events)
+        self.assertEqual(decoded['sample'].tolist(), [100, 130, 200, 300, 400, 450, 500, 600])
+        self.assertEqual(decoded['known'].tolist(), [True] * 6 + [False] * 2)
+        self.assertEqual(decoded['target'].tolist(), [True, True, False, False, True, False, False, False])
+        self.assertEqual(decoded['forT2'].tolist(), [False, True, False, False, True, False, False, False])
+        self.assertEqual(decoded['training'].tolist(), [False] * 4 + [True] * 2 + [False] * 2)
+        self.assertEqual(decoded['t2Present'][[0, 1, 4]].tolist(), [True, True, True])
+        self.assertEqual(decoded['dualTask'][[0, 1, 4]].tolist(), [True, True, False])
+        self.assertEqual(decoded['longSOA'][[0, 1, 4]].tolist(), [False, False, True])
+        self.assertEqual(decoded['prompt'].tolist(), [NO_PROMPT, NO_PROMPT, PROMPT_VISIBILITY,
+            PROMPT_IDENTITY, NO_PROMPT, PROMPT_VISIBILITY, NO_PROMPT, NO_PROMPT])
+
+    def test_target_codes(self):
+        from experiment.codec import targetCodes
+        self.assertEqual(targetCodes(forT2=True), list(range(24, 31+1)) + list(range(40, 47+1)))
+        self.assertEqual(targetCodes(training=False, forT2=False, dualTask=True, longSOA=True), [19, 23])
+        self.assertEqual(len(targetCodes()), 32)
+        with self.assertRaises(ValueError):
+            targetCodes(soa=True)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+class EventLogTests(TestCase):
+
+    def test_records_are_written_in_order(self):
+        from experiment.eventlog import EventLog, readEventLog
+        import numpy
+        with TemporaryDirectory() as tmp:
+            fpath = join(tmp, 'log.jsonl')
+            log = EventLog(fpath, clock=lambda: 1.5)
+            log.session('PLATFORM', dict(system='Linux', sizes=numpy.array([1, 2])))
+            log.flip(2.0, 40, 't1_onset')
+            log.trigger(2.0, 16)
+            log.prompt('visibility', 3.0, 12.5, 830, 31)
+            log.close()
+            df = readEventLog(fpath)
+        self.assertEqual(list(df.type), ['session', 'flip', 'trigger', 'prompt'])
+        self.assertEqual(list(df.t), [1.5, 2.0, 2.0, 3.0])
+        self.assertEqual(df.content[0], dict(system='Linux', sizes=[1, 2]))
+        self.assertEqual(df.slot[1], 't1_onset')
+        self.assertEqual(df.value[2], 16)
+        self.assertEqual(df.rating[3], 12.5)
+        self.assertEqual(df.rt[3], 830)
+
+    def test_close_writes_everything(self):
+        from experiment.eventlog import EventLog
+        with TemporaryDirectory() as tmp:
+            fpath = join(tmp, 'log.jsonl')
+            log = EventLog(fpath)
+            for f in range(1000):
+                log.trigger(f / 60, 1)
+            log.close()
+            with open(fpath) as fhandle:
+                self.assertEqual(len(fhandle.readlines()), 1000)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+class HardwareProfileTests(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = TemporaryDirectory()
+        self.fpath = join(self.tmp.name, 'profiles', 'hardware.json')
+        self.now = 1000.0
+        self.measure = Mock(return_value=dict(windowRefreshTimeAvg_ms=1000/60, pythonVersion=(3, 8), openGLVendor=Mock(__str__=lambda s: 'vendor')))
+        self.quickRate = Mock(return_value=60.2)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def profiles(self):
+        from experiment.hardware import HardwareProfiles
+        return HardwareProfiles(self.fpath, maxAgeDays=1, clock=lambda: self.now)
+
+    def test_measures_once_then_uses_cache(self):
+        first = self.profiles().performance('key', self.quickRate, self.measure)
+        self.assertEqual(first['profile'], 'measured')
+        self.quickRate.assert_not_called()
+        self.now += 3600
+        second = self.profiles().performance('key', self.quickRate, self.measure)
+        self.assertEqual(second['profile'], 'cached')
+        self.assertEqual(second['windowRefreshTimeAvg_ms'], 1000/60)
+        self.assertEqual(second['pythonVersion'], [3, 8])
+        self.assertEqual(second['openGLVendor'], 'vendor')
+        self.assertEqual(self.measure.call_count, 1)
+
+    def test_measures_again_when_expired(self):
+        self.profiles().performance('key', self.quickRate, self.measure)
+        self.now += 2 * 24 * 3600
+        again = self.profiles().performance('key', self.quickRate, self.measure)
+        self.assertEqual(again['profile'], 'measured')
+        self.assertEqual(self.measure.call_count, 2)
+
+    def test_measures_again_when_refresh_rate_changed(self):
+        self.profiles().performance('key', self.quickRate, self.measure)
+        for rate in (120.0, None):
+            self.quickRate.return_value = rate
+            self.profiles().performance('key', self.quickRate, self.measure)
+        self.assertEqual(self.measure.call_count, 3)
+
+    def test_keys_and_damaged_file(self):
+        from experiment.hardware import profileKey
+        monitor = dict(width=60.0, distance=60, resolution=[1920, 1080], refresh_rate=120)
+        self.assertEqual(profileKey(monitor), profileKey(dict(monitor)))
+        self.assertNotEqual(profileKey(monitor), profileKey(dict(monitor, refresh_rate=60)))
+        self.profiles().performance(profileKey(monitor), self.quickRate, self.measure)
+        with open(self.fpath, 'w') as fhandle:
+            fhandle.write('{"trunc')
+        result = self.profiles().performance(profileKey(monitor), self.quickRate, self.measure)
+        self.assertEqual(result['profile'], 'measured')
+        self.assertIsNotNone(self.profiles().lookup(profileKey(monitor)))
@@ -0,0 +1,158 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class IdleSchedulerTests(TestCase):
+
+    def test_runs_in_order_within_deadline(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        scheduler.estimates['a'] = 0.004
+        done = []
+        scheduler.defer(lambda: done.append(1), 'a')
+        scheduler.defer(lambda: done.append(2), 'a')
+        self.assertEqual(scheduler.runUntil(0.016), 2)
+        self.assertEqual(done, [1, 2])
+        self.assertEqual(len(scheduler), 0)
+
+    def test_waits_when_not_enough_time(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        scheduler.estimates['a'] = 0.004
+        job = Mock()
+        scheduler.defer(job, 'a')
+        self.assertEqual(scheduler.runUntil(0.005), 0)
+        job.assert_not_called()
+        self.assertEqual(scheduler.runUntil(0.010), 1)
+        job.assert_called_once()
+
+    def test_learns_duration(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        def slowJob():
+            clock.now += 0.010
+        scheduler.defer(slowJob, 'slow')
+        ## not run in a frame before its duration is known
+        self.assertEqual(scheduler.runUntil(0.016), 0)
+        self.assertEqual(scheduler.runBeforeFrames(1/60), 1)
+        self.assertAlmostEqual(scheduler.estimates['slow'], 0.010)
+        self.assertEqual(scheduler.overruns, 0)
+        ## next time it only runs if the frame has 10ms + margin left
+        clock.now = 1.0
+        scheduler.defer(slowJob, 'slow')
+        self.assertEqual(scheduler.runUntil(1.011), 0)
+        self.assertEqual(scheduler.runUntil(1.013), 1)
+
+    def test_alternating_cost_never_overruns(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        costs = ([0.008] + [0.001] * 9) * 5 # e.g. a write that syncs to disk every 10th time
+        for cost in costs:
+            scheduler.defer(lambda cost=cost: setattr(clock, 'now', clock.now + cost), 'save')
+        scheduler.runBeforeFrames(1/60)
+        frame = 0.0
+        while len(scheduler):
+            frame += 1/60
+            clock.now = frame + 0.001 # after the flip
+            scheduler.runUntil(frame + 1/60)
+        self.assertAlmostEqual(scheduler.estimates['save'], 0.008)
+        self.assertEqual(scheduler.overruns, 0)
+
+    def test_slow_job_does_not_block_later_jobs(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        scheduler.estimates.update(gc=0.012, save=0.001)
+        done = []
+        scheduler.defer(lambda: done.append('gc'), 'gc')
+        for t in range(3):
+            scheduler.defer(lambda t=t: done.append(t), 'save')
+        clock.now = 0.006 # too late in the frame for the collection
+        self.assertEqual(scheduler.runUntil(1/60), 3)
+        self.assertEqual(done, [0, 1, 2])
+        self.assertEqual(len(scheduler), 1)
+        clock.now = 1.0 # early in a later frame
+        self.assertEqual(scheduler.runUntil(1 + 1/60), 1)
+        self.assertEqual(done[-1], 'gc')
+
+    def test_same_kind_keeps_its_order(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        done = []
+        def save(t, cost):
+            done.append(t)
+            clock.now += cost
+        scheduler.defer(lambda: save(0, 0.004), 'save')
+        scheduler.defer(lambda: save(1, 0.001), 'save')
+        scheduler.defer(lambda: save(2, 0.001), 'save')
+        scheduler.runBeforeFrames(1/60)
+        clock.now = 0.012 # 4ms + margin does not fit, so neither of the later saves runs
+        self.assertEqual(scheduler.runUntil(1/60), 0)
+        self.assertEqual(scheduler.runUntil(1.0), 2)
+        self.assertEqual(done, [0, 1, 2])
+
+    def test_estimate_recovers_from_outlier(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002, window=5)
+        for cost in [0.030] + [0.001] * 5:
+            scheduler.defer(lambda cost=cost: setattr(clock, 'now', clock.now + cost), 'flush log')
+            scheduler.runAll()
+            if cost > 0.01:
+                self.assertAlmostEqual(scheduler.estimates['flush log'], 0.030)
+        self.assertAlmostEqual(scheduler.estimates['flush log'], 0.001)
+
+    def test_jobs_longer_than_a_frame_run_before_frames(self):
+        from experiment.idle import IdleScheduler
+        clock = FakeClock()
+        scheduler = IdleScheduler(clock, margin=0.002)
+        scheduler.estimates.update(gc=0.020, save=0.001)
+        slow, cheap = Mock(), Mock()
+        scheduler.defer(slow, 'gc')
+        scheduler.defer(cheap, 'save')
+        self.assertEqual(scheduler.runBeforeFrames(1/60), 1)
+        slow.assert_called_once()
+        cheap.assert_not_called()
+        self.assertEqual(scheduler.runUntil(1/60), 1)
+        cheap.assert_called_once()
+
+    def test_run_all(self):
+        from experiment.idle import IdleScheduler
+        scheduler = IdleScheduler(FakeClock())
+        jobs = [Mock(), Mock()]
+        for job in jobs:
+            scheduler.defer(job, 'a')
+        self.assertEqual(scheduler.runAll(), 2)
+        for job in jobs:
+            job.assert_called_once()
+
+
+class IdleFramesTests(TestCase):
+
+    def test_iti_idle_except_last_frame(self):
+        from experiment.schedule import compileTrial
+        trial = Mock()
+        trial.iti, trial.delay, trial.soa = 250, 31, 15
+        trial.target1, trial.target2 = 'XOOX', 'FIVE'
+        trial.masks = ('BCDF', 'GHJK', 'MNPR')
+        timer = Mock()
+        timer.target_dur, timer.task_delay = 3, 37
+        schedule = compileTrial(trial, timer)
+        self.assertEqual(sum(schedule.idle), 249)
+        self.assertTrue(all(schedule.idle[:249]))
+        self.assertFalse(any(schedule.idle[249:]))
@@ -0,0 +1,92 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+class TrialWriterTests(TestCase):
+
+    def setUp(self) -> None:
+        from experiment.constants import Constants
+        self.timer = Mock()
+        self.timer.short_T1_delay = 31
+        self.timer.long_T1_delay = 51
+        self.timer.short_SOA = 15
+        self.timer.long_SOA = 41
+        self.timer.secsToFlips.side_effect = lambda s: round(s*70)
+        self.consts = Constants()
+        self.tmp = TemporaryDirectory()
+        self.fpath = join(self.tmp.name, 'sub-TEST1_trials.csv')
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def finishedTrials(self):
+        from experiment.trials import TrialGenerator
+        generator = TrialGenerator(self.timer, self.consts)
+        trials = generator.generate('train', 'dual')
+        for t, trial in enumerate(trials):
+            trial.vis_rating, trial.vis_onset, trial.vis_rt = 3, 12.3456789, 987
+            trial.id_choice, trial.id_onset, trial.id_rt = t % 2, 13.5, 654
+            trial.t1_onset = 10.0 + t
+        return trials
+
+    def test_same_layout_as_pandas(self):
+        from pandas import DataFrame, read_csv
+        from pandas.testing import assert_frame_equal
+        from experiment.persistence import TrialWriter
+        trials = self.finishedTrials()
+        writer = TrialWriter(self.fpath, fsyncEvery=4)
+        for t, trial in enumerate(trials):
+            writer.write(trial, t)
+        writer.close()
+        expected_fpath = join(self.tmp.name, 'expected.csv')
+        DataFrame([t.todict() for t in trials]).to_csv(expected_fpath, float_format='%.4f')
+        with open(self.fpath) as fhandle, open(expected_fpath) as expected:
+            self.assertEqual(fhandle.readline(), expected.readline())
+        assert_frame_equal(read_csv(self.fpath), read_csv(expected_fpath))
+
+    def test_syncs_outside_the_calling_thread(self):
+        from unittest.mock import patch
+        from threading import current_thread
+        from experiment.persistence import TrialWriter
+        trials = self.finishedTrials()
+        threads = []
+        with patch('experiment.persistence.os.fsync', lambda fd: threads.append(current_thread())):
+            writer = TrialWriter(self.fpath, fsyncEvery=2)
+            threads.clear() # the header is synced when the file is created
+            for t, trial in enumerate(trials[:4]):
+                writer.write(trial, t)
+            writer.close()
+        self.assertEqual(len(threads), 3) # every 2 rows, and when closed
+        self.assertEqual([t.name for t in threads[:2]], ['trials-file-sync'] * 2)
+        self.assertIs(threads[2], current_thread())
+
+    def test_append_after_reopen(self):
+        from pandas import read_csv
+        from experiment.persistence import TrialWriter
+        trials = self.finishedTrials()
+        writer = TrialWriter(self.fpath)
+        writer.write(trials[0], 0)
+        writer.close()
+        writer = TrialWriter(self.fpath)
+        writer.write(trials[1], 1)
+        writer.close()
+        self.assertEqual(list(read_csv(self.fpath)['Unnamed: 0']), [0, 1])
+
+    def test_recover_partial(self):
+        from pandas import read_csv
+        from experiment.persistence import TrialWriter, recover
+        trials = self.finishedTrials()
+        writer = TrialWriter(self.fpath)
+        for t, trial in enumerate(trials[:5]):
+            writer.write(trial, t)
+        writer.close()
+        with open(self.fpath) as fhandle:
+            contents = fhandle.read()
+        with open(self.fpath, 'w') as fhandle:
+            fhandle.write(contents[:-40]) # crash halfway through the last row
+        out_fpath = join(self.tmp.name, 'recovered.csv')
+        self.assertEqual(recover(self.fpath, out_fpath), 4)
+        self.assertEqual(list(read_csv(out_fpath)['Unnamed: 0']), [0, 1, 2, 3])
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+class PlanTests(TestCase):
+
+    def test_compile_save_load(self):
+        from experiment.plan import compilePlans, loadPlan, blockBounds
+        from experiment.constants import Constants
+        import numpy
+        plans = compilePlans('UOLM', [3, 1, 2], Constants())
+        with TemporaryDirectory() as tmp:
+            fpath = join(tmp, 'plans.npy')
+            numpy.save(fpath, plans)
+            plan = loadPlan(fpath, 2)
+            self.assertIsInstance(plan, numpy.memmap)
+            self.assertTrue((plan['pid'] == 2).all())
+            self.assertEqual(plan.size, 414)
+            numpy.testing.assert_array_equal(plan, plans[plans['pid'] == 2])
+            self.assertEqual([(p, t) for p, t in zip(plan['phase'][[0, -1]], plan['task'][[0, -1]])],
+                             [(b'train', b'dual'), (b'test', b'single')])
+            self.assertEqual([stop - start for start, stop in blockBounds(plan)], [30, 16, 240, 128])
+            with self.assertRaises(ValueError):
+                loadPlan(fpath, 4)
+            del plan
+
+    def test_plan_matches_seeded_generation(self):
+        from experiment.plan import compilePlans
+        from experiment.trials import TrialGenerator, participantSeed
+        from experiment.constants import Constants
+        from experiment.timer import Timer
+        const = Constants()
+        timer = Timer()
+        timer.optimizeFlips(60, const)
+        plan = compilePlans('UOLM', [5], const)
+        generator = TrialGenerator(timer, const, participantSeed('UOLM', 5))
+        trials = generator.createTrials(plan[:16], planIndex=0)
+        first_block = TrialGenerator(timer, const, participantSeed('UOLM', 5)).generate('train', 'single')
+        self.assertEqual([t.todict() for t in first_block], [
+            dict(t.todict(), plan_index=None) for t in trials])
+        self.assertEqual(trials[7].plan_index, 7)
+
+    def test_parse_pids(self):
+        from experiment.plan import parsePids
+        self.assertEqual(parsePids('1-3,7'), [1, 2, 3, 7])
+
+    def test_resume(self):
+        from experiment.plan import compilePlan, resumePosition
+        from experiment.simulation import SimulationEngine
+        from experiment.session import runSession, counterbalanceBlocks
+        from experiment.trials import TrialGenerator
+        from experiment.persistence import TrialWriter
+        from experiment.constants import Constants
+        from experiment.timer import Timer
+        import pandas
+        const = Constants()
+        timer = Timer()
+        timer.optimizeFlips(60, const)
+        plan = compilePlan(TrialGenerator(timer, const, 1), 1, counterbalanceBlocks(1))
+        with TemporaryDirectory() as tmp:
+            ## a complete session, then a copy that was cut off in the middle of trial 100
+            complete_fpath = join(tmp, 'complete.csv')
+            runSession(SimulationEngine(seed=1), TrialGenerator(timer, const, 1), plan,
+                       TrialWriter(complete_fpath, fsyncEvery=0), const)
+            with open(complete_fpath) as fhandle:
+                lines = fhandle.readlines()
+            crashed_fpath = join(tmp, 'crashed.csv')
+            with open(crashed_fpath, 'w') as fhandle:
+                fhandle.writelines(lines[:101] + [lines[101][:40]])
+            start, next_index = resumePosition(crashed_fpath)
+            self.assertEqual((start, next_index), (100, 100))
+            resumed_fpath = join(tmp, 'resumed.csv')
+            trials = TrialGenerator(timer, const, 1)
+            trials.firstIndex = next_index
+            runSession(SimulationEngine(seed=2), trials, plan,
+                       TrialWriter(resumed_fpath, fsyncEvery=0), const, start)
+            complete = pandas.read_csv(complete_fpath, index_col=0)
+            resumed = pandas.concat([
+                pandas.read_csv(crashed_fpath, index_col=0).iloc[:100],
+                pandas.read_csv(resumed_fpath, index_col=0)
+            ])
+        self.assertEqual(list(resumed.index), list(range(414)))
+        self.assertEqual(list(resumed.plan_index), list(range(414)))
+        for column in ('t1_trigger', 't2_trigger', 'iti', 'masks', 'vis_init'):
+            self.assertEqual(list(resumed[column]), list(complete[column]))
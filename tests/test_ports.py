@@ -0,0 +1,101 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+import os
+
+
+class TriggerInterfaceTests(TestCase):
+
+    def test_idle_port_not_reset(self):
+        from experiment.ports import TriggerInterface
+        port = Mock()
+        port.PULSED = True
+        interface = TriggerInterface(port, pulseWidth=0)
+        for _ in range(10):
+            interface.update()
+        port.reset.assert_not_called()
+
+    def test_pulse_reset_once_after_width(self):
+        from experiment.ports import TriggerInterface
+        port = Mock()
+        port.PULSED = True
+        interface = TriggerInterface(port, pulseWidth=10_000)
+        interface.trigger(22)
+        port.trigger.assert_called_once_with(22)
+        interface.update()
+        port.reset.assert_not_called()
+        interface.pulseWidth = 0
+        interface.update()
+        interface.update()
+        port.reset.assert_called_once()
+
+    def test_new_trigger_ends_previous_pulse(self):
+        from experiment.ports import TriggerInterface
+        port = Mock()
+        port.PULSED = True
+        interface = TriggerInterface(port, pulseWidth=10_000)
+        interface.trigger(22)
+        interface.trigger(30)
+        self.assertEqual(port.reset.call_count, 1)
+        interface.clear()
+        self.assertEqual(port.reset.call_count, 2)
+
+    def test_unpulsed_port_never_reset(self):
+        from experiment.ports import TriggerInterface
+        port = Mock()
+        port.PULSED = False
+        interface = TriggerInterface(port, pulseWidth=0)
+        interface.trigger(22)
+        interface.update()
+        interface.clear()
+        port.reset.assert_not_called()
+
+
+class ThreadedSerialTriggerPortTests(TestCase):
+
+    def setUp(self) -> None:
+        self.master, slave = os.openpty()
+        self.slave_name = os.ttyname(slave)
+        self.slave = slave
+
+    def tearDown(self) -> None:
+        os.close(self.master)
+        os.close(self.slave)
+
+    def read(self, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            data += os.read(self.master, n - len(data))
+        return data
+
+    def test_writes_triggers_in_order(self):
+        from experiment.ports import ThreadedSerialTriggerPort
+        port = ThreadedSerialTriggerPort(self.slave_name, 115200)
+        for val in (16, 31, 1, 255):
+            port.trigger(val)
+            port.reset()
+        port.close()
+        self.assertEqual(self.read(4), bytes([16, 31, 1, 255]))
+
+    def test_latency_histogram(self):
+        from experiment.ports import ThreadedSerialTriggerPort
+        port = ThreadedSerialTriggerPort(self.slave_name, 115200)
+        for val in range(20):
+            port.trigger(val)
+        port.close()
+        self.read(20)
+        hist = port.latencyHistogram(binWidthMs=1, nBins=10)
+        self.assertEqual(hist['n'], 20)
+        self.assertEqual(hist['timeouts'], 0)
+        self.assertEqual(sum(hist['counts']), 20)
+        self.assertEqual(len(hist['bin_edges_ms']), 11)
+        self.assertGreater(hist['max_ms'], 0)
+
+    def test_write_timeout_only_for_threaded_port(self):
+        from experiment.ports import createTriggerPort
+        interface = createTriggerPort('serial', None, 1.0, self.slave_name, 115200, writeTimeout=0.01) # type: ignore
+        self.assertIsNone(interface.port.sport.write_timeout)
+        interface.port.sport.close()
+        interface = createTriggerPort('serial', None, 1.0, self.slave_name, 115200, threaded=True, writeTimeout=0.01) # type: ignore
+        self.assertEqual(interface.port.sport.write_timeout, 0.01)
+        interface.port.close()
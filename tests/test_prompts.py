@@ -0,0 +1,67 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+
+
+class PromptTests(TestCase):
+
+    def setUp(self) -> None:
+        try:
+            from experiment.engine import PsychopyEngine
+        except ImportError:
+            self.skipTest('psychopy not available')
+        self.engine = PsychopyEngine()
+        self.addCleanup(self.engine.gcMonitor.remove)
+        self.engine.win = Mock()
+        self.engine.keyboard = Mock()
+        self.engine.port = Mock()
+        self.slider = Mock()
+        self.instruction = Mock()
+
+    def press(self, *presses):
+        """Key presses returned by the keyboard, one list per poll
+        """
+        polls = []
+        for keys in presses:
+            polls.append([])
+            for name, rt in keys:
+                key = Mock(rt=rt)
+                key.name = name ## name is an argument of Mock itself
+                polls[-1].append(key)
+        self.engine.keyboard.getKeys.side_effect = polls
+
+    def test_redraws_only_when_rating_changes(self):
+        self.press([], [], [('left', 0.4321)], [], [('left', 0.9)], [], [('space', 1.2)])
+        rating, _, rt = self.engine.awaitRating(self.instruction, self.slider, init=1,
+            move=lambda rating, key: max(0, rating-1), triggerNr=2)
+        self.assertEqual(rating, 0)
+        self.assertEqual(rt, 900) ## last move, from the key timestamp
+        ## onset, the frame after it, and one change
+        self.assertEqual(self.engine.win.flip.call_count, 3)
+        self.engine.win.callOnFlip.assert_any_call(self.engine.port.trigger, 2)
+        self.engine.win.callOnFlip.assert_any_call(self.engine.keyboard.clock.reset)
+        self.assertEqual(self.engine.port.update.call_count, 7)
+
+    def test_confirm_requires_a_move(self):
+        self.press([('space', 0.2)], [('right', 0.5)], [('space', 0.7)])
+        rating, _, rt = self.engine.awaitRating(self.instruction, self.slider, init=1,
+            move=lambda rating, key: 2, triggerNr=1)
+        self.assertEqual((rating, rt), (2, 500))
+        self.assertFalse(self.engine._exitNow)
+
+    def test_escape(self):
+        self.press([('escape', 0.3)])
+        self.engine.awaitRating(self.instruction, self.slider, init=4,
+            move=lambda rating, key: rating, triggerNr=2)
+        self.assertTrue(self.engine._exitNow)
+
+    def test_frame_mode(self):
+        self.engine.promptMode = 'frame'
+        self.engine.keyboard.getKeys.side_effect = [[], ['right'], [], ['space']]
+        self.slider.getRating.return_value = 2
+        self.slider.getRT.return_value = 0.61
+        rating, _, rt = self.engine.awaitRating(self.instruction, self.slider, init=1,
+            move=lambda rating, key: 2, triggerNr=1)
+        self.assertEqual((rating, rt), (2, 610))
+        self.assertEqual(self.engine.win.flip.call_count, 4)
+        self.slider.setRating.assert_called_with(2)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+import gc
+
+
+class RealtimeTests(TestCase):
+
+    def test_gc_suspended_and_restored(self):
+        from experiment.realtime import RealtimeMode
+        rush = Mock(return_value=True)
+        mode = RealtimeMode(True, rush)
+        self.assertTrue(gc.isenabled())
+        self.addCleanup(gc.enable)
+        mode.enter()
+        self.assertFalse(gc.isenabled())
+        rush.assert_called_with(True)
+        mode.exit()
+        rush.assert_called_with(False)
+        self.assertTrue(mode.rushed)
+        ## collection stays off through the prompts, until resumed in the next ITI
+        self.assertFalse(gc.isenabled())
+        self.assertTrue(mode.suspended)
+        mode.resume()
+        self.assertTrue(gc.isenabled())
+        self.assertFalse(mode.suspended)
+
+    def test_disabled_mode_does_nothing(self):
+        from experiment.realtime import RealtimeMode
+        rush = Mock()
+        mode = RealtimeMode(False, rush)
+        mode.enter()
+        self.assertTrue(gc.isenabled())
+        mode.exit()
+        rush.assert_not_called()
+
+    def test_priority_not_restored_if_not_raised(self):
+        from experiment.realtime import RealtimeMode
+        rush = Mock(return_value=False)
+        mode = RealtimeMode(True, rush)
+        self.addCleanup(gc.enable)
+        mode.enter()
+        mode.exit()
+        mode.resume()
+        rush.assert_called_once_with(True)
+        self.assertTrue(gc.isenabled())
+
+    def test_enter_again_before_resume(self):
+        from experiment.realtime import RealtimeMode
+        mode = RealtimeMode(True)
+        self.addCleanup(gc.enable)
+        mode.enter()
+        mode.exit()
+        mode.enter() ## the ITI had no time to resume
+        mode.exit()
+        mode.resume()
+        self.assertTrue(gc.isenabled())
+
+    def test_gc_monitor(self):
+        from experiment.realtime import GcMonitor
+        from itertools import count
+        times = count(0.0, 0.25) ## each collection takes 0.25s
+        monitor = GcMonitor(clock=lambda: next(times))
+        monitor.install()
+        try:
+            gc.collect()
+            gc.collect()
+        finally:
+            monitor.remove()
+        self.assertGreaterEqual(monitor.collections, 2)
+        self.assertAlmostEqual(monitor.total, 0.25 * monitor.collections)
+        self.assertNotIn(monitor, gc.callbacks)
+
+    def test_schedule_played_without_gc_from_fixation(self):
+        try:
+            from experiment.engine import PsychopyEngine
+        except ImportError:
+            self.skipTest('psychopy not available')
+        from experiment.realtime import RealtimeMode
+        from experiment.idle import IdleScheduler
+        from experiment.schedule import Schedule, BLANK, FIXATION
+        engine = PsychopyEngine()
+        self.addCleanup(engine.gcMonitor.remove)
+        self.addCleanup(gc.enable)
+        engine.realtime = RealtimeMode(True, Mock(return_value=True))
+        engine.win = Mock()
+        engine.port = Mock()
+        engine.fixCross = Mock()
+        frames = []
+        engine.idleJobs = IdleScheduler(clock=lambda: len(frames) / 60)
+        ## garbage collection does not wait for the jobs queued for the ITI
+        engine.idleJobs.estimates['save trial'] = 0.010
+        engine.idleJobs.defer(Mock(), 'save trial')
+        def flip():
+            frames.append(gc.isenabled())
+            return len(frames) / 60
+        engine.win.flip.side_effect = flip
+        schedule = Schedule(1/60)
+        schedule.add(BLANK, 3, idle=True)
+        schedule.add(FIXATION, 2, slot='fixation_onset')
+        schedule.add(BLANK, 2)
+        engine.playSchedule(schedule)
+        self.assertEqual(frames, [True] * 3 + [False] * 4)
+        ## still suspended during the prompts
+        self.assertFalse(gc.isenabled())
+        collections = engine.gcMonitor.collections
+        engine.gcStats()
+        ## collected and enabled again when the next trial starts
+        engine.playSchedule(schedule)
+        self.assertEqual(frames[7:], [True] * 3 + [False] * 4)
+        self.assertGreater(engine.gcMonitor.collections, collections)
+        iti_ms, critical_ms = engine.gcStats()
+        self.assertGreater(iti_ms, 0)
+        self.assertEqual(critical_ms, 0)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+from unittest import TestCase
+from unittest.mock import Mock
+
+
+class ScheduleTests(TestCase):
+
+    def setUp(self) -> None:
+        self.timer = Mock()
+        self.timer.short_T1_delay = 31
+        self.timer.long_T1_delay = 51
+        self.timer.short_SOA = 15
+        self.timer.long_SOA = 41
+        self.timer.target_dur = 3
+        self.timer.task_delay = 37
+        self.timer.secsToFlips.side_effect = lambda s: round(s*70)
+
+    def createTrial(self, presence=True, soa_long=False):
+        from experiment.trials import TrialGenerator, TrialRecipe
+        from experiment.constants import Constants
+        generator = TrialGenerator(self.timer, Constants())
+        recipe = TrialRecipe('test', 'dual', presence, soa_long)
+        return generator.createTrial(recipe, 3.5, 1, 0, 2, 10)
+
+    def test_length(self):
+        from experiment.schedule import compileTrial
+        trial = self.createTrial()
+        schedule = compileTrial(trial, self.timer)
+        # iti, delay, blank, soa, then T2, blank, mask, blank, mask and task delay
+        expected = trial.iti + trial.delay + 3 + trial.soa + 3*5 + 37
+        self.assertEqual(len(schedule), expected)
+        self.assertEqual(len(schedule.triggers), expected)
+        self.assertEqual(len(schedule.slots), expected)
+
+    def test_soa_between_triggers(self):
+        from experiment.schedule import compileTrial
+        for soa_long in (False, True):
+            trial = self.createTrial(soa_long=soa_long)
+            schedule = compileTrial(trial, self.timer)
+            t1_frame = schedule.triggers.index(trial.t1_trigger)
+            t2_frame = schedule.triggers.index(trial.t2_trigger)
+            self.assertEqual(t2_frame - t1_frame, trial.soa)
+            self.assertEqual(schedule.frameOf('t1_onset'), t1_frame)
+            self.assertEqual(schedule.frameOf('t2_onset'), t2_frame)
+            self.assertEqual(len([t for t in schedule.triggers if t]), 2)
+
+    def test_stimuli(self):
+        from experiment.schedule import compileTrial, BLANK, FIXATION
+        trial = self.createTrial()
+        schedule = compileTrial(trial, self.timer)
+        self.assertEqual(schedule.stimuliAt(0), BLANK)
+        self.assertEqual(schedule.stimuliAt(trial.iti), FIXATION)
+        t1 = schedule.stimuliAt(schedule.frameOf('t1_onset'))
+        self.assertEqual(t1, (('text', trial.target1),))
+        t2 = schedule.stimuliAt(schedule.frameOf('t2_onset'))
+        self.assertEqual(t2, (('text', trial.target2), ('shape', 'squares')))
+        mask = schedule.stimuliAt(schedule.frameOf('t1_offset') + 3)
+        self.assertEqual(mask, (('text', trial.masks[0]),))
+        self.assertEqual(schedule.stimuliAt(len(schedule)-1), BLANK)
+
+    def test_t2_absent_only_squares(self):
+        from experiment.schedule import compileTrial
+        trial = self.createTrial(presence=False)
+        schedule = compileTrial(trial, self.timer)
+        t2 = schedule.stimuliAt(schedule.frameOf('t2_onset'))
+        self.assertEqual(t2, (('shape', 'squares'),))
+
+    def test_fake_engine_playback(self):
+        from experiment.schedule import compileTrial
+        from experiment.fake_engine import FakeEngine
+        trial = self.createTrial()
+        engine = FakeEngine()
+        engine.port = Mock()
+        times = engine.playSchedule(compileTrial(trial, self.timer))
+        self.assertEqual(engine.port.trigger.call_count, 2)
+        soa_secs = times['t2_onset'] - times['t1_onset']
+        self.assertAlmostEqual(soa_secs, trial.soa * engine.flip_dur)
+
+    def test_trial_frame_timing(self):
+        from experiment.fake_engine import FakeEngine
+        trial = self.createTrial()
+        engine = FakeEngine()
+        engine.port = Mock()
+        self.timer.flipsToSecs.side_effect = lambda f: f / 70
+        trial.run(engine, self.timer)
+        self.assertEqual(trial.dropped_frames, 0)
+        self.assertAlmostEqual(trial.max_frame_interval, engine.flip_dur * 1000)
+        self.assertAlmostEqual(trial.soa_ms, trial.soa * engine.flip_dur * 1000)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+
+
+class SimulationTests(TestCase):
+
+    def test_session_trials_file(self):
+        from experiment.simulation import SimulationEngine, BlinkModel, simulateSession
+        from experiment.persistence import columns
+        import pandas, numpy
+        with TemporaryDirectory() as tmp:
+            engine = SimulationEngine(BlinkModel(seed=1), flipRate=60.0, seed=1)
+            fpath = simulateSession(2, tmp, engine, seed=1)
+            df = pandas.read_csv(fpath, index_col=0)
+        self.assertEqual([''] + list(df.columns), columns())
+        ## 46 training and 368 test trials, none invalid
+        self.assertEqual(len(df), 414)
+        self.assertTrue(df.valid.all())
+        self.assertEqual(list(df.task.unique()), ['dual', 'single'])
+        ## T1, T2 and visibility triggers on every trial, identity in the dual task
+        times, values = engine.triggers()
+        self.assertEqual(values.size, 3*len(df) + sum(df.task == 'dual'))
+        self.assertTrue((numpy.diff(times) >= 0).all())
+        ## T2 seen more often when present
+        present = df[df.t2presence].vis_rating.mean()
+        absent = df[~df.t2presence].vis_rating.mean()
+        self.assertGreater(present, absent + 5)
+
+    def test_seeded_sessions_are_identical(self):
+        from experiment.simulation import simulateMany
+        with TemporaryDirectory() as tmp1, TemporaryDirectory() as tmp2:
+            [fpath1] = simulateMany([3], tmp1, dropRate=0.001, seed=5)
+            [fpath2] = simulateMany([3], tmp2, dropRate=0.001, seed=5)
+            with open(fpath1) as f1, open(fpath2) as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+    def test_parallel_sessions_match_serial(self):
+        from experiment.simulation import simulateMany
+        with TemporaryDirectory() as tmp1, TemporaryDirectory() as tmp2:
+            serial = simulateMany([1, 2, 3], tmp1, seed=5)
+            parallel = simulateMany([1, 2, 3], tmp2, seed=5, jobs=2)
+            self.assertEqual([f.replace(tmp1, tmp2) for f in serial], parallel)
+            for fpath1, fpath2 in zip(serial, parallel):
+                with open(fpath1) as f1, open(fpath2) as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+    def test_dropped_frames_requeue_trials(self):
+        from experiment.simulation import SimulationEngine, simulateSession
+        from experiment.constants import Constants
+        import pandas
+        const = Constants()
+        const.max_requeued_per_block = 8
+        with TemporaryDirectory() as tmp:
+            engine = SimulationEngine(dropRate=0.002, seed=7)
+            fpath = simulateSession(1, tmp, engine, const, seed=7)
+            df = pandas.read_csv(fpath, index_col=0)
+        invalid = df[~df.valid]
+        self.assertGreater(len(invalid), 0)
+        replaced = df.replaces.dropna().astype(int)
+        self.assertTrue(set(replaced).issubset(set(invalid.index)))
+        self.assertTrue((df.loc[~df.valid, 'critical_drops'] > 0).all())
+        self.assertGreater(len(replaced), 0)
+
+    def test_no_requeued_trials_by_default(self):
+        from experiment.simulation import SimulationEngine, simulateSession
+        import pandas
+        with TemporaryDirectory() as tmp:
+            engine = SimulationEngine(dropRate=0.002, seed=7)
+            fpath = simulateSession(1, tmp, engine, seed=7)
+            df = pandas.read_csv(fpath, index_col=0)
+        self.assertGreater((~df.valid).sum(), 0)
+        self.assertEqual(len(df), 414)
+        self.assertTrue(df.replaces.isna().all())
+
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from unittest import TestCase
+from tempfile import TemporaryDirectory
+from os.path import join
+
+
+class TrialTableTests(TestCase):
+
+    def generator(self, seed=3):
+        from experiment.trials import TrialGenerator
+        from experiment.constants import Constants
+        from experiment.timer import Timer
+        const = Constants()
+        timer = Timer()
+        timer.optimizeFlips(60, const)
+        return TrialGenerator(timer, const, seed)
+
+    def test_views_match_created_trials(self):
+        from experiment.trials import TrialRecipe
+        generator = self.generator()
+        rows = generator.sampleBlock('train', 'dual')
+        trials = generator.createTrials(rows, planIndex=10)
+        for row, trial in zip(rows.tolist(), trials):
+            row = dict(zip(rows.dtype.names, row))
+            recipe = TrialRecipe(row['phase'].decode(), row['task'].decode(), row['t2presence'], row['soa_long'])
+            expected = generator.createTrial(recipe, row['iti_s'], row['delay_index'], row['t1_index'],
+                                             row['t2_index'], row['vis_init'], tuple(m.decode() for m in row['masks']))
+            self.assertEqual(trial.todict(), dict(expected.todict(), plan_index=trial.plan_index))
+        self.assertEqual([t.plan_index for t in trials[:3]], [10, 11, 12])
+        self.assertEqual(len(generator.table), len(trials))
+
+    def test_view_writes_to_table(self):
+        generator = self.generator()
+        trial = generator.generate('test', 'single')[5]
+        self.assertIsNone(trial.vis_rt)
+        self.assertIsNone(trial.t1_onset)
+        trial.vis_rt = 812
+        trial.t1_onset = 1.25
+        trial.valid = False
+        self.assertEqual((trial.vis_rt, trial.t1_onset, trial.valid), (812, 1.25, False))
+        self.assertEqual(generator.table.rows['vis_rt'][5], 812)
+        replacement = generator.requeue(trial)
+        self.assertEqual(replacement.replaces, 5)
+        self.assertEqual(generator.indexOf(replacement), len(generator.table) - 1)
+        self.assertTrue(replacement.valid)
+
+    def test_csv_same_as_trial_writer(self):
+        from experiment.simulation import SimulationEngine, BlinkModel
+        from experiment.session import runSession, counterbalanceBlocks
+        from experiment.persistence import TrialWriter
+        from experiment.table import TrialTable
+        from experiment.plan import compilePlan
+        generator = self.generator()
+        generator.const.max_requeued_per_block = 8
+        engine = SimulationEngine(BlinkModel(1), dropRate=0.01, seed=1)
+        plan = compilePlan(generator, 2, counterbalanceBlocks(2))
+        with TemporaryDirectory() as tmp:
+            writer = TrialWriter(join(tmp, 'rows.csv'), fsyncEvery=0)
+            runSession(engine, generator, plan, writer, generator.const)
+            generator.table.toCsv(join(tmp, 'table.csv'))
+            with open(join(tmp, 'rows.csv')) as fhandle:
+                expected = fhandle.read()
+            with open(join(tmp, 'table.csv')) as fhandle:
+                self.assertEqual(fhandle.read(), expected)
+            table = TrialTable.readCsv(join(tmp, 'table.csv'))
+            table.toCsv(join(tmp, 'reread.csv'))
+            with open(join(tmp, 'reread.csv')) as fhandle:
+                self.assertEqual(fhandle.read(), expected)
+        self.assertGreater(generator.table.rows['replaces'][:len(table)].max(), 0)
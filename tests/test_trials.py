@@ -41,6 +41,10 @@ class TrialGenerationTests(TestCase):
             print(vals)
         self.assertLessEqual(max(reps), exp)
 
+    def useRefreshRate(self, rate: int) -> None:
+        ## the trial table stores the ITI in flips, so the mock timer has to return numbers
+        self.timer.secsToFlips.side_effect = lambda s: round(s*rate)
+
     def sampleTrials(self):
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
@@ -49,6 +53,7 @@ class TrialGenerationTests(TestCase):
         return list(cond_trials)
 
     def test_phase(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('train', 'single')
@@ -57,6 +62,7 @@ class TrialGenerationTests(TestCase):
         self.assertEqual(len(trials), 30)
 
     def test_count_by_conditions_dual_task(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('test', 'dual')
@@ -71,6 +77,7 @@ class TrialGenerationTests(TestCase):
         self.assertEqual(len(list(absent_long)), self.consts.n_trials_dual_easy)
 
     def test_count_by_conditions_single_task(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('test', 'single')
@@ -85,6 +92,7 @@ class TrialGenerationTests(TestCase):
         self.assertEqual(len(list(absent_long)), self.consts.n_trials_single)
 
     def test_delay_sampling(self):
+        self.useRefreshRate(60)
         sample1 = [t.delay_index for t in self.sampleTrials()]
         sample2 = [t.delay_index for t in self.sampleTrials()]
         self.assertMeanEqual(0.5, sample1)
@@ -92,6 +100,7 @@ class TrialGenerationTests(TestCase):
         self.assertNotEqual(sample1, sample2)
 
     def test_t1_sampling(self):
+        self.useRefreshRate(60)
         sample1 = [t.t1_index for t in self.sampleTrials()]
         sample2 = [t.t1_index for t in self.sampleTrials()]
         self.assertMeanEqual(0.5, sample1)
@@ -99,6 +108,7 @@ class TrialGenerationTests(TestCase):
         self.assertNotEqual(sample1, sample2)
 
     def test_t2_sampling(self):
+        self.useRefreshRate(60)
         sample1 = [t.t2_index for t in self.sampleTrials() if t.t2presence]
         sample2 = [t.t2_index for t in self.sampleTrials() if t.t2presence]
         self.assertMeanEqual(1.5, sample1)
@@ -106,6 +116,7 @@ class TrialGenerationTests(TestCase):
         self.assertNotEqual(sample1, sample2)
 
     def test_t2_absence(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('test', 'dual')
@@ -115,6 +126,7 @@ class TrialGenerationTests(TestCase):
             self.assertEqual(t2, '')
 
     def test_init_vis_sampling(self):
+        self.useRefreshRate(60)
         sample1 = [t.vis_init for t in self.sampleTrials()]
         sample2 = [t.vis_init for t in self.sampleTrials()]
         self.assertMeanAlmostEqual(self.consts.vis_scale_length/2, sample1, delta=1)
@@ -122,6 +134,7 @@ class TrialGenerationTests(TestCase):
         self.assertNotEqual(sample1, sample2)
 
     def test_mask_sampling(self):
+        self.useRefreshRate(60)
         masks_by_trial = [t.masks for t in self.sampleTrials()]
         ## three masks per trial
         self.assertEqual(len(masks_by_trial[0]), 3)
@@ -132,6 +145,7 @@ class TrialGenerationTests(TestCase):
         self.assertAlmostEqual(len(set(all_masks)), len(all_masks), delta=1)
         
     def test_triggers_numbers_preset(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('test', 'dual')
@@ -151,6 +165,7 @@ class TrialGenerationTests(TestCase):
         )
 
     def test_triggers_numbers_preset_training(self):
+        self.useRefreshRate(60)
         from experiment.trials import TrialGenerator
         generator = TrialGenerator(self.timer, self.consts)
         trials = generator.generate('train', 'single')
@@ -179,3 +194,42 @@ class TrialGenerationTests(TestCase):
         self.assertTrue(all([iti < max_flips for iti in itis]))
         ## variety in ITI
         self.assertGreater(len(set(itis)), 30)
+
+    def test_requeue(self):
+        from experiment.trials import TrialGenerator
+        self.timer.secsToFlips.side_effect = lambda s: int(s*100)
+        generator = TrialGenerator(self.timer, self.consts)
+        trials = generator.generate('test', 'dual')
+        damaged = trials[5]
+        damaged.valid = False
+        replacement = generator.requeue(damaged)
+        self.assertIs(generator.all[-1], replacement)
+        self.assertEqual(len(generator.all), 241)
+        self.assertEqual(replacement.replaces, 5)
+        for attr in ('phase', 'task', 't2presence', 'soa_long', 'delay_index',
+                     't1_index', 't2_index', 'vis_init', 't1_trigger', 't2_trigger'):
+            self.assertEqual(getattr(replacement, attr), getattr(damaged, attr))
+        self.assertTrue(replacement.valid)
+        self.assertNotEqual(replacement.masks, damaged.masks)
+
+    def test_seeded_generation_is_reproducible(self):
+        from experiment.trials import TrialGenerator, participantSeed
+        self.timer.secsToFlips.side_effect = lambda s: int(s*100)
+        def session(seed):
+            generator = TrialGenerator(self.timer, self.consts, seed)
+            return generator.generate('train', 'dual') + generator.generate('test', 'single')
+        first = session(participantSeed('UOLM', 3))
+        again = session(participantSeed('UOLM', 3))
+        other_pid = session(participantSeed('UOLM', 4))
+        other_site = session(participantSeed('UOBC', 3))
+        self.assertEqual([t.todict() for t in first], [t.todict() for t in again])
+        self.assertNotEqual([t.masks for t in first], [t.masks for t in other_pid])
+        self.assertNotEqual([t.masks for t in first], [t.masks for t in other_site])
+
+    def test_mask_letters(self):
+        from experiment.trials import TrialGenerator
+        generator = TrialGenerator(self.timer, self.consts, seed=1)
+        for masks in generator.sampleMasks(200):
+            for mask in masks:
+                self.assertEqual(len(set(mask)), 4)
+                self.assertTrue(set(mask).issubset(self.consts.possible_consonants))
@@ -0,0 +1,119 @@
+"""Benchmark the time from the end of the last mask to the prompt onset
+
+This opens the experiment window with the monitor settings of lab.toml
+(or the file given with --config) and plays n trials of: the last mask,
+the blank frame that ends it, and both prompts, answered by a scripted
+keyboard. It reports the distribution of the time from the flip that ends
+the mask to the onset flip of each prompt. There are no delay frames in
+between, so this is the time spent preparing and drawing the prompt; on
+the lab monitor it should stay under one frame.
+
+The first trial builds the prompt widgets and is reported separately.
+
+    python -m tools.prompt_benchmark -n 100
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+from argparse import ArgumentParser
+from experiment.engine import PsychopyEngine
+from vendor.tomli import load
+
+
+class ScriptedKey:
+    """Stands in for psychopy.hardware.keyboard.KeyPress
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rt = 0.5
+
+    def __eq__(self, other: object) -> bool:
+        return self.name == other
+
+
+class ScriptedClock:
+
+    def reset(self) -> None:
+        pass
+
+
+class ScriptedKeyboard:
+    """Answers every prompt with one move and a confirmation
+    """
+
+    def __init__(self) -> None:
+        self.clock = ScriptedClock()
+        self.script: List[List[ScriptedKey]] = []
+
+    def answerNextPrompt(self) -> None:
+        self.script = [[], [ScriptedKey('right')], [ScriptedKey('space')]]
+
+    def clearEvents(self) -> None:
+        pass
+
+    def getKeys(self, keyList: Optional[List[str]]=None, waitRelease: bool=True) -> List[ScriptedKey]:
+        return self.script.pop(0) if self.script else []
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered)-1, round(q * (len(ordered)-1)))]
+
+
+def summarize(ms: List[float]) -> Dict[str, float]:
+    """min, median, p95 and max in milliseconds
+    """
+    ordered = sorted(ms)
+    return dict(
+        min=ordered[0],
+        median=percentile(ordered, 0.5),
+        p95=percentile(ordered, 0.95),
+        max=ordered[-1],
+    )
+
+
+def benchmark(engine: PsychopyEngine, keyboard: ScriptedKeyboard, n: int) -> Dict[str, List[float]]:
+    """Play n trials of mask, blank and prompts, and time each prompt onset
+
+    Returns:
+        dict: milliseconds from the end of the mask to the onset, per prompt
+    """
+    from psychopy.visual import TextStim
+    mask = TextStim(engine.win, text='BCDF', height=1, units='deg', name='mask')
+    latencies: Dict[str, List[float]] = dict(identity=[], visibility=[])
+    for t in range(n):
+        for prompt in latencies:
+            mask.draw()
+            engine.win.flip()
+            mask_offset = engine.win.flip()
+            keyboard.answerNextPrompt()
+            if prompt == 'identity':
+                _, onset, _ = engine.promptIdentity('Which target?', ('OXXO', 'XOOX'), 0)
+            else:
+                _, onset, _ = engine.promptVisibility('How visible?', ('not seen', 'maximal'), 21, 10, 0)
+            latencies[prompt].append((onset - mask_offset) * 1000)
+    return latencies
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Mask to prompt latency benchmark')
+    parser.add_argument('-n', type=int, default=100, help='number of trials')
+    parser.add_argument('--config', default='lab.toml', help='lab configuration with the monitor settings')
+    args = parser.parse_args()
+
+    with open(args.config, 'rb') as fhandle:
+        config = load(fhandle)
+    engine = PsychopyEngine()
+    engine.configureWindow(config)
+    keyboard = ScriptedKeyboard()
+    engine.keyboard = keyboard # type: ignore
+    rate = engine.measureRefreshRate()
+
+    latencies = benchmark(engine, keyboard, args.n)
+    rate_str = f'{rate:.1f} Hz' if rate else 'unstable'
+    print(f'{args.n} trials, {engine.promptMode} prompt mode, refresh rate: {rate_str}')
+    print(f'  {"(milliseconds)":16} {"first":>9} {"min":>9} {"median":>9} {"p95":>9} {"max":>9}')
+    for prompt, ms in latencies.items():
+        stats = summarize(ms[1:] or ms)
+        print(f'  {prompt:16} {ms[0]:9.2f} {stats["min"]:9.2f} {stats["median"]:9.2f}'
+              f' {stats["p95"]:9.2f} {stats["max"]:9.2f}')
+    engine.stop()
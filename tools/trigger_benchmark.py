@@ -0,0 +1,208 @@
+"""Benchmark the latency of sending triggers, for every port type
+
+For each port type supported by createTriggerPort, this fires a number of
+triggers and reports the distribution of the time spent in trigger() and
+in the reset at the end of the pulse, as well as the cost per frame of
+the trigger handling in a simulated presentation loop.
+
+By default this runs against local stand-ins: a pseudo-terminal for the
+serial port, and fake parallel port and LabJack devices.
+With --lab, the port configured in lab.toml is benchmarked instead,
+to compare adapters before a session.
+
+    python -m tools.trigger_benchmark -n 1000
+    python -m tools.trigger_benchmark --lab
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
+from argparse import ArgumentParser
+from time import perf_counter
+from threading import Thread
+import os
+from experiment.ports import (TriggerInterface, SerialTriggerPort, ThreadedSerialTriggerPort,
+                              ParallelPort, LabJackPort, ViewPixxTriggerPort, createTriggerPort)
+from experiment.fake_engine import FakeTriggerPort
+
+## trigger values to cycle through
+VALUES = [16, 22, 31, 1, 2, 47]
+
+
+def busyWait(secs: float) -> None:
+    end = perf_counter() + secs
+    while perf_counter() < end:
+        pass
+
+
+class FakeParallelBackend:
+    """Stands in for psychopy.parallel.ParallelPort
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.data = 0
+
+    def setData(self, val: int) -> None:
+        busyWait(self.delay)
+        self.data = val
+
+
+class FakeLabJackBackend:
+    """Stands in for psychopy.hardware.labjacks.U3, delay simulates the USB round-trip
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.data = 0
+
+    def setData(self, val: int, address: str='FIO') -> None:
+        busyWait(self.delay)
+        self.data = val
+
+
+class FakeLine:
+
+    def setLineColor(self, color: Tuple[int, int, int]) -> None:
+        pass
+
+    def draw(self) -> None:
+        pass
+
+
+class FakeWindowEngine:
+    """Provides createLine() for the ViewPixx port
+    """
+
+    def createLine(self, **kwargs) -> FakeLine:
+        return FakeLine()
+
+
+class SilentTriggerPort(FakeTriggerPort):
+
+    def trigger(self, val: int) -> None:
+        pass
+
+    def reset(self) -> None:
+        pass
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered)-1, round(q * (len(ordered)-1)))]
+
+
+def summarize(secs: List[float]) -> Dict[str, float]:
+    """min, median, p99 and max in microseconds
+    """
+    ordered = sorted(secs)
+    return dict(
+        min=ordered[0] * 1e6,
+        median=percentile(ordered, 0.5) * 1e6,
+        p99=percentile(ordered, 0.99) * 1e6,
+        max=ordered[-1] * 1e6,
+    )
+
+
+def benchmark(interface: TriggerInterface, n: int, framesPerTrigger: int) -> Dict[str, Dict[str, float]]:
+    """Fire n triggers through the interface and time every call
+
+    Args:
+        interface (TriggerInterface): port to test
+        n (int): number of triggers
+        framesPerTrigger (int): frames simulated per trigger for the per-frame overhead
+    """
+    trigger_secs, reset_secs, frame_secs = [], [], []
+    for t in range(n):
+        val = VALUES[t % len(VALUES)]
+        start = perf_counter()
+        interface.trigger(val)
+        trigger_secs.append(perf_counter() - start)
+        start = perf_counter()
+        interface.clear()
+        reset_secs.append(perf_counter() - start)
+    ## what the presentation loop pays per frame: trigger on one frame, update on every frame
+    interface.pulseWidth = 0
+    for t in range(n):
+        for f in range(framesPerTrigger):
+            start = perf_counter()
+            if f == 0:
+                interface.trigger(VALUES[t % len(VALUES)])
+            interface.update()
+            frame_secs.append(perf_counter() - start)
+    return dict(
+        trigger=summarize(trigger_secs),
+        reset=summarize(reset_secs),
+        frame=summarize(frame_secs),
+    )
+
+
+def readForever(fd: int) -> None:
+    while True:
+        os.read(fd, 1024)
+
+
+def standIns(delay: float) -> Dict[str, Callable[[], TriggerInterface]]:
+    """Factories for each port type, connected to local stand-ins
+    """
+    master, slave = os.openpty()
+    serial_address = os.ttyname(slave)
+    ## the other end of the pty is read continuously, like the EEG amplifier would
+    Thread(target=readForever, args=(master,), daemon=True).start()
+    return {
+        'dummy': lambda: TriggerInterface(SilentTriggerPort()),
+        'serial': lambda: TriggerInterface(SerialTriggerPort(serial_address, 115200, 0.01)),
+        'serial (threaded)': lambda: TriggerInterface(ThreadedSerialTriggerPort(serial_address, 115200, 0.01)),
+        'parallel': lambda: TriggerInterface(ParallelPort('', backend=FakeParallelBackend(delay))),
+        'labjack': lambda: TriggerInterface(LabJackPort(backend=FakeLabJackBackend(delay))),
+        'viewpixx': lambda: TriggerInterface(ViewPixxTriggerPort(FakeWindowEngine(), 1.0, 7.0)),
+    }
+
+
+def closePort(interface: TriggerInterface) -> None:
+    """Close serial ports, and report the write latency of the threaded one
+    """
+    port = interface.port
+    if isinstance(port, ThreadedSerialTriggerPort):
+        port.close()
+        hist = port.latencyHistogram()
+        print(f'  write latency in thread (ms): median={hist["median_ms"]:.3f}'
+              f' max={hist["max_ms"]:.3f} timeouts={hist["timeouts"]}')
+    elif isinstance(port, SerialTriggerPort):
+        port.sport.close()
+
+
+def report(name: str, results: Dict[str, Dict[str, float]]) -> None:
+    print(f'\n{name}')
+    print(f'  {"(microseconds)":16} {"min":>9} {"median":>9} {"p99":>9} {"max":>9}')
+    for call, stats in results.items():
+        print(f'  {call:16} {stats["min"]:9.2f} {stats["median"]:9.2f} {stats["p99"]:9.2f} {stats["max"]:9.2f}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Trigger latency benchmark')
+    parser.add_argument('-n', type=int, default=500, help='number of triggers per port type')
+    parser.add_argument('--frames', type=int, default=10, help='frames simulated per trigger')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='simulated device delay (ms) for the parallel and LabJack stand-ins')
+    parser.add_argument('--lab', action='store_true', help='benchmark the port configured in lab.toml')
+    args = parser.parse_args()
+
+    if args.lab:
+        from experiment.labs import getLabConfiguration
+        settings = getLabConfiguration()['triggers']
+        factories = {settings['type']: lambda: createTriggerPort(
+            typ=settings['type'],
+            engine=FakeWindowEngine(), # type: ignore
+            scale=1.0,
+            address=settings.get('address', ''),
+            rate=settings.get('baudrate', 0),
+            threaded=settings.get('threaded', False),
+            writeTimeout=settings.get('write_timeout', None),
+            pulseWidth=settings.get('pulse_width', 5.0),
+        )}
+    else:
+        factories = standIns(args.delay / 1000)
+
+    print(f'{args.n} triggers per port type, {args.frames} frames per trigger')
+    for name, factory in factories.items():
+        interface = factory()
+        report(name, benchmark(interface, args.n, args.frames))
+        closePort(interface)